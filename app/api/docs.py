@@ -0,0 +1,148 @@
+"""
+OpenAPI schema and documentation pages served from pre-built bytes.
+
+FastAPI's own routes call ``app.openapi()`` and re-encode the schema (and
+re-render the Swagger UI and ReDoc pages) on every request. Here each
+document is rendered once per app into bytes, with a gzip variant and a
+strong ETag for each representation, so a request costs a header lookup:
+``If-None-Match`` with a matching tag gets an empty 304, anything else the
+cached body.
+
+Documents are built by ``get_documents`` on first use, normally during
+warmup (in the gunicorn master with ``preload_app``). The schema bytes are
+the same ``scripts/validate_openapi.py`` checks and writes out.
+"""
+import gzip
+import hashlib
+import json
+
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.openapi.docs import (
+    get_redoc_html,
+    get_swagger_ui_html,
+    get_swagger_ui_oauth2_redirect_html,
+)
+from fastapi.responses import Response
+
+OPENAPI_URL = "/openapi.json"
+DOCS_URL = "/docs"
+OAUTH2_REDIRECT_URL = "/docs/oauth2-redirect"
+REDOC_URL = "/redoc"
+
+router = APIRouter()
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    for coding in accept_encoding.lower().split(","):
+        name, _, params = coding.partition(";")
+        if name.strip() in ("gzip", "*"):
+            quality = params.strip().removeprefix("q=")
+            try:
+                return not quality or float(quality) > 0
+            except ValueError:
+                return False
+    return False
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class StaticDocument:
+    """A pre-serialized response body with a gzip variant and strong ETags."""
+
+    __slots__ = ("media_type", "body", "etag", "gzip_body", "gzip_etag")
+
+    def __init__(self, body: bytes, media_type: str):
+        self.media_type = media_type
+        self.body = body
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        # mtime=0 keeps the compressed bytes (and so the tag) identical across workers
+        self.gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+        self.gzip_etag = f'"{digest}-gzip"'
+
+    def response(self, request: Request) -> Response:
+        use_gzip = _accepts_gzip(request.headers.get("accept-encoding", ""))
+        etag = self.gzip_etag if use_gzip else self.etag
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return Response(self.gzip_body, media_type=self.media_type, headers=headers)
+        return Response(self.body, media_type=self.media_type, headers=headers)
+
+
+def _openapi_bytes(app: FastAPI, root_path: str) -> bytes:
+    schema = app.openapi()
+    if root_path and app.root_path_in_servers:
+        # Same as FastAPI's own route when mounted below a proxy prefix
+        server_urls = {server.get("url") for server in schema.get("servers", [])}
+        if root_path not in server_urls:
+            schema = {**schema, "servers": [{"url": root_path}] + schema.get("servers", [])}
+    # Encoded like JSONResponse
+    return json.dumps(
+        schema, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def build_documents(app: FastAPI, root_path: str = "") -> dict[str, StaticDocument]:
+    """Render the schema and the documentation pages for ``root_path``."""
+    openapi_url = root_path + OPENAPI_URL
+    swagger = get_swagger_ui_html(
+        openapi_url=openapi_url,
+        title=f"{app.title} - Swagger UI",
+        oauth2_redirect_url=root_path + OAUTH2_REDIRECT_URL,
+        init_oauth=app.swagger_ui_init_oauth,
+        swagger_ui_parameters=app.swagger_ui_parameters,
+    )
+    redoc = get_redoc_html(openapi_url=openapi_url, title=f"{app.title} - ReDoc")
+    html = "text/html; charset=utf-8"
+    return {
+        "openapi": StaticDocument(_openapi_bytes(app, root_path), "application/json"),
+        "docs": StaticDocument(swagger.body, html),
+        "oauth2_redirect": StaticDocument(get_swagger_ui_oauth2_redirect_html().body, html),
+        "redoc": StaticDocument(redoc.body, html),
+    }
+
+
+def get_documents(app: FastAPI, root_path: str = "") -> dict[str, StaticDocument]:
+    """Return the documents for ``root_path``, building them on first use."""
+    cache = getattr(app.state, "static_docs", None)
+    if cache is None:
+        cache = app.state.static_docs = {}
+    documents = cache.get(root_path)
+    if documents is None:
+        documents = cache[root_path] = build_documents(app, root_path)
+    return documents
+
+
+def _serve(request: Request, name: str) -> Response:
+    root_path = request.scope.get("root_path", "").rstrip("/")
+    return get_documents(request.app, root_path)[name].response(request)
+
+
+@router.get(OPENAPI_URL, include_in_schema=False)
+async def openapi_json(request: Request) -> Response:
+    return _serve(request, "openapi")
+
+
+@router.get(DOCS_URL, include_in_schema=False)
+async def swagger_ui(request: Request) -> Response:
+    return _serve(request, "docs")
+
+
+@router.get(OAUTH2_REDIRECT_URL, include_in_schema=False)
+async def swagger_ui_oauth2_redirect(request: Request) -> Response:
+    return _serve(request, "oauth2_redirect")
+
+
+@router.get(REDOC_URL, include_in_schema=False)
+async def redoc(request: Request) -> Response:
+    return _serve(request, "redoc")
@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.core.prometheus import render_latest
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics() -> Response:
+    """
+    Prometheus scrape endpoint.
+
+    Aggregates the metric files of all gunicorn workers, so any worker can
+    serve the scrape.
+    """
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
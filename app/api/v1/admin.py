@@ -0,0 +1,114 @@
+import datetime
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+
+from app.core.auth import AuthContext, require_admin
+from app.core.config import settings
+from app.core.database import DatabaseSession, get_db, is_process_local
+from app.core.profiler import ProfilerBusyError, format_collapsed, profiler
+from app.core.usage import usage_ledger
+from app.models.usage import UsageResponse
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get(
+    "/profile",
+    response_class=PlainTextResponse,
+    summary="Profile this worker",
+    description="Samples the stacks of the worker that serves the request for the given "
+    "number of seconds and returns collapsed stacks (one `frame;frame;... count` line per "
+    "stack) for flamegraph tools. Event loop samples are prefixed with the path and trace "
+    "ID of the request that was running. Requires a user listed in ADMIN_USER_IDS.",
+    responses={
+        200: {
+            "description": "Collapsed stacks, hottest first",
+            "content": {
+                "text/plain": {
+                    "example": "/api/v1/chat/stream trace=4bf9...;run (asyncio/runners.py);... 12\n"
+                }
+            },
+        },
+        403: {"description": "Authenticated user is not an admin"},
+        409: {"description": "A profile is already running in this worker"},
+    },
+)
+async def profile_worker(
+    seconds: float = Query(
+        default=5.0, gt=0, le=settings.PROFILER_MAX_SECONDS, description="Sampling duration"
+    ),
+    interval_ms: float = Query(
+        default=5.0, ge=1, le=1000, description="Time between samples in milliseconds"
+    ),
+    all_threads: bool = Query(
+        default=False, description="Also sample threads other than the event loop"
+    ),
+    admin: AuthContext = Depends(require_admin),
+) -> PlainTextResponse:
+    """
+    Run the sampling profiler in this worker.
+
+    Args:
+        seconds: How long to sample
+        interval_ms: Sampling interval
+        all_threads: Include non-event-loop threads
+        admin: Admin authentication context (injected by dependency)
+
+    Returns:
+        PlainTextResponse: Collapsed stacks with sample counts
+
+    Raises:
+        HTTPException: 403 if the user is not an admin
+        HTTPException: 409 if a profile is already running
+    """
+    try:
+        counts = await profiler.profile(seconds, interval_ms / 1000, all_threads)
+    except ProfilerBusyError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc)) from exc
+    return PlainTextResponse(format_collapsed(counts), headers={"X-Worker-PID": str(os.getpid())})
+
+
+@router.get(
+    "/usage",
+    response_model=UsageResponse,
+    summary="Per-user usage totals",
+    description="Returns requests, prompt and completion tokens and streaming time per user "
+    "from the usage ledger, summed over the last `days` UTC days (today included). Workers "
+    "flush their counters every USAGE_FLUSH_INTERVAL seconds, so the most recent requests "
+    "of other workers may not be included yet. Totals cover all workers only when "
+    "DATABASE_URL is shared; with the default in-memory SQLite each worker keeps its own "
+    "ledger and `scope` is `this_worker`. Requires a user listed in ADMIN_USER_IDS.",
+    responses={403: {"description": "Authenticated user is not an admin"}},
+)
+async def get_usage(
+    days: int = Query(default=7, ge=1, le=366, description="Number of UTC days to include"),
+    user_id: str
+    | None = Query(default=None, description="Only report this user", examples=["user1"]),
+    limit: int = Query(default=100, ge=1, le=1000, description="Maximum number of users"),
+    db: DatabaseSession = Depends(get_db),
+    admin: AuthContext = Depends(require_admin),
+) -> UsageResponse:
+    """
+    Read aggregated usage from the ledger table.
+
+    Args:
+        days: How many UTC days to sum, ending today
+        user_id: Optional user to report on
+        limit: Maximum number of users returned
+        db: Database session
+        admin: Admin authentication context (injected by dependency)
+
+    Returns:
+        UsageResponse: Totals per user, largest token consumers first
+
+    Raises:
+        HTTPException: 403 if the user is not an admin
+    """
+    # This worker's counters are written first so its own recent requests show up
+    await usage_ledger.flush()
+    since = datetime.datetime.now(datetime.UTC).date() - datetime.timedelta(days=days - 1)
+    users = await usage_ledger.totals(db, since, user_id=user_id, limit=limit)
+    scope = "this_worker" if is_process_local(settings.DATABASE_URL) else "all_workers"
+    return UsageResponse(since=since, scope=scope, users=users)
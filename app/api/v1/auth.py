@@ -2,10 +2,11 @@ from fastapi import APIRouter, Depends, Query
 from fastapi.responses import RedirectResponse
 
 from app.core.config import settings
-from app.core.oauth import oauth2_scheme
+from app.core.oauth import exchange_code_for_token, is_demo_mode, oauth2_scheme
+from app.middleware.tracing import TracedRoute
 from app.models.auth import OAuthTokenResponse, UserInfoResponse
 
-router = APIRouter(prefix="/auth", tags=["authentication"])
+router = APIRouter(prefix="/auth", tags=["authentication"], route_class=TracedRoute)
 
 
 @router.get(
@@ -23,10 +24,7 @@ async def oauth_login() -> RedirectResponse:
         RedirectResponse: Redirects to OAuth provider or callback (in demo mode)
     """
     # Check if we're in demo mode (placeholder OAuth URL)
-    if (
-        "oauth.provider.com" in settings.OAUTH_AUTHORIZATION_URL
-        or settings.OAUTH_CLIENT_ID == "your-client-id"
-    ):
+    if is_demo_mode():
         # Demo mode: redirect directly to callback with a demo authorization code
         demo_code = "demo_auth_code_12345"
         callback_url = f"{settings.OAUTH_REDIRECT_URI}?code={demo_code}"
@@ -48,7 +46,11 @@ async def oauth_login() -> RedirectResponse:
     response_model=OAuthTokenResponse,
     summary="OAuth callback endpoint",
     description="OAuth callback endpoint that exchanges authorization code for access token. "
-    "In production, this would exchange the code with the OAuth provider.",
+    "In demo mode, returns a mock token instead of calling the OAuth provider.",
+    responses={
+        400: {"description": "The OAuth provider rejected the authorization code"},
+        502: {"description": "The OAuth provider could not be reached"},
+    },
 )
 async def oauth_callback(
     code: str = Query(
@@ -65,13 +67,24 @@ async def oauth_callback(
 
     Returns:
         OAuthTokenResponse: Access token and related information
+
+    Raises:
+        HTTPException: 400 if the code is rejected, 502 if the provider is unavailable or
+        returns a malformed token
     """
-    # In production, exchange code for token with OAuth provider
-    # For demo purposes, return a mock token
+    if is_demo_mode():
+        # For demo purposes, return a mock token
+        return OAuthTokenResponse(
+            access_token=f"oauth_{code}",
+            token_type="bearer",
+            expires_in=3600,
+        )
+
+    token = await exchange_code_for_token(code)
     return OAuthTokenResponse(
-        access_token=f"oauth_{code}",
-        token_type="bearer",
-        expires_in=3600,
+        access_token=token["access_token"],
+        token_type=(token.get("token_type") or "bearer").lower(),
+        expires_in=int(token.get("expires_in") or 3600),
     )
 
 
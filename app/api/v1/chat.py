@@ -1,12 +1,26 @@
-from fastapi import APIRouter, Depends, Header
+import time
+from contextlib import aclosing
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 
 from app.core.auth import AuthContext, get_auth_context
+from app.core.config import settings
 from app.core.database import DatabaseSession, get_db
+from app.core.drain import StreamCut, drain_controller
+from app.core.metrics import stream_metrics
+from app.core.prometheus import RATE_LIMIT_REJECTIONS
+from app.core.stream_limiter import get_stream_limiter
+from app.core.tracing import get_trace_id, start_span
+from app.core.transcripts import transcript_writer
+from app.core.usage import usage_ledger
+from app.middleware.rate_limit import charge_tokens, get_rate_limit_key, token_budget_exhausted
+from app.middleware.tracing import TracedRoute
 from app.models.chat import ChatRequest, ChatStreamChunk
-from app.services.chat_service import stream_chat_tokens
+from app.services.chat_service import BACKEND_NAME, count_tokens, stream_chat_tokens
 
-router = APIRouter(prefix="/chat", tags=["chat"])
+router = APIRouter(prefix="/chat", tags=["chat"], route_class=TracedRoute)
 
 
 @router.post(
@@ -15,7 +29,9 @@ router = APIRouter(prefix="/chat", tags=["chat"])
     summary="Stream chat responses",
     description="Streams chat responses using Server-Sent Events (SSE). "
     "Requires authentication via API Key or OAuth Bearer token. "
-    "Returns a stream of ChatStreamChunk objects.",
+    "Returns a stream of ChatStreamChunk objects. If the worker shuts down mid-stream, "
+    "the stream ends with an `event: drain` message carrying a retry hint and the number "
+    "of tokens already sent, so the client can reconnect to another worker.",
     responses={
         200: {
             "description": "Streaming response with chat tokens",
@@ -40,17 +56,26 @@ router = APIRouter(prefix="/chat", tags=["chat"])
             },
         },
         429: {
-            "description": "Rate limit exceeded",
+            "description": "Rate limit, token budget or concurrent stream limit exceeded",
             "content": {
                 "application/json": {
                     "example": {"detail": "Rate limit exceeded: 60 requests per minute"}
                 }
             },
         },
+        503: {
+            "description": "Worker is shutting down; retry on another connection",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Worker is shutting down; retry the stream"}
+                }
+            },
+        },
     },
 )
 async def chat_stream(
     request: ChatRequest,
+    http_request: Request,
     db: DatabaseSession = Depends(get_db),
     api_key: str
     | None = Header(
@@ -75,6 +100,7 @@ async def chat_stream(
 
     Args:
         request: Chat request with messages
+        http_request: Raw HTTP request (used for the stream limiter key)
         db: Database session
         api_key: Optional API key header
         authorization: Optional OAuth bearer token
@@ -85,19 +111,126 @@ async def chat_stream(
 
     Raises:
         HTTPException: 401 if authentication fails
-        HTTPException: 429 if rate limit is exceeded
+        HTTPException: 429 if rate limit, token budget or concurrent stream limit is exceeded
+        HTTPException: 503 if the worker is draining before shutdown
     """
     user_message = request.messages[-1].content
+    started_at = time.time()
+
+    if drain_controller.draining:
+        drain_controller.refuse()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Worker is shutting down; retry the stream",
+            # Close the keep-alive connection so the retry lands on another worker
+            headers={"Retry-After": drain_controller.retry_after, "Connection": "close"},
+        )
+
+    limit_key = get_rate_limit_key(http_request)
+    plan = auth.plan
+    if plan is not None and token_budget_exhausted(limit_key, plan):
+        RATE_LIMIT_REJECTIONS.labels("token_budget").inc()
+        http_request.state.rate_limit = "rejected:token_budget"
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Token budget exhausted: {plan.token_budget} tokens per day",
+        )
+
+    slot = get_stream_limiter().try_acquire(limit_key)
+    if slot is None:
+        RATE_LIMIT_REJECTIONS.labels("concurrent_streams").inc()
+        http_request.state.rate_limit = "rejected:concurrent_streams"
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Too many concurrent streams: {settings.STREAM_CONCURRENCY_LIMIT} allowed",
+            headers={"Retry-After": str(settings.STREAM_CONCURRENCY_RETRY_AFTER)},
+        )
+
+    timer = stream_metrics.timer(http_request.url.path, BACKEND_NAME)
+    # Read by the access log once the stream has finished
+    http_request.state.stream_timer = timer
+
+    trace_id = get_trace_id()
+    generated: list[str] = []
+    recorded = False
+
+    def record_exchange(outcome: str) -> None:
+        # Queued or counted in memory only; background tasks write them in bulk
+        nonlocal recorded
+        if recorded:
+            return
+        recorded = True
+        duration = time.perf_counter() - timer.start
+        prompt_tokens = sum(count_tokens(message.content) for message in request.messages)
+        usage_ledger.record(auth.user_id, prompt_tokens, len(generated), duration)
+        charge_tokens(limit_key, auth.plan, prompt_tokens + len(generated))
+        transcript_writer.record(
+            (
+                started_at,
+                trace_id,
+                auth.user_id,
+                auth.auth_method,
+                BACKEND_NAME,
+                request.messages,
+                generated,
+                outcome,
+                len(generated),
+                None if timer.first is None else (timer.first - timer.start) * 1000,
+                duration * 1000,
+            )
+        )
 
     async def event_generator():
-        async for chunk in stream_chat_tokens(user_message):
-            # Validate chunk structure matches ChatStreamChunk model
-            chunk_model = ChatStreamChunk(**chunk)
-            yield f"data: {chunk_model.model_dump_json()}\n\n"
+        stream_span = start_span("chat.stream")
+        ttft_span = start_span("llm.ttft")
+        tokens = 0
+        completed = False
+        outcome = "aborted"
+        try:
+            chunks = drain_controller.guard(stream_chat_tokens(user_message))
+            async with aclosing(chunks):
+                async for chunk in chunks:
+                    if tokens == 0:
+                        ttft_span.end()
+                    tokens += 1
+                    if not chunk["finished"]:
+                        timer.token()
+                        generated.append(chunk["token"])
+                    # Validate chunk structure matches ChatStreamChunk model
+                    chunk_model = ChatStreamChunk(**chunk)
+                    yield f"data: {chunk_model.model_dump_json()}\n\n"
+            completed = True
+            outcome = "completed"
+        except StreamCut:
+            # The worker is exiting: tell the client where to pick up instead of dropping it
+            outcome = "drained"
+            stream_span.set_attribute("drained", True)
+            yield drain_controller.resume_event(trace_id, len(generated))
+        except BaseException as exc:
+            stream_span.set_attribute("error", type(exc).__name__)
+            if isinstance(exc, Exception):
+                outcome = "error"
+            raise
+        finally:
+            # Runs on completion, error, or cancellation after a client disconnect
+            slot.release()
+            timer.finish(completed)
+            record_exchange(outcome)
+            if tokens == 0:
+                ttft_span.end()
+            stream_span.set_attribute("chunks", tokens)
+            stream_span.end()
+
+    def release_unfinished() -> None:
+        # Covers a generator that was never started or never resumed
+        slot.release()
+        timer.finish(completed=False)
+        record_exchange("aborted")
 
     return StreamingResponse(
         event_generator(),
         media_type="text/event-stream",
+        background=BackgroundTask(release_unfinished),
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
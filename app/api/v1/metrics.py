@@ -0,0 +1,28 @@
+from fastapi import APIRouter
+
+from app.core.loop_monitor import get_loop_monitor
+from app.core.metrics import stream_metrics
+from app.models.metrics import MetricsResponse
+
+router = APIRouter()
+
+
+@router.get(
+    "/metrics",
+    response_model=MetricsResponse,
+    summary="Streaming latency metrics",
+    description="Time to first token, inter-token latency, stream duration and tokens per "
+    "second with p50/p90/p99, per route and backend, plus event loop lag. Values cover "
+    "the worker process that serves the request.",
+    tags=["metrics"],
+)
+async def get_metrics() -> MetricsResponse:
+    """
+    Return streaming latency and event loop lag summaries for this worker.
+
+    Returns:
+        MetricsResponse: Histogram summaries per route and backend, and loop lag
+    """
+    return MetricsResponse(
+        streams=stream_metrics.snapshot(), event_loop_lag_ms=get_loop_monitor().snapshot()
+    )
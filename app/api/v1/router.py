@@ -1,11 +1,15 @@
 from fastapi import APIRouter
 
+from app.api.v1.admin import router as admin_router
 from app.api.v1.auth import router as auth_router
 from app.api.v1.chat import router as chat_router
 from app.api.v1.health import router as health_router
+from app.api.v1.metrics import router as metrics_router
 
 router = APIRouter(prefix="/v1")
 
 router.include_router(health_router, tags=["health"])
 router.include_router(chat_router, tags=["chat"])
 router.include_router(auth_router)
+router.include_router(metrics_router, tags=["metrics"])
+router.include_router(admin_router)
@@ -0,0 +1,201 @@
+"""
+Structured JSON access log written off the event loop.
+
+Requests append one tuple to a bounded in-memory queue; a writer thread wakes
+every ``flush_interval`` seconds (or as soon as a batch is waiting), encodes the
+records as JSON lines and writes each batch with a single call to the sink.
+The event loop never formats, encodes or writes a log line.
+
+When the queue is full the ``overflow`` policy decides what is lost:
+``drop_new`` discards the incoming record, ``drop_old`` evicts the oldest
+queued one. Either way ``record`` returns immediately; drops are counted in
+``access_log_dropped_total``.
+
+Sinks: ``-`` (stdout), a file path (opened for append), ``tcp://host:port``
+(newline-delimited JSON stream, reconnected after errors) or
+``udp://host:port`` (one datagram per record).
+"""
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+
+from app.core.config import settings
+from app.core.prometheus import ACCESS_LOG_DROPPED
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop_new", "drop_old")
+
+# Field order of the tuples passed to ``AccessLog.record``
+FIELDS = (
+    "ts",
+    "method",
+    "path",
+    "status",
+    "duration_ms",
+    "bytes",
+    "client",
+    "trace_id",
+    "user_id",
+    "auth_method",
+    "rate_limit",
+    "ttft_ms",
+    "tokens",
+)
+
+
+class _FileSink:
+    def __init__(self, target: str):
+        if target == "-":
+            self._fd = sys.stdout.fileno()
+            self._owned = False
+        else:
+            self._fd = os.open(target, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o640)
+            self._owned = True
+
+    def write(self, lines: list[bytes]) -> None:
+        data = memoryview(b"".join(lines))
+        while data:
+            data = data[os.write(self._fd, data) :]
+
+    def close(self) -> None:
+        if self._owned:
+            os.close(self._fd)
+
+
+class _SocketSink:
+    def __init__(self, kind: int, host: str, port: int):
+        self._kind = kind
+        self._address = (host, port)
+        self._sock: socket.socket | None = None
+
+    def write(self, lines: list[bytes]) -> None:
+        if self._sock is None:
+            if self._kind == socket.SOCK_STREAM:
+                self._sock = socket.create_connection(self._address, timeout=5.0)
+            else:
+                self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            if self._kind == socket.SOCK_STREAM:
+                self._sock.sendall(b"".join(lines))
+            else:
+                for line in lines:
+                    self._sock.sendto(line, self._address)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+def open_sink(target: str):
+    """Open the sink named by an ``ACCESS_LOG_TARGET`` value."""
+    parts = urlsplit(target)
+    if parts.scheme in ("tcp", "udp"):
+        kind = socket.SOCK_STREAM if parts.scheme == "tcp" else socket.SOCK_DGRAM
+        return _SocketSink(kind, parts.hostname, parts.port)
+    return _FileSink(target)
+
+
+class AccessLog:
+    """Bounded queue of access records drained by a background writer thread."""
+
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        batch_size: int = 256,
+        flush_interval: float = 0.5,
+        overflow: str = "drop_new",
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, got {overflow!r}")
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drop_oldest = overflow == "drop_old"
+        # A bounded deque evicts its oldest item on append, atomically
+        self._queue: deque[tuple] = deque(maxlen=maxsize if self.drop_oldest else None)
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread: threading.Thread | None = None
+        self._sink = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def record(self, entry: tuple) -> None:
+        """Queue one record (see ``FIELDS``); a no-op until the writer starts."""
+        if self._thread is None:
+            return
+        queue = self._queue
+        if len(queue) >= self.maxsize:
+            self.dropped += 1
+            ACCESS_LOG_DROPPED.labels("overflow").inc()
+            if not self.drop_oldest:
+                return
+        queue.append(entry)
+        if len(queue) == self.batch_size:
+            self._wake.set()
+
+    def start(self, sink) -> None:
+        """Start the writer thread for ``sink`` (an object with ``write``/``close``)."""
+        if self._thread is not None:
+            return
+        self._sink = sink
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="access-log", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Write everything queued, stop the writer thread and close the sink."""
+        thread = self._thread
+        if thread is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        thread.join()
+        self._thread = None
+        self._sink.close()
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._drain()
+        self._drain()
+
+    def _drain(self) -> None:
+        queue = self._queue
+        while queue:
+            lines = []
+            while queue and len(lines) < self.batch_size:
+                values = queue.popleft()
+                lines.append(json.dumps(dict(zip(FIELDS, values, strict=True))).encode() + b"\n")
+            try:
+                self._sink.write(lines)
+            except OSError:
+                self.failed += len(lines)
+                ACCESS_LOG_DROPPED.labels("write_error").inc(len(lines))
+                logger.warning("Dropped %d access log records: sink unavailable", len(lines))
+                return
+            self.written += len(lines)
+
+
+access_log = AccessLog(
+    maxsize=settings.ACCESS_LOG_QUEUE_SIZE,
+    batch_size=settings.ACCESS_LOG_BATCH_SIZE,
+    flush_interval=settings.ACCESS_LOG_FLUSH_INTERVAL,
+    overflow=settings.ACCESS_LOG_OVERFLOW,
+)
@@ -2,14 +2,15 @@ from fastapi import HTTPException, Security, status
 from fastapi.security import APIKeyHeader
 
 from app.core.config import settings
+from app.core.key_store import KeyRecord, get_key_store
 
 api_key_header = APIKeyHeader(name=settings.API_KEY_HEADER, auto_error=False)
 
 
-def verify_api_key_value(api_key: str):
+def verify_api_key_record(api_key: str) -> KeyRecord:
     """
-    Verify API key value directly (for use in unified auth).
-    Returns user_id if valid, raises HTTPException if invalid.
+    Verify API key value and return its key record (user and plan).
+    Raises HTTPException if the key is missing or invalid.
     """
     if not api_key:
         raise HTTPException(
@@ -18,15 +19,23 @@ def verify_api_key_value(api_key: str):
             headers={"WWW-Authenticate": "ApiKey"},
         )
 
-    user_id = settings.API_KEYS.get(api_key)
-    if not user_id:
+    record = get_key_store().lookup(api_key)
+    if record is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid API key",
             headers={"WWW-Authenticate": "ApiKey"},
         )
 
-    return user_id
+    return record
+
+
+def verify_api_key_value(api_key: str):
+    """
+    Verify API key value directly (for use in unified auth).
+    Returns user_id if valid, raises HTTPException if invalid.
+    """
+    return verify_api_key_record(api_key).user_id
 
 
 async def verify_api_key(api_key: str = Security(api_key_header)):
@@ -36,5 +45,5 @@ async def verify_api_key(api_key: str = Security(api_key_header)):
     """
     from app.core.auth import AuthContext
 
-    user_id = verify_api_key_value(api_key)
-    return AuthContext(user_id=user_id)
+    record = verify_api_key_record(api_key)
+    return AuthContext(user_id=record.user_id, auth_method="api_key", plan=record.plan)
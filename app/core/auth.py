@@ -1,12 +1,15 @@
-from fastapi import Header, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 
+from app.core.config import settings
+from app.core.key_store import KeyPlan
 from app.core.oauth import verify_bearer_token
 
 
 class AuthContext:
-    def __init__(self, user_id: str, auth_method: str = "unknown"):
+    def __init__(self, user_id: str, auth_method: str = "unknown", plan: KeyPlan | None = None):
         self.user_id = user_id
         self.auth_method = auth_method
+        self.plan = plan
 
 
 async def get_auth_context(
@@ -20,10 +23,12 @@ async def get_auth_context(
     # Try API Key authentication first
     if api_key:
         try:
-            from app.core.api_key_auth import verify_api_key_value
+            from app.core.api_key_auth import verify_api_key_record
 
-            user_id = verify_api_key_value(api_key)
-            auth_context = AuthContext(user_id=user_id, auth_method="api_key")
+            record = verify_api_key_record(api_key)
+            auth_context = AuthContext(
+                user_id=record.user_id, auth_method="api_key", plan=record.plan
+            )
             return auth_context
         except HTTPException:
             pass
@@ -34,8 +39,10 @@ async def get_auth_context(
             auth_context_result: AuthContext = await verify_bearer_token(authorization)
             auth_context_result.auth_method = "oauth"
             return auth_context_result
-        except HTTPException:
-            pass
+        except HTTPException as exc:
+            # Provider outages are not authentication failures
+            if exc.status_code >= 500:
+                raise
 
     # If neither works, raise authentication error
     raise HTTPException(
@@ -45,6 +52,16 @@ async def get_auth_context(
     )
 
 
+async def require_admin(auth: AuthContext = Depends(get_auth_context)) -> AuthContext:
+    """Dependency that requires an authenticated user listed in ``ADMIN_USER_IDS``."""
+    if auth.user_id not in settings.ADMIN_USER_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+    return auth
+
+
 # Separate dependencies for explicit auth method selection
 async def require_api_key() -> AuthContext:
     """Dependency that requires API key authentication."""
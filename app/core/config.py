@@ -8,6 +8,12 @@ class Settings(BaseSettings):
         "test-api-key-123": "user1",
         "test-api-key-456": "user2",
     }
+    # Hashed key store with per-key plans (.json or SQLite); API_KEYS is used if unset
+    API_KEY_STORE_PATH: str | None = None
+    API_KEY_STORE_RELOAD_INTERVAL: float = 30.0
+
+    # Users allowed on /api/v1/admin endpoints (profiling, usage reports)
+    ADMIN_USER_IDS: list[str] = []
 
     # OAuth Settings
     OAUTH_CLIENT_ID: str = "your-client-id"
@@ -15,12 +21,106 @@ class Settings(BaseSettings):
     OAUTH_AUTHORIZATION_URL: str = "https://oauth.provider.com/authorize"
     OAUTH_TOKEN_URL: str = "https://oauth.provider.com/token"
     OAUTH_REDIRECT_URI: str = "http://localhost:8000/api/v1/auth/callback"
+    # Shared client for all provider calls (token exchange, JWKS, introspection)
+    OAUTH_HTTP_TIMEOUT: float = 5.0
+    OAUTH_HTTP_MAX_CONNECTIONS: int = 100
+    OAUTH_TOKEN_MAX_ATTEMPTS: int = 3
+    OAUTH_RETRY_BUDGET_RATIO: float = 0.1  # retries allowed per request, on average
+    # JWT verification against the provider's JWKS (demo tokens are accepted if unset)
+    OAUTH_JWKS_URL: str | None = None
+    OAUTH_ISSUER: str | None = None
+    OAUTH_AUDIENCE: str | None = None
+    OAUTH_JWT_ALGORITHMS: list[str] = ["RS256"]
+    JWKS_CACHE_TTL: int = 300
+    JWKS_MIN_REFETCH_INTERVAL: float = 30.0
+    JWT_CLAIMS_CACHE_SIZE: int = 10000
+    # RFC 7662 introspection for opaque access tokens
+    OAUTH_INTROSPECTION_URL: str | None = None
+    OAUTH_INTROSPECTION_CACHE_TTL: int = 300
+    OAUTH_INTROSPECTION_NEGATIVE_TTL: int = 30
+    CIRCUIT_BREAKER_FAILURES: int = 5
+    CIRCUIT_BREAKER_RESET_TIMEOUT: float = 30.0
 
     # Rate Limiting Settings
     RATE_LIMIT_ENABLED: bool = True
     RATE_LIMIT_PER_MINUTE: int = 60
     RATE_LIMIT_PER_HOUR: int = 1000
     REDIS_URL: str | None = None  # Optional: "redis://localhost:6379"
+    # Node-wide counters in shared memory (created by the gunicorn master)
+    RATE_LIMIT_SHARED_MEMORY: bool = False
+    RATE_LIMIT_SHARED_SLOTS: int = 65536
+    # "exact" counts every request centrally; "lease" spends leased quota locally
+    RATE_LIMIT_MODE: str = "exact"
+    RATE_LIMIT_LEASE_FRACTION: float = 0.1  # share of a window's limit per lease
+    RATE_LIMIT_LEASE_SYNC_INTERVAL: float = 1.0  # seconds between batched lease returns
+
+    # Concurrent stream limits
+    STREAM_CONCURRENCY_LIMIT: int = 10  # open chat streams per user
+    STREAM_CONCURRENCY_SHARED: bool = False  # count node-wide via shared memory
+    STREAM_CONCURRENCY_RETRY_AFTER: int = 5
+    STREAM_SLOT_TTL: int = 3600  # upper bound on slots leaked by killed workers
+
+    # Tracing (W3C trace context); spans are exported only if TRACE_EXPORT_URL is set
+    TRACE_SERVICE_NAME: str = "ai-chat-service"
+    TRACE_SAMPLE_RATIO: float = 0.1  # head sampling for requests without a traceparent
+    TRACE_TAIL_LATENCY_MS: float = 2000.0  # unsampled requests slower than this are kept
+    TRACE_BUFFER_SIZE: int = 8192
+    TRACE_EXPORT_URL: str | None = None
+    TRACE_EXPORT_INTERVAL: float = 2.0
+    TRACE_EXPORT_BATCH_SIZE: int = 512
+
+    # Event loop lag monitoring and load shedding
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_LAG_SAMPLE_INTERVAL: float = 0.1
+    LOOP_SLOW_CALLBACK_THRESHOLD: float = 0.25  # log the loop's stack when blocked this long
+    LOOP_LAG_SHED_THRESHOLD: float | None = 0.5  # 503 new requests above this lag; None disables
+    LOAD_SHED_RETRY_AFTER: int = 1
+
+    # Database: sqlite:///path (aiosqlite) or postgresql://... (asyncpg)
+    DATABASE_URL: str = "sqlite:///:memory:"
+    DATABASE_POOL_MIN_SIZE: int = 1
+    DATABASE_POOL_MAX_SIZE: int = 10
+    DATABASE_POOL_TIMEOUT: float = 5.0  # seconds to wait for a free connection
+    DATABASE_HEALTH_CHECK_AFTER: float = 30.0  # ping connections idle longer than this
+
+    # Worker shutdown: in-flight streams get this long before a final resumable
+    # event is sent; keep it below gunicorn's graceful_timeout
+    DRAIN_TIMEOUT: float = 25.0
+    DRAIN_RETRY_MS: int = 1000  # SSE retry hint sent with the final event
+
+    # Chat transcripts are queued and bulk-inserted by a background task
+    TRANSCRIPTS_ENABLED: bool = True
+    TRANSCRIPT_QUEUE_SIZE: int = 10000
+    TRANSCRIPT_BATCH_SIZE: int = 200
+    TRANSCRIPT_FLUSH_INTERVAL: float = 1.0
+
+    # Per-user usage counters, flushed to the database as additive upserts
+    USAGE_LEDGER_ENABLED: bool = True
+    USAGE_FLUSH_INTERVAL: float = 10.0
+
+    # Readiness probes run in the background; /api/v1/ready answers from their cache
+    READINESS_INTERVAL: float = 5.0
+    READINESS_TIMEOUT: float = 2.0  # per probe
+    # Probes whose failure makes the worker not ready; others only report "degraded"
+    READINESS_CRITICAL: list[str] = ["database", "redis", "llm_backend"]
+
+    # Answer GET /api/v1/health with a pre-encoded response ahead of all middleware
+    HEALTH_FAST_PATH_ENABLED: bool = True
+
+    # JSON access log written by a background thread; "-" (stdout), a file path,
+    # tcp://host:port or udp://host:port. None disables it.
+    ACCESS_LOG_TARGET: str | None = None
+    ACCESS_LOG_QUEUE_SIZE: int = 10000
+    ACCESS_LOG_BATCH_SIZE: int = 256
+    ACCESS_LOG_FLUSH_INTERVAL: float = 0.5
+    ACCESS_LOG_OVERFLOW: str = "drop_new"  # or "drop_old" when the queue is full
+
+    # On-demand profiler (/api/v1/admin/profile)
+    PROFILER_MAX_SECONDS: float = 60.0
+
+    # Application lifespan
+    RESOURCE_SHUTDOWN_TIMEOUT: float = 10.0
+    WARMUP_ENABLED: bool = True  # build schemas, validators and imports before traffic
 
     model_config = SettingsConfigDict(env_file=".env", case_sensitive=True)
 
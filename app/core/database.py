@@ -1,11 +1,393 @@
+"""
+Async database access through a per-worker connection pool.
+
+``DATABASE_URL`` selects the driver: ``sqlite:///path`` (aiosqlite, the local
+stand-in; ``sqlite:///:memory:`` is one in-memory database shared by the
+pool's connections) or ``postgresql://...`` (asyncpg, imported only when
+configured). SQL is written once with Postgres ``$1`` placeholders and runs
+unchanged on SQLite, where they become ``?1``. SQLite takes one writer at a
+time (and a shared-cache database locks whole tables), so the SQLite driver
+runs one statement at a time per pool and holds that turn from ``BEGIN`` to
+``COMMIT`` or ``ROLLBACK``; concurrent sessions queue instead of failing
+with "database table is locked".
+
+The pool keeps up to ``max_size`` connections and reuses the most recently
+released one first. A connection idle for longer than ``health_check_after``
+is pinged before it is handed out and replaced if the ping fails.
+Statements are prepared once per connection: asyncpg prepares the ones
+declared with ``Statement`` when the connection opens, and both drivers keep
+a per-connection cache of prepared statements for the rest.
+
+Request handlers get a ``DatabaseSession`` from ``get_db``. It takes a
+connection from the pool on its first query only, so routes that declare
+the dependency but never query do not hold a connection.
+"""
+import asyncio
+import itertools
+import re
+import time
+from collections.abc import AsyncIterator, Iterable, Sequence
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any
+
+from app.core.config import settings
+
+_PLACEHOLDER = re.compile(r"\$(\d+)")
+_memory_databases = itertools.count()
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the pool's acquire timeout."""
+
+
+class Statement:
+    """
+    A query used on hot paths; asyncpg prepares it when each connection opens.
+
+    Declare statements at module level so they exist before the pool does.
+    """
+
+    registry: list["Statement"] = []
+
+    __slots__ = ("sql",)
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        Statement.registry.append(self)
+
+    def __repr__(self) -> str:
+        return f"Statement({self.sql!r})"
+
+
+SELECT_ONE = Statement("SELECT 1")
+
+
+def is_process_local(url: str) -> bool:
+    """True for ``sqlite:///:memory:``, of which every worker process has its own copy."""
+    return url.startswith("sqlite:") and url.removeprefix("sqlite://").removeprefix("/") in (
+        "",
+        ":memory:",
+    )
+
+
+@lru_cache(maxsize=512)
+def _sqlite_sql(sql: str) -> str:
+    return _PLACEHOLDER.sub(r"?\1", sql)
+
+
+class _SQLiteDriver:
+    def __init__(self, url: str):
+        path = url.removeprefix("sqlite://").removeprefix("/")
+        if path in ("", ":memory:"):
+            # A named shared-cache database, so every pooled connection sees the same data
+            path = f"file:memdb{next(_memory_databases)}?mode=memory&cache=shared"
+        self.database = path
+        # Held for one statement, or by ``_owner`` for a whole transaction
+        self._lock = asyncio.Lock()
+        self._owner = None
+
+    @asynccontextmanager
+    async def _turn(self, raw) -> AsyncIterator[None]:
+        if self._owner is not raw:
+            await self._lock.acquire()
+            self._owner = raw
+        try:
+            yield
+        finally:
+            # Keep the turn until the connection's transaction, if any, ends
+            if self.is_closed(raw) or not raw.in_transaction:
+                self._owner = None
+                self._lock.release()
+
+    async def connect(self):
+        import aiosqlite
+
+        # isolation_level=None: autocommit unless a transaction is opened explicitly
+        connection = aiosqlite.connect(
+            self.database, uri=self.database.startswith("file:"), isolation_level=None
+        )
+        # Pooled connections outlive requests; their worker thread must not
+        # keep the interpreter alive when a pool is never closed
+        connection._thread.daemon = True
+        return await connection
+
+    async def prepare(self, raw) -> dict:
+        # sqlite3 compiles each statement once per connection and caches it
+        return {}
+
+    def is_closed(self, raw) -> bool:
+        # aiosqlite has no public flag; close() clears the sqlite3 connection
+        return getattr(raw, "_connection", None) is None
+
+    async def close(self, raw) -> None:
+        if self._owner is raw:
+            # Closing rolls the open transaction back
+            self._owner = None
+            self._lock.release()
+        await raw.close()
+
+    async def execute(self, raw, prepared: dict, sql: str, args: Sequence) -> None:
+        async with self._turn(raw):
+            await raw.execute(_sqlite_sql(sql), args)
+
+    async def executemany(self, raw, prepared: dict, sql: str, args: Iterable[Sequence]) -> None:
+        async with self._turn(raw):
+            await raw.executemany(_sqlite_sql(sql), args)
+
+    async def fetch(self, raw, prepared: dict, sql: str, args: Sequence) -> list:
+        async with self._turn(raw):
+            async with raw.execute(_sqlite_sql(sql), args) as cursor:
+                return list(await cursor.fetchall())
+
+
+class _PostgresDriver:
+    def __init__(self, url: str):
+        self.dsn = url
+
+    async def connect(self):
+        import asyncpg
+
+        return await asyncpg.connect(self.dsn)
+
+    async def prepare(self, raw) -> dict:
+        return {stmt.sql: await raw.prepare(stmt.sql) for stmt in Statement.registry}
+
+    def is_closed(self, raw) -> bool:
+        return raw.is_closed()
+
+    async def close(self, raw) -> None:
+        await raw.close()
+
+    async def execute(self, raw, prepared: dict, sql: str, args: Sequence) -> None:
+        statement = prepared.get(sql)
+        if statement is not None:
+            await statement.fetch(*args)
+        else:
+            await raw.execute(sql, *args)
+
+    async def executemany(self, raw, prepared: dict, sql: str, args: Iterable[Sequence]) -> None:
+        await raw.executemany(sql, args)
+
+    async def fetch(self, raw, prepared: dict, sql: str, args: Sequence) -> list:
+        statement = prepared.get(sql)
+        if statement is not None:
+            return await statement.fetch(*args)
+        return await raw.fetch(sql, *args)
+
+
+def _driver_for(url: str):
+    scheme = url.split(":", 1)[0]
+    if scheme == "sqlite":
+        return _SQLiteDriver(url)
+    if scheme in ("postgres", "postgresql"):
+        return _PostgresDriver(url)
+    raise ValueError(f"Unsupported DATABASE_URL scheme: {scheme!r}")
+
+
+class Connection:
+    """A pooled driver connection with its prepared statements."""
+
+    __slots__ = ("raw", "prepared", "released_at")
+
+    def __init__(self, raw, prepared: dict):
+        self.raw = raw
+        self.prepared = prepared
+        self.released_at = time.monotonic()
+
+
+class ConnectionPool:
+    """Bounded pool of database connections, most recently used first."""
+
+    def __init__(
+        self,
+        url: str,
+        min_size: int = 1,
+        max_size: int = 10,
+        acquire_timeout: float = 5.0,
+        health_check_after: float = 30.0,
+    ):
+        self.driver = _driver_for(url)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_after = health_check_after
+        self._slots = asyncio.Semaphore(max_size)
+        self._idle: list[Connection] = []
+        self._size = 0
+        self._in_use = 0
+        self.replaced = 0
+
+    async def _connect(self) -> Connection:
+        self._size += 1
+        try:
+            raw = await self.driver.connect()
+            return Connection(raw, await self.driver.prepare(raw))
+        except BaseException:
+            self._size -= 1
+            raise
+
+    async def _discard(self, conn: Connection) -> None:
+        self._size -= 1
+        try:
+            await self.driver.close(conn.raw)
+        except Exception:
+            pass
+
+    async def open(self) -> None:
+        """Open ``min_size`` connections ahead of the first request."""
+        while self._size < self.min_size:
+            self._idle.append(await self._connect())
+
+    async def acquire(self) -> Connection:
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.acquire_timeout)
+        except TimeoutError:
+            raise PoolTimeout(f"No connection free within {self.acquire_timeout}s") from None
+        try:
+            while self._idle:
+                conn = self._idle.pop()
+                if self.driver.is_closed(conn.raw):
+                    await self._discard(conn)
+                    self.replaced += 1
+                    continue
+                if time.monotonic() - conn.released_at > self.health_check_after:
+                    try:
+                        await self.driver.fetch(conn.raw, conn.prepared, SELECT_ONE.sql, ())
+                    except Exception:
+                        await self._discard(conn)
+                        self.replaced += 1
+                        continue
+                break
+            else:
+                conn = await self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+        self._in_use += 1
+        return conn
+
+    async def release(self, conn: Connection) -> None:
+        self._in_use -= 1
+        if self.driver.is_closed(conn.raw):
+            await self._discard(conn)
+        else:
+            conn.released_at = time.monotonic()
+            self._idle.append(conn)
+        self._slots.release()
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[Connection]:
+        conn = await self.acquire()
+        try:
+            yield conn
+        finally:
+            await self.release(conn)
+
+    async def check(self) -> None:
+        """Readiness probe: a pooled connection answers ``SELECT 1``."""
+        async with self.connection() as conn:
+            await self.driver.fetch(conn.raw, conn.prepared, SELECT_ONE.sql, ())
+
+    async def close(self) -> None:
+        """Close idle connections; connections in use are closed on release."""
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            await self._discard(conn)
+
+    def stats(self) -> dict:
+        return {
+            "size": self._size,
+            "idle": len(self._idle),
+            "in_use": self._in_use,
+            "max_size": self.max_size,
+            "replaced": self.replaced,
+        }
+
+
 class DatabaseSession:
-    def query(self, query: str):
-        return f"executing: {query}"
+    """
+    Database access for one request.
+
+    A connection is taken from the pool on the first query and returned by
+    ``close``; sessions that never query never touch the pool.
+    """
+
+    def __init__(self, pool: "ConnectionPool"):
+        self._pool = pool
+        self._conn: Connection | None = None
+
+    @property
+    def active(self) -> bool:
+        return self._conn is not None
+
+    async def _connection(self) -> Connection:
+        if self._conn is None:
+            self._conn = await self._pool.acquire()
+        return self._conn
+
+    async def execute(self, query: "Statement | str", *args: Any) -> None:
+        conn = await self._connection()
+        await self._pool.driver.execute(conn.raw, conn.prepared, _sql(query), args)
+
+    async def executemany(self, query: "Statement | str", args: Iterable[Sequence]) -> None:
+        conn = await self._connection()
+        await self._pool.driver.executemany(conn.raw, conn.prepared, _sql(query), args)
+
+    async def fetch(self, query: "Statement | str", *args: Any) -> list:
+        conn = await self._connection()
+        return await self._pool.driver.fetch(conn.raw, conn.prepared, _sql(query), args)
+
+    async def fetchrow(self, query: "Statement | str", *args: Any):
+        rows = await self.fetch(query, *args)
+        return rows[0] if rows else None
+
+    async def fetchval(self, query: "Statement | str", *args: Any) -> Any:
+        row = await self.fetchrow(query, *args)
+        return None if row is None else row[0]
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator["DatabaseSession"]:
+        """Run the enclosed queries in one transaction, rolled back on error."""
+        await self.execute("BEGIN")
+        try:
+            yield self
+        except BaseException:
+            await self.execute("ROLLBACK")
+            raise
+        await self.execute("COMMIT")
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await self._pool.release(conn)
+
+
+def _sql(query: "Statement | str") -> str:
+    return query.sql if isinstance(query, Statement) else query
+
+
+_pool: ConnectionPool | None = None
+
+
+def get_pool() -> ConnectionPool:
+    """Return this worker's pool; connections open on first use or at startup."""
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool(
+            settings.DATABASE_URL,
+            min_size=settings.DATABASE_POOL_MIN_SIZE,
+            max_size=settings.DATABASE_POOL_MAX_SIZE,
+            acquire_timeout=settings.DATABASE_POOL_TIMEOUT,
+            health_check_after=settings.DATABASE_HEALTH_CHECK_AFTER,
+        )
+    return _pool
 
 
-def get_db():
-    db = DatabaseSession()
+async def get_db() -> AsyncIterator[DatabaseSession]:
+    """Request-scoped session; holds a pooled connection only once it queries."""
+    session = DatabaseSession(get_pool())
     try:
-        yield db
+        yield session
     finally:
-        pass
+        await session.close()
@@ -0,0 +1,179 @@
+"""
+Draining chat streams when a worker is told to exit.
+
+Gunicorn recycles workers after ``max_requests`` and stops them on reloads;
+the master kills a worker that is still busy ``graceful_timeout`` seconds
+later, cutting any SSE stream mid-token. When a worker starts shutting down
+the drain controller:
+
+* refuses new streams (503 with ``Connection: close``, so clients retry on
+  another worker),
+* lets in-flight streams run for up to ``timeout`` seconds, which should be
+  shorter than ``graceful_timeout``,
+* then ends the streams that are still running with a final resumable
+  ``drain`` event (``retry`` hint and the tokens already sent) instead of
+  letting the master cut the connection.
+
+Under gunicorn, ``app.workers.DrainingUvicornWorker`` serves with a uvicorn
+``Server`` that hands itself to ``watch`` and calls ``exit_requested`` from
+its ``handle_exit``, so a signalled exit starts the drain at once. The
+server's request count is polled too, since uvicorn ends a worker at
+``limit_max_requests`` without a signal. ``begin`` can also be called
+directly; without a watched server (plain ``uvicorn``) nothing drains.
+"""
+import asyncio
+import json
+import logging
+from collections.abc import AsyncGenerator
+from typing import TypeVar
+
+from app.core.config import settings
+from app.core.prometheus import STREAM_DRAIN
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class StreamCut(Exception):
+    """A stream was still running when the drain deadline passed."""
+
+
+def _server_exiting(server) -> bool:
+    if server.should_exit:
+        return True
+    limit = getattr(server, "limit_max_requests", server.config.limit_max_requests)
+    return limit is not None and server.server_state.total_requests >= limit
+
+
+class DrainController:
+    """Tracks in-flight streams and bounds them once the worker starts draining."""
+
+    def __init__(self, timeout: float = 25.0, retry_ms: int = 1000, poll_interval: float = 0.5):
+        self.timeout = timeout
+        self.retry_ms = retry_ms
+        self.poll_interval = poll_interval
+        self.draining = False
+        self.active = 0
+        self.finished = 0
+        self.cut = 0
+        self.refused = 0
+        self._deadline: float | None = None
+        # Timeout scopes of streams waiting for their next chunk
+        self._waiting: set[asyncio.Timeout] = set()
+        self._server = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+
+    def watch(self, server) -> None:
+        """Drain once ``server`` (a uvicorn ``Server``) exits; polled from ``start``."""
+        self._server = server
+
+    def exit_requested(self) -> None:
+        """Begin draining; safe to call from a signal handler."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self.begin)
+
+    async def start(self) -> None:
+        """Watch the serving uvicorn server, if any, and drain once it exits."""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        if self._server is not None:
+            self._task = self._loop.create_task(self._watch(self._server))
+
+    async def stop(self) -> None:
+        self._loop = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.draining:
+            logger.info("Stream drain finished: %s", self.summary())
+
+    async def _watch(self, server) -> None:
+        while not _server_exiting(server):
+            await asyncio.sleep(self.poll_interval)
+        self.begin()
+
+    def begin(self) -> None:
+        """Stop accepting streams and give running ones ``timeout`` seconds to finish."""
+        if self.draining:
+            return
+        self.draining = True
+        self._deadline = asyncio.get_running_loop().time() + self.timeout
+        for scope in self._waiting:
+            scope.reschedule(self._deadline)
+        logger.info("Draining %d streams for up to %.1fs", self.active, self.timeout)
+
+    @property
+    def retry_after(self) -> str:
+        """``Retry-After`` value (whole seconds) for refused streams."""
+        return str(max(1, round(self.retry_ms / 1000)))
+
+    def refuse(self) -> None:
+        """Count a stream refused because the worker is draining."""
+        self.refused += 1
+        STREAM_DRAIN.labels("refused").inc()
+
+    async def guard(self, chunks: AsyncGenerator[T, None]) -> AsyncGenerator[T, None]:
+        """
+        Yield from ``chunks``; raise ``StreamCut`` if the drain deadline passes.
+
+        The deadline also interrupts a wait for the next chunk that was
+        already in progress when draining began.
+        """
+        self.active += 1
+        try:
+            while True:
+                scope = asyncio.timeout_at(self._deadline)
+                try:
+                    async with scope:
+                        self._waiting.add(scope)
+                        chunk = await anext(chunks)
+                except StopAsyncIteration:
+                    break
+                except TimeoutError:
+                    if not scope.expired():
+                        raise  # raised by the backend itself
+                    self.cut += 1
+                    STREAM_DRAIN.labels("cut").inc()
+                    raise StreamCut from None
+                finally:
+                    self._waiting.discard(scope)
+                yield chunk
+            if self.draining:
+                self.finished += 1
+                STREAM_DRAIN.labels("finished").inc()
+        finally:
+            self.active -= 1
+            await chunks.aclose()
+
+    def resume_event(self, trace_id: str, tokens_sent: int) -> str:
+        """Final SSE event telling the client to reconnect to another worker."""
+        data = json.dumps(
+            {
+                "reason": "worker_draining",
+                "trace_id": trace_id,
+                "tokens_sent": tokens_sent,
+                "resumable": True,
+            }
+        )
+        return (
+            f"event: drain\nid: {trace_id}:{tokens_sent}\nretry: {self.retry_ms}\ndata: {data}\n\n"
+        )
+
+    def summary(self) -> dict:
+        return {
+            "draining": self.draining,
+            "active": self.active,
+            "finished": self.finished,
+            "cut": self.cut,
+            "refused": self.refused,
+        }
+
+
+drain_controller = DrainController(timeout=settings.DRAIN_TIMEOUT, retry_ms=settings.DRAIN_RETRY_MS)
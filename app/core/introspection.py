@@ -0,0 +1,131 @@
+"""
+RFC 7662 token introspection for opaque OAuth access tokens.
+
+All lookups share the pooled ``oauth_http`` client from the resource
+registry. Concurrent lookups of the same token collapse into a single
+in-flight request, results are cached for the token's remaining lifetime
+(inactive tokens briefly), and a circuit breaker makes provider outages fail
+fast instead of piling up requests.
+"""
+import asyncio
+import hashlib
+import time
+
+import httpx
+
+from app.core.config import settings
+from app.core.resilience import CircuitBreaker, CircuitOpenError
+from app.core.resources import resources
+
+
+class IntrospectionClient:
+    """Introspect tokens with single-flight, caching and a circuit breaker."""
+
+    def __init__(
+        self,
+        url: str,
+        client_id: str,
+        client_secret: str,
+        cache_ttl: float = 300,
+        negative_ttl: float = 30,
+        cache_size: int = 10000,
+        breaker: CircuitBreaker | None = None,
+        client: httpx.AsyncClient | None = None,
+    ):
+        self.url = url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.cache_ttl = cache_ttl
+        self.negative_ttl = negative_ttl
+        self.cache_size = cache_size
+        self.breaker = breaker or CircuitBreaker()
+        self._client = client
+        # Keyed by token digest so raw tokens are not kept in memory
+        self._cache: dict[bytes, tuple[float, dict]] = {}
+        self._inflight: dict[bytes, asyncio.Task] = {}
+        self.requests = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            return resources.get("oauth_http")
+        return self._client
+
+    async def introspect(self, token: str) -> dict:
+        """
+        Return the introspection response for ``token``.
+
+        Raises:
+            CircuitOpenError: if the provider's circuit is open
+            httpx.HTTPError: if the provider call fails
+        """
+        key = hashlib.sha256(token.encode()).digest()
+        cached = self._cache.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                return cached[1]
+            del self._cache[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._fetch(key, token))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so one caller's cancellation does not fail the others
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: bytes, token: str) -> dict:
+        if not self.breaker.allow():
+            raise CircuitOpenError("Token introspection circuit is open")
+
+        self.requests += 1
+        try:
+            response = await self.client.post(
+                self.url,
+                data={"token": token, "token_type_hint": "access_token"},
+                auth=(self.client_id, self.client_secret),
+            )
+            response.raise_for_status()
+            result = response.json()
+            if not isinstance(result, dict):
+                raise ValueError("Introspection response is not a JSON object")
+        except (httpx.HTTPError, ValueError):
+            self.breaker.record_failure()
+            raise
+        finally:
+            # Anything else (cancellation, a bug) must not leave the half-open trial taken
+            self.breaker.release()
+        self.breaker.record_success()
+
+        ttl = self.negative_ttl
+        if result.get("active"):
+            ttl = self.cache_ttl
+            if "exp" in result:
+                ttl = min(ttl, float(result["exp"]) - time.time())
+        if ttl > 0:
+            if len(self._cache) >= self.cache_size:
+                del self._cache[next(iter(self._cache))]
+            self._cache[key] = (time.monotonic() + ttl, result)
+        return result
+
+
+_introspection_client: IntrospectionClient | None = None
+
+
+def get_introspection_client() -> IntrospectionClient:
+    """Return this worker's client for ``OAUTH_INTROSPECTION_URL``."""
+    global _introspection_client
+    if _introspection_client is None:
+        if not settings.OAUTH_INTROSPECTION_URL:
+            raise RuntimeError("OAUTH_INTROSPECTION_URL is not configured")
+        _introspection_client = IntrospectionClient(
+            settings.OAUTH_INTROSPECTION_URL,
+            settings.OAUTH_CLIENT_ID,
+            settings.OAUTH_CLIENT_SECRET,
+            cache_ttl=settings.OAUTH_INTROSPECTION_CACHE_TTL,
+            negative_ttl=settings.OAUTH_INTROSPECTION_NEGATIVE_TTL,
+            breaker=CircuitBreaker(
+                settings.CIRCUIT_BREAKER_FAILURES, settings.CIRCUIT_BREAKER_RESET_TIMEOUT
+            ),
+        )
+    return _introspection_client
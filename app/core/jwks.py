@@ -0,0 +1,204 @@
+"""
+JWT verification against a provider's JWKS.
+
+Signing keys are fetched from ``OAUTH_JWKS_URL`` and cached by ``kid``. The key
+set is refreshed in the background shortly before it expires. Tokens with an
+unknown ``kid``, and requests while the provider is failing, trigger at most
+one refetch per ``JWKS_MIN_REFETCH_INTERVAL`` so neither forged headers nor an
+outage can turn into a request flood against the provider.
+Verified claims are cached until the token's ``exp``.
+"""
+import asyncio
+import re
+import time
+
+import httpx
+
+from app.core.config import settings
+from app.core.resources import resources
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class JWKSCache:
+    """Signing keys by ``kid``, refreshed before expiry."""
+
+    def __init__(
+        self,
+        url: str,
+        ttl: float = 300,
+        min_refetch_interval: float = 30,
+        refresh_margin: float = 0.2,
+        client: httpx.AsyncClient | None = None,
+    ):
+        self.url = url
+        self.ttl = ttl
+        self.min_refetch_interval = min_refetch_interval
+        self.refresh_margin = refresh_margin
+        self._client = client
+        self._keys: dict[str, dict] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._refresh_task: asyncio.Task | None = None
+        self.fetches = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            return resources.get("oauth_http")
+        return self._client
+
+    def _may_refetch(self, now: float) -> bool:
+        if self._refresh_task is not None and not self._refresh_task.done():
+            # Joining the fetch in flight costs the provider nothing
+            return True
+        return self.fetches == 0 or now - self._fetched_at >= self.min_refetch_interval
+
+    async def get_key(self, kid: str | None) -> dict | None:
+        """
+        Return the JWK for ``kid``, fetching or refreshing the key set as needed.
+
+        Raises:
+            ValueError: if the key set has expired and the last fetch failed
+            less than ``min_refetch_interval`` ago
+        """
+        now = time.monotonic()
+        if now >= self._expires_at:
+            if not self._may_refetch(now):
+                raise ValueError("JWKS fetch failed; waiting before the next attempt")
+            await self.refresh()
+        elif now >= self._expires_at - self.ttl * self.refresh_margin:
+            self._schedule_refresh()
+
+        key = self._keys.get(kid or "")
+        if key is None and self._may_refetch(time.monotonic()):
+            # Possibly a rotated key; refetch, but no more than once per interval
+            await self.refresh()
+            key = self._keys.get(kid or "")
+        return key
+
+    async def check(self) -> int:
+        """
+        Number of unexpired signing keys, for readiness probes.
+
+        An expired key set is refetched, at most once per
+        ``min_refetch_interval`` while the provider keeps failing.
+        """
+        now = time.monotonic()
+        if now >= self._expires_at and self._may_refetch(now):
+            await self.refresh()
+        if time.monotonic() >= self._expires_at:
+            return 0
+        return len(self._keys)
+
+    def _schedule_refresh(self) -> asyncio.Task:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self._fetch())
+            # A failed background refresh keeps the current keys until they expire
+            self._refresh_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return self._refresh_task
+
+    async def refresh(self) -> None:
+        """Fetch the key set; concurrent callers share one request."""
+        await asyncio.shield(self._schedule_refresh())
+
+    async def _fetch(self) -> None:
+        self._fetched_at = time.monotonic()
+        self.fetches += 1
+        response = await self.client.get(self.url)
+        response.raise_for_status()
+
+        keys = {}
+        for jwk in response.json().get("keys", []):
+            keys[jwk.get("kid", "")] = jwk
+        self._keys = keys
+
+        ttl = self.ttl
+        match = _MAX_AGE.search(response.headers.get("cache-control", ""))
+        if match:
+            ttl = min(ttl, int(match.group(1)))
+        self._expires_at = time.monotonic() + ttl
+
+
+class JWTVerifier:
+    """Verify JWT signatures and standard claims, caching results until ``exp``."""
+
+    def __init__(
+        self,
+        jwks: JWKSCache,
+        algorithms: list[str],
+        issuer: str | None = None,
+        audience: str | None = None,
+        cache_size: int = 10000,
+    ):
+        self.jwks = jwks
+        self.algorithms = algorithms
+        self.issuer = issuer
+        self.audience = audience
+        self.cache_size = cache_size
+        self._claims: dict[str, tuple[float, dict]] = {}
+
+    async def verify(self, token: str) -> dict:
+        """
+        Verify ``token`` and return its claims.
+
+        Raises:
+            JWTError: if the token is malformed, signed by an unknown key,
+            expired, or fails issuer/audience checks
+        """
+        from jose import JWTError, jwt
+
+        cached = self._claims.get(token)
+        if cached is not None:
+            if cached[0] > time.time():
+                return cached[1]
+            del self._claims[token]
+
+        header = jwt.get_unverified_header(token)
+        try:
+            key = await self.jwks.get_key(header.get("kid"))
+        except (httpx.HTTPError, ValueError) as err:
+            raise JWTError("Signing keys unavailable") from err
+        if key is None:
+            raise JWTError("Unknown signing key")
+
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=self.algorithms,
+            audience=self.audience,
+            issuer=self.issuer,
+            options={"verify_aud": self.audience is not None},
+        )
+
+        exp = claims.get("exp")
+        if exp is not None:
+            if len(self._claims) >= self.cache_size:
+                # Evict the oldest entry (dicts keep insertion order)
+                del self._claims[next(iter(self._claims))]
+            self._claims[token] = (float(exp), claims)
+        return claims
+
+
+_jwt_verifier: JWTVerifier | None = None
+
+
+def get_jwt_verifier() -> JWTVerifier:
+    """Return this worker's verifier for ``OAUTH_JWKS_URL``."""
+    global _jwt_verifier
+    if _jwt_verifier is None:
+        if not settings.OAUTH_JWKS_URL:
+            raise RuntimeError("OAUTH_JWKS_URL is not configured")
+        jwks = JWKSCache(
+            settings.OAUTH_JWKS_URL,
+            ttl=settings.JWKS_CACHE_TTL,
+            min_refetch_interval=settings.JWKS_MIN_REFETCH_INTERVAL,
+        )
+        _jwt_verifier = JWTVerifier(
+            jwks,
+            algorithms=settings.OAUTH_JWT_ALGORITHMS,
+            issuer=settings.OAUTH_ISSUER,
+            audience=settings.OAUTH_AUDIENCE,
+            cache_size=settings.JWT_CLAIMS_CACHE_SIZE,
+        )
+    return _jwt_verifier
@@ -0,0 +1,247 @@
+"""
+API key store with per-key plans.
+
+Keys are indexed by their SHA-256 digest, so plaintext keys never need to be
+kept in memory or on disk and lookup is a single dict probe. The index is
+loaded from a JSON file or a SQLite database (``API_KEY_STORE_PATH``), or built
+from ``settings.API_KEYS`` when no store is configured. Changes to the file are
+picked up by a background reload that swaps the whole index atomically.
+
+JSON layout::
+
+    {
+        "plans": {"pro": {"rate_limit_per_minute": 600, "rate_limit_per_hour": 20000,
+                          "token_budget": 1000000, "allowed_routes": ["/api/v1/chat"]}},
+        "keys": [{"key_sha256": "<hex digest>", "user_id": "user1", "plan": "pro"}]
+    }
+
+SQLite layout: ``plans(name, rate_limit_per_minute, rate_limit_per_hour,
+token_budget, allowed_routes)`` with comma-separated routes, and
+``api_keys(key_sha256, user_id, plan)``.
+
+Rate limits are applied by ``RateLimitMiddleware`` and ``token_budget`` (prompt
+plus completion tokens per day) by the chat endpoint; both count per user.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def hash_api_key(api_key: str) -> bytes:
+    """SHA-256 digest used as the index key for ``api_key``."""
+    return hashlib.sha256(api_key.encode()).digest()
+
+
+class KeyPlan:
+    """Limits and permissions shared by every key on a plan."""
+
+    __slots__ = (
+        "name",
+        "rate_limit_per_minute",
+        "rate_limit_per_hour",
+        "token_budget",
+        "allowed_routes",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        rate_limit_per_minute: int,
+        rate_limit_per_hour: int,
+        token_budget: int | None = None,
+        allowed_routes: tuple[str, ...] = (),
+    ):
+        self.name = name
+        self.rate_limit_per_minute = rate_limit_per_minute
+        self.rate_limit_per_hour = rate_limit_per_hour
+        self.token_budget = token_budget
+        self.allowed_routes = allowed_routes
+
+    def allows(self, path: str) -> bool:
+        """Whether ``path`` falls under one of the plan's route prefixes (all if none)."""
+        return not self.allowed_routes or path.startswith(self.allowed_routes)
+
+
+class KeyRecord:
+    """A single API key: its digest, owner and plan."""
+
+    __slots__ = ("key_hash", "user_id", "plan")
+
+    def __init__(self, key_hash: bytes, user_id: str, plan: KeyPlan):
+        self.key_hash = key_hash
+        self.user_id = user_id
+        self.plan = plan
+
+
+def _default_plan() -> KeyPlan:
+    return KeyPlan(
+        "default",
+        rate_limit_per_minute=settings.RATE_LIMIT_PER_MINUTE,
+        rate_limit_per_hour=settings.RATE_LIMIT_PER_HOUR,
+    )
+
+
+def _plan_from_fields(name: str, fields: dict) -> KeyPlan:
+    routes = fields.get("allowed_routes") or ()
+    if isinstance(routes, str):
+        routes = [route for route in routes.split(",") if route]
+    return KeyPlan(
+        name,
+        rate_limit_per_minute=int(
+            fields.get("rate_limit_per_minute") or settings.RATE_LIMIT_PER_MINUTE
+        ),
+        rate_limit_per_hour=int(fields.get("rate_limit_per_hour") or settings.RATE_LIMIT_PER_HOUR),
+        token_budget=fields.get("token_budget"),
+        allowed_routes=tuple(routes),
+    )
+
+
+def _index_from_settings() -> dict[bytes, KeyRecord]:
+    plan = _default_plan()
+    index = {}
+    for api_key, user_id in settings.API_KEYS.items():
+        key_hash = hash_api_key(api_key)
+        index[key_hash] = KeyRecord(key_hash, user_id, plan)
+    return index
+
+
+def _index_from_json(path: str) -> dict[bytes, KeyRecord]:
+    with open(path) as f:
+        data = json.load(f)
+
+    plans = {
+        name: _plan_from_fields(name, fields) for name, fields in data.get("plans", {}).items()
+    }
+    default = plans.get("default") or _default_plan()
+    # Intern user ids: many keys commonly belong to the same user
+    user_ids: dict[str, str] = {}
+    index = {}
+    for entry in data.get("keys", []):
+        if "key_sha256" in entry:
+            key_hash = bytes.fromhex(entry["key_sha256"])
+        else:
+            key_hash = hash_api_key(entry["key"])
+        user_id = user_ids.setdefault(entry["user_id"], entry["user_id"])
+        index[key_hash] = KeyRecord(key_hash, user_id, plans.get(entry.get("plan"), default))
+    return index
+
+
+def _index_from_sqlite(path: str) -> dict[bytes, KeyRecord]:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        conn.row_factory = sqlite3.Row
+        plans = {
+            row["name"]: _plan_from_fields(row["name"], dict(row))
+            for row in conn.execute("SELECT * FROM plans")
+        }
+        default = plans.get("default") or _default_plan()
+        user_ids: dict[str, str] = {}
+        index = {}
+        for key_hex, user_id, plan in conn.execute(
+            "SELECT key_sha256, user_id, plan FROM api_keys"
+        ):
+            key_hash = bytes.fromhex(key_hex)
+            user_id = user_ids.setdefault(user_id, user_id)
+            index[key_hash] = KeyRecord(key_hash, user_id, plans.get(plan, default))
+        return index
+    finally:
+        conn.close()
+
+
+def load_index(path: str | None) -> dict[bytes, KeyRecord]:
+    """Build a key index from ``path`` (JSON or SQLite), or from settings if None."""
+    if path is None:
+        return _index_from_settings()
+    if path.endswith(".json"):
+        return _index_from_json(path)
+    return _index_from_sqlite(path)
+
+
+class APIKeyStore:
+    """
+    Hashed API key index with atomic hot reload.
+
+    Lookups never block on a reload: at most once per ``reload_interval`` a
+    lookup checks the store file's mtime and, if it changed, rebuilds the
+    index in a background thread and swaps it in with a single assignment.
+    """
+
+    def __init__(self, path: str | None = None, reload_interval: float = 30.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._mtime = self._stat()
+        self._index = load_index(path)
+        self._checked_at = time.monotonic()
+        self._reload_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _stat(self) -> int | None:
+        if self.path is None:
+            return None
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def lookup(self, api_key: str) -> KeyRecord | None:
+        """Return the record for ``api_key``, or None if it is unknown."""
+        if not isinstance(api_key, str):
+            return None
+        self._maybe_reload()
+        key_hash = hash_api_key(api_key)
+        record = self._index.get(key_hash)
+        if record is None or not hmac.compare_digest(record.key_hash, key_hash):
+            return None
+        return record
+
+    def reload(self) -> bool:
+        """Rebuild the index now; keeps the current one if loading fails."""
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            mtime = self._stat()
+            index = load_index(self.path)
+        except Exception:
+            logger.exception("API key store reload failed; keeping current index")
+            return False
+        else:
+            self._index = index
+            self._mtime = mtime
+            logger.info("API key store reloaded (%d keys)", len(index))
+            return True
+        finally:
+            self._reload_lock.release()
+
+    def _maybe_reload(self) -> None:
+        if self.path is None:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        if self._stat() != self._mtime and not self._reload_lock.locked():
+            threading.Thread(target=self.reload, name="api-key-reload", daemon=True).start()
+
+
+_key_store: APIKeyStore | None = None
+
+
+def get_key_store() -> APIKeyStore:
+    """Return this worker's key store, built on first use."""
+    global _key_store
+    if _key_store is None:
+        _key_store = APIKeyStore(
+            settings.API_KEY_STORE_PATH, reload_interval=settings.API_KEY_STORE_RELOAD_INTERVAL
+        )
+    return _key_store
@@ -0,0 +1,130 @@
+"""
+Event loop lag monitoring and slow-callback detection.
+
+A task on the loop sleeps for ``interval`` and measures how late it wakes up:
+that delay is the time every other callback (including SSE streams) waited
+too. Samples go into a histogram exported on both metrics endpoints.
+
+A watchdog thread watches the task's heartbeat. When the loop has not run the
+task for ``slow_threshold`` seconds, something is blocking it, and the
+watchdog logs the loop thread's current stack, which names the blocking code
+while it is still running.
+
+``overloaded`` feeds admission control: while the last lag sample is above
+``shed_threshold``, new requests are rejected with 503 so the loop can catch
+up on streams already in flight.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from app.core.config import settings
+from app.core.metrics import LogLinearHistogram
+from app.core.prometheus import EVENT_LOOP_LAG
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """Sample event loop lag and report callbacks that block the loop."""
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        slow_threshold: float = 0.25,
+        shed_threshold: float | None = None,
+    ):
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.shed_threshold = shed_threshold
+        self.lag = 0.0
+        self.histogram = LogLinearHistogram(scale=1e6)
+        self.slow_callbacks = 0
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    @property
+    def overloaded(self) -> bool:
+        return self.shed_threshold is not None and self.lag >= self.shed_threshold
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    async def _run(self) -> None:
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            self.record(max(0.0, now - start - self.interval))
+
+    def record(self, lag: float) -> None:
+        self.lag = lag
+        self.histogram.record(lag)
+        EVENT_LOOP_LAG.observe(lag)
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stop.wait(self.interval):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            # One report per stall: the heartbeat only moves once the loop is free
+            if stalled < self.slow_threshold or heartbeat == reported:
+                continue
+            reported = heartbeat
+            self.slow_callbacks += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "<unavailable>"
+            logger.warning(
+                "Event loop blocked for %.0f ms; loop thread stack:\n%s", stalled * 1000, stack
+            )
+
+    def snapshot(self) -> dict:
+        """Lag summary in ms plus the current state."""
+        return {
+            **self.histogram.summary(1000),
+            "current": round(self.lag * 1000, 3),
+            "slow_callbacks": self.slow_callbacks,
+            "overloaded": self.overloaded,
+        }
+
+
+_loop_monitor: LoopLagMonitor | None = None
+
+
+def get_loop_monitor() -> LoopLagMonitor:
+    """Return this worker's monitor; it samples only once started by the lifespan."""
+    global _loop_monitor
+    if _loop_monitor is None:
+        _loop_monitor = LoopLagMonitor(
+            interval=settings.LOOP_LAG_SAMPLE_INTERVAL,
+            slow_threshold=settings.LOOP_SLOW_CALLBACK_THRESHOLD,
+            shed_threshold=settings.LOOP_LAG_SHED_THRESHOLD,
+        )
+    return _loop_monitor
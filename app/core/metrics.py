@@ -0,0 +1,229 @@
+"""
+Streaming latency metrics.
+
+Time-to-first-token, inter-token gaps, stream duration and tokens per second
+are recorded per (route, backend) into log-linear histograms: HDR-style
+buckets that are exact for small values and keep a bounded relative error
+above that, in a fixed array of counters. Recording a value is a few integer
+operations, so it is cheap enough to do for every streamed chunk.
+
+TTFT, duration, token and outcome counts are also exported to Prometheus, once
+per stream rather than per chunk.
+"""
+import time
+from array import array
+
+from app.core.prometheus import (
+    CHAT_STREAM_DURATION,
+    CHAT_STREAM_TOKENS,
+    CHAT_STREAM_TTFT,
+    CHAT_STREAMS,
+    CHAT_STREAMS_ACTIVE,
+)
+
+
+class LogLinearHistogram:
+    """
+    Fixed-memory histogram with bounded relative error.
+
+    Values are scaled to integers (``scale=1e6`` records seconds as
+    microseconds). Integers below ``2**sub_bucket_bits`` get their own bucket;
+    each power of two above is split into ``2**(sub_bucket_bits - 1)`` linear
+    buckets, so quantiles are within ``2**-(sub_bucket_bits - 1)`` of the true
+    value (about 3% by default). Values above ``2**max_bits`` are clamped.
+    """
+
+    def __init__(self, scale: float = 1.0, sub_bucket_bits: int = 6, max_bits: int = 36):
+        self.scale = scale
+        self.sub_bucket_bits = sub_bucket_bits
+        self._sub_count = 1 << sub_bucket_bits
+        self._half = self._sub_count >> 1
+        self._max_value = (1 << max_bits) - 1
+        n_buckets = self._sub_count + (max_bits - sub_bucket_bits) * self._half
+        self.counts = array("Q", bytes(8 * n_buckets))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def _index(self, value: int) -> int:
+        if value < self._sub_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return self._sub_count + (shift - 1) * self._half + (value >> shift) - self._half
+
+    def _bucket_value(self, index: int) -> float:
+        """Midpoint of the integer range covered by bucket ``index``."""
+        if index < self._sub_count:
+            return index
+        shift, offset = divmod(index - self._sub_count, self._half)
+        shift += 1
+        low = (offset + self._half) << shift
+        return low + ((1 << shift) - 1) / 2
+
+    def record(self, value: float) -> None:
+        scaled = int(value * self.scale)
+        if scaled < 0:
+            scaled = 0
+        elif scaled > self._max_value:
+            scaled = self._max_value
+        self.counts[self._index(scaled)] += 1
+        self.count += 1
+        self.total += scaled
+        if scaled > self.max:
+            self.max = scaled
+
+    def percentile(self, q: float) -> float:
+        """Value at quantile ``q`` (0-100), in recorded units; 0 if empty."""
+        if self.count == 0:
+            return 0.0
+        rank = max(1, int(q / 100 * self.count + 0.5))
+        if rank >= self.count:
+            return self.max / self.scale
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(self._bucket_value(index), self.max) / self.scale
+        return self.max / self.scale
+
+    def mean(self) -> float:
+        return self.total / self.count / self.scale if self.count else 0.0
+
+    def merge(self, other: "LogLinearHistogram") -> None:
+        """Add ``other``'s counts (same layout and scale) into this one."""
+        for index, bucket_count in enumerate(other.counts):
+            if bucket_count:
+                self.counts[index] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def summary(self, unit_scale: float = 1.0) -> dict:
+        """count, mean, p50/p90/p99 and max, multiplied by ``unit_scale``."""
+        return {
+            "count": self.count,
+            "mean": round(self.mean() * unit_scale, 3),
+            "p50": round(self.percentile(50) * unit_scale, 3),
+            "p90": round(self.percentile(90) * unit_scale, 3),
+            "p99": round(self.percentile(99) * unit_scale, 3),
+            "max": round(self.max / self.scale * unit_scale, 3),
+        }
+
+
+class StreamStats:
+    """Histograms for one (route, backend) pair."""
+
+    __slots__ = (
+        "ttft",
+        "inter_token",
+        "duration",
+        "tokens_per_sec",
+        "completed",
+        "aborted",
+        "prom_ttft",
+        "prom_duration",
+        "prom_tokens",
+        "prom_completed",
+        "prom_aborted",
+    )
+
+    def __init__(self, backend: str):
+        # Latencies in seconds, kept at microsecond resolution
+        self.ttft = LogLinearHistogram(scale=1e6)
+        self.inter_token = LogLinearHistogram(scale=1e6)
+        self.duration = LogLinearHistogram(scale=1e6)
+        self.tokens_per_sec = LogLinearHistogram(scale=1e3)
+        self.completed = 0
+        self.aborted = 0
+        # Label lookups resolved once instead of per stream
+        self.prom_ttft = CHAT_STREAM_TTFT.labels(backend)
+        self.prom_duration = CHAT_STREAM_DURATION.labels(backend)
+        self.prom_tokens = CHAT_STREAM_TOKENS.labels(backend)
+        self.prom_completed = CHAT_STREAMS.labels(backend, "completed")
+        self.prom_aborted = CHAT_STREAMS.labels(backend, "aborted")
+
+
+class StreamTimer:
+    """
+    Times a single stream; call ``token`` per content chunk, then ``finish``.
+
+    Timing starts when the timer is created, so TTFT includes the time before
+    the response generator first runs.
+    """
+
+    __slots__ = ("stats", "start", "first", "last", "tokens", "done")
+
+    def __init__(self, stats: StreamStats):
+        self.stats = stats
+        self.start = time.perf_counter()
+        self.first: float | None = None
+        self.last = 0.0
+        self.tokens = 0
+        self.done = False
+        CHAT_STREAMS_ACTIVE.inc()
+
+    def token(self) -> None:
+        now = time.perf_counter()
+        if self.first is None:
+            self.first = now
+            self.stats.ttft.record(now - self.start)
+            self.stats.prom_ttft.observe(now - self.start)
+        else:
+            self.stats.inter_token.record(now - self.last)
+        self.last = now
+        self.tokens += 1
+
+    def finish(self, completed: bool = True) -> None:
+        """Record duration and throughput; aborted streams are only counted."""
+        if self.done:
+            return
+        self.done = True
+        CHAT_STREAMS_ACTIVE.dec()
+        self.stats.prom_tokens.inc(self.tokens)
+        if not completed:
+            self.stats.aborted += 1
+            self.stats.prom_aborted.inc()
+            return
+        now = time.perf_counter()
+        self.stats.completed += 1
+        self.stats.prom_completed.inc()
+        self.stats.duration.record(now - self.start)
+        self.stats.prom_duration.observe(now - self.start)
+        # Decode throughput: tokens after the first over the time they took
+        if self.tokens > 1 and self.last > self.first:
+            self.stats.tokens_per_sec.record((self.tokens - 1) / (self.last - self.first))
+
+
+class StreamMetrics:
+    """Per-worker registry of ``StreamStats`` keyed by (route, backend)."""
+
+    def __init__(self):
+        self._stats: dict[tuple[str, str], StreamStats] = {}
+
+    def timer(self, route: str, backend: str) -> StreamTimer:
+        stats = self._stats.get((route, backend))
+        if stats is None:
+            stats = self._stats[(route, backend)] = StreamStats(backend)
+        return StreamTimer(stats)
+
+    def snapshot(self) -> list[dict]:
+        """Summaries per (route, backend); latencies in ms."""
+        return [
+            {
+                "route": route,
+                "backend": backend,
+                "completed": stats.completed,
+                "aborted": stats.aborted,
+                "ttft_ms": stats.ttft.summary(1000),
+                "inter_token_ms": stats.inter_token.summary(1000),
+                "duration_ms": stats.duration.summary(1000),
+                "tokens_per_sec": stats.tokens_per_sec.summary(),
+            }
+            for (route, backend), stats in self._stats.items()
+        ]
+
+    def reset(self) -> None:
+        self._stats.clear()
+
+
+stream_metrics = StreamMetrics()
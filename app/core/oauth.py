@@ -1,8 +1,14 @@
+import asyncio
+
+import httpx
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2AuthorizationCodeBearer
-from jose import JWTError, jwt
 
 from app.core.config import settings
+from app.core.introspection import get_introspection_client
+from app.core.jwks import get_jwt_verifier
+from app.core.resilience import CircuitOpenError, RetryBudget
+from app.core.resources import resources
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2AuthorizationCodeBearer(
@@ -17,6 +23,8 @@ async def verify_oauth_token(token: str = Depends(oauth2_scheme)):
     Verify OAuth2 bearer token.
     Returns AuthContext if valid, raises HTTPException if invalid.
     """
+    from jose import JWTError, jwt
+
     from app.core.auth import AuthContext
 
     credentials_exception = HTTPException(
@@ -26,6 +34,13 @@ async def verify_oauth_token(token: str = Depends(oauth2_scheme)):
     )
 
     try:
+        if settings.OAUTH_JWKS_URL:
+            payload = await get_jwt_verifier().verify(token)
+            user_id = payload.get("sub") or payload.get("user_id")
+            if user_id is None:
+                raise credentials_exception
+            return AuthContext(user_id=user_id)
+
         # Decode JWT token (adjust based on your OAuth provider)
         payload = jwt.decode(
             token,
@@ -41,6 +56,118 @@ async def verify_oauth_token(token: str = Depends(oauth2_scheme)):
         raise credentials_exception from err
 
 
+async def introspect_bearer_token(token: str):
+    """
+    Verify an opaque bearer token via the provider's introspection endpoint.
+    Returns AuthContext if the token is active; raises 401 if not and 503 if
+    the provider is unavailable.
+    """
+    from app.core.auth import AuthContext
+
+    try:
+        result = await get_introspection_client().introspect(token)
+    except (CircuitOpenError, httpx.HTTPError, ValueError) as err:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Token introspection unavailable",
+        ) from err
+
+    user_id = result.get("sub") or result.get("username")
+    if not result.get("active") or not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid bearer token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return AuthContext(user_id=user_id)
+
+
+_token_retry_budget = RetryBudget(ratio=settings.OAUTH_RETRY_BUDGET_RATIO)
+
+
+def is_demo_mode() -> bool:
+    """Whether OAuth is still pointed at the placeholder provider."""
+    return (
+        "oauth.provider.com" in settings.OAUTH_AUTHORIZATION_URL
+        or settings.OAUTH_CLIENT_ID == "your-client-id"
+    )
+
+
+async def exchange_code_for_token(code: str) -> dict:
+    """
+    Exchange an authorization code for tokens at ``OAUTH_TOKEN_URL``.
+
+    Uses the shared ``oauth_http`` client. Transport errors and 429/5xx
+    responses are retried with backoff, up to ``OAUTH_TOKEN_MAX_ATTEMPTS`` and
+    only while the retry budget allows.
+
+    Returns:
+        dict: The provider's token response, with a string ``access_token``
+        and, when present, a string ``token_type`` and an integer (or digit
+        string) ``expires_in``
+
+    Raises:
+        HTTPException: 400 if the provider rejects the code, 502 if it
+        cannot be reached, keeps failing or returns a malformed token
+    """
+    client: httpx.AsyncClient = resources.get("oauth_http")
+    _token_retry_budget.record_request()
+
+    for attempt in range(settings.OAUTH_TOKEN_MAX_ATTEMPTS):
+        if attempt:
+            if not _token_retry_budget.try_spend():
+                break
+            await asyncio.sleep(0.1 * 2 ** (attempt - 1))
+        try:
+            response = await client.post(
+                settings.OAUTH_TOKEN_URL,
+                data={
+                    "grant_type": "authorization_code",
+                    "code": code,
+                    "redirect_uri": settings.OAUTH_REDIRECT_URI,
+                },
+                auth=(settings.OAUTH_CLIENT_ID, settings.OAUTH_CLIENT_SECRET),
+                headers={"Accept": "application/json"},
+            )
+        except httpx.TransportError:
+            continue
+
+        if response.status_code == 429 or response.status_code >= 500:
+            continue
+        if response.status_code >= 400:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Authorization code exchange failed",
+            )
+        try:
+            token = response.json()
+        except ValueError:
+            break
+        if not _valid_token_response(token):
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="OAuth provider returned an invalid token response",
+            )
+        return token
+
+    raise HTTPException(
+        status_code=status.HTTP_502_BAD_GATEWAY,
+        detail="OAuth provider unavailable",
+    )
+
+
+def _valid_token_response(token) -> bool:
+    if not isinstance(token, dict) or not isinstance(token.get("access_token"), str):
+        return False
+    if not isinstance(token.get("token_type", ""), str):
+        return False
+    expires_in = token.get("expires_in")
+    if isinstance(expires_in, str):
+        # Some providers send it as a string
+        return expires_in.isdigit()
+    return expires_in is None or (isinstance(expires_in, int) and not isinstance(expires_in, bool))
+
+
 # Alternative: Simple bearer token verification (for non-JWT tokens)
 async def verify_bearer_token(authorization: str | None = None):
     """
@@ -57,6 +184,17 @@ async def verify_bearer_token(authorization: str | None = None):
         )
 
     token = authorization.replace("Bearer ", "")
+    if settings.OAUTH_JWKS_URL and token.count(".") == 2:
+        return await verify_oauth_token(token)
+    if settings.OAUTH_INTROSPECTION_URL:
+        return await introspect_bearer_token(token)
+    if settings.OAUTH_JWKS_URL:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid bearer token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
     # In production, validate token with OAuth provider
     # For demo, accept any token starting with "oauth_"
     if token.startswith("oauth_"):
@@ -0,0 +1,138 @@
+"""
+On-demand sampling profiler for a running worker.
+
+A background thread wakes every ``interval`` seconds, reads the stacks of the
+other threads from ``sys._current_frames()`` and counts them in collapsed-stack
+form (``frame;frame;frame count`` per line), which flamegraph tools read
+directly. Nothing is installed in the profiled code, so overhead is one stack
+walk per sample and is only paid while a profile runs.
+
+Samples of the event loop thread are prefixed with the request whose task was
+running (path and trace ID), so time can be split per route even though all
+requests share the thread.
+
+The sampler needs the GIL to take a sample, so it lands where the loop thread
+releases it (selector waits) or is forced to at ``sys.getswitchinterval()``.
+Code that holds the loop for less than the switch interval between awaits is
+under-counted; anything blocking long enough to cause lag is seen.
+"""
+import asyncio
+import os
+import sys
+import threading
+from collections import Counter
+from types import CodeType, FrameType
+
+from app.core.tracing import task_label
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profile is requested while another one is running."""
+
+
+_cwd = os.getcwd() + os.sep
+
+
+def _frame_name(code: CodeType, cache: dict[CodeType, str]) -> str:
+    name = cache.get(code)
+    if name is None:
+        path = code.co_filename
+        if path.startswith(_cwd):
+            path = path[len(_cwd) :]
+        else:
+            # Trim site-packages and stdlib prefixes to the module path
+            marker = path.rfind("site-packages" + os.sep)
+            if marker != -1:
+                path = path[marker + len("site-packages") + 1 :]
+            else:
+                path = os.path.basename(path)
+        # ';' separates frames in the collapsed format
+        name = f"{getattr(code, 'co_qualname', code.co_name)} ({path})".replace(";", ":")
+        cache[code] = name
+    return name
+
+
+class SamplingProfiler:
+    """Wall-clock stack sampler; one profile at a time per process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names: dict[CodeType, str] = {}
+
+    def _collapse(self, frame: FrameType) -> str:
+        names = []
+        while frame is not None:
+            names.append(_frame_name(frame.f_code, self._names))
+            frame = frame.f_back
+        names.reverse()
+        return ";".join(names)
+
+    def _sample_loop(
+        self,
+        stop: threading.Event,
+        interval: float,
+        loop: asyncio.AbstractEventLoop,
+        loop_thread_id: int,
+        all_threads: bool,
+        counts: Counter,
+    ) -> None:
+        own_id = threading.get_ident()
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while not stop.wait(interval):
+            frames = sys._current_frames()
+            for thread_id, frame in frames.items():
+                if thread_id == own_id or (not all_threads and thread_id != loop_thread_id):
+                    continue
+                if thread_id == loop_thread_id:
+                    task = asyncio.current_task(loop)
+                    label = task_label(task) if task is not None else None
+                    prefix = label or ("task" if task is not None else "idle")
+                else:
+                    prefix = f"thread:{thread_names.get(thread_id, thread_id)}"
+                counts[f"{prefix};{self._collapse(frame)}"] += 1
+
+    async def profile(
+        self, seconds: float, interval: float = 0.005, all_threads: bool = False
+    ) -> Counter:
+        """
+        Sample this process for ``seconds`` and return collapsed stack counts.
+
+        Must be awaited on the event loop being profiled; the loop stays free
+        while the sampler thread runs.
+
+        Raises:
+            ProfilerBusyError: if a profile is already running
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running in this worker")
+        counts: Counter = Counter()
+        stop = threading.Event()
+        sampler = threading.Thread(
+            target=self._sample_loop,
+            args=(
+                stop,
+                interval,
+                asyncio.get_running_loop(),
+                threading.get_ident(),
+                all_threads,
+                counts,
+            ),
+            name="profiler",
+            daemon=True,
+        )
+        try:
+            sampler.start()
+            await asyncio.sleep(seconds)
+        finally:
+            stop.set()
+            sampler.join()
+            self._lock.release()
+        return counts
+
+
+def format_collapsed(counts: Counter) -> str:
+    """Render stack counts as collapsed-stack text, hottest first."""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+profiler = SamplingProfiler()
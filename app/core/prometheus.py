@@ -0,0 +1,177 @@
+"""
+Prometheus metrics for requests, auth, rate limiting and chat streams.
+
+Under gunicorn, ``PROMETHEUS_MULTIPROC_DIR`` is set before the app is imported,
+so every worker writes its samples to its own mmap files in that directory and
+``/metrics`` aggregates all files at scrape time, whichever worker serves it.
+Workers recycled by ``max_requests`` leave files behind; ``archive_dead_worker``
+folds them into one archive file per metric type so the directory (and scrape
+cost) stays bounded. Without the variable, metrics live in this process only.
+"""
+import glob
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.mmap_dict import MmapedDict
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route and status", ["method", "route", "status"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time to complete a request, including the whole body of streamed responses",
+    ["method", "route"],
+    buckets=_LATENCY_BUCKETS,
+)
+AUTH_ATTEMPTS = Counter(
+    "auth_attempts_total", "Authentication attempts by method and outcome", ["method", "outcome"]
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limit_rejections_total", "Requests rejected with 429, by limit", ["limit"]
+)
+RATE_LIMIT_LEASE_LOOKUPS = Counter(
+    "rate_limit_lease_lookups_total",
+    "Lease-mode rate limit checks served from the local lease (hit) or a refill (miss)",
+    ["outcome"],
+)
+RATE_LIMIT_LEASE_FAIL_OPEN = Counter(
+    "rate_limit_lease_fail_open_total",
+    "Requests admitted without a lease because the central quota store failed",
+)
+RATE_LIMIT_LEASE_STRANDED_TOKENS = Counter(
+    "rate_limit_lease_stranded_tokens_total",
+    "Leased tokens still unspent when their window ended, which no worker could use",
+)
+CHAT_STREAMS_ACTIVE = Gauge(
+    "chat_streams_active", "Chat streams currently open", multiprocess_mode="livesum"
+)
+CHAT_STREAMS = Counter(
+    "chat_streams_total", "Finished chat streams by backend and outcome", ["backend", "outcome"]
+)
+CHAT_STREAM_TOKENS = Counter("chat_stream_tokens_total", "Tokens sent on chat streams", ["backend"])
+CHAT_STREAM_TTFT = Histogram(
+    "chat_stream_ttft_seconds",
+    "Time to first token of chat streams",
+    ["backend"],
+    buckets=_LATENCY_BUCKETS,
+)
+CHAT_STREAM_DURATION = Histogram(
+    "chat_stream_duration_seconds",
+    "Duration of completed chat streams",
+    ["backend"],
+    buckets=_LATENCY_BUCKETS,
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop ran a timer scheduled for now",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+SHARED_COUNTER_LOCK_TIMEOUTS = Counter(
+    "shared_counter_lock_timeouts_total",
+    "Shared-memory rate limit table lock timeouts; the worker counts locally for a while",
+)
+REQUESTS_SHED = Counter(
+    "requests_shed_total", "Requests rejected with 503 because the event loop was lagging"
+)
+ACCESS_LOG_DROPPED = Counter(
+    "access_log_dropped_total",
+    "Access log records dropped (queue overflow or sink write error)",
+    ["reason"],
+)
+STREAM_DRAIN = Counter(
+    "chat_stream_drain_total",
+    "Streams affected by a worker draining: finished in time, cut at the deadline or refused",
+    ["outcome"],
+)
+TRANSCRIPT_QUEUE_DEPTH = Gauge(
+    "chat_transcript_queue_depth",
+    "Chat transcripts waiting to be written to the database",
+    multiprocess_mode="livesum",
+)
+TRANSCRIPTS_DROPPED = Counter(
+    "chat_transcripts_dropped_total",
+    "Chat transcripts dropped (queue overflow or database write error)",
+    ["reason"],
+)
+READINESS_PROBE_DURATION = Histogram(
+    "readiness_probe_duration_seconds",
+    "Duration of background readiness probes",
+    ["probe"],
+    buckets=_LATENCY_BUCKETS,
+)
+READINESS_PROBE_FAILURES = Counter(
+    "readiness_probe_failures_total",
+    "Readiness probes that failed or timed out",
+    ["probe", "status"],
+)
+
+
+def observe_request(method: str, route: str | None, status: int, duration: float) -> None:
+    """
+    Count a finished request under its route template (``/items/{id}``).
+
+    Requests that matched no route share one label, so scanners and requests
+    rejected before routing cannot blow up cardinality.
+    """
+    route = route or "unmatched"
+    HTTP_REQUESTS.labels(method, route, str(status)).inc()
+    HTTP_REQUEST_DURATION.labels(method, route).observe(duration)
+
+
+_registry: CollectorRegistry | None = None
+
+
+def _get_registry() -> CollectorRegistry:
+    global _registry
+    if _registry is None:
+        path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+        if path:
+            _registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(_registry, path)
+        else:
+            _registry = REGISTRY
+    return _registry
+
+
+def render_latest() -> tuple[bytes, str]:
+    """Exposition-format body and content type for a scrape."""
+    return generate_latest(_get_registry()), CONTENT_TYPE_LATEST
+
+
+def archive_dead_worker(pid: int, path: str | None = None) -> None:
+    """
+    Fold a dead worker's metric files into the archive files.
+
+    Counter and histogram samples are added to ``counter_archive.db`` and
+    ``histogram_archive.db`` so totals never go backwards; live gauges of the
+    worker are dropped. Run from the gunicorn master, the only archive writer.
+    """
+    path = path or os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        return
+    multiprocess.mark_process_dead(pid, path)
+    for metric_type in ("counter", "histogram"):
+        dead_file = os.path.join(path, f"{metric_type}_{pid}.db")
+        if not os.path.exists(dead_file):
+            continue
+        archive = MmapedDict(os.path.join(path, f"{metric_type}_archive.db"))
+        try:
+            for key, value, timestamp, _ in MmapedDict.read_all_values_from_file(dead_file):
+                archived, _ = archive.read_value(key)
+                archive.write_value(key, archived + value, timestamp)
+        finally:
+            archive.close()
+        os.remove(dead_file)
+    for gauge_file in glob.glob(os.path.join(path, f"gauge_*_{pid}.db")):
+        os.remove(gauge_file)
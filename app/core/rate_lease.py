@@ -0,0 +1,291 @@
+"""
+Approximate rate limiting with locally held quota leases.
+
+Instead of a central-store round trip per request, each worker leases a slice
+of a key's window quota and spends it locally. Leases are refilled when they
+run out and unused tokens are handed back in one batch on a timer, so other
+workers can use them. ``RATE_LIMIT_LEASE_FRACTION`` trades accuracy (small
+leases) against latency and store load (large leases).
+
+Lease hits and misses, requests admitted while the store is down and tokens
+stranded in leases when their window ends are exported to Prometheus
+(``rate_limit_lease_*``).
+"""
+import asyncio
+import time
+from typing import Protocol
+
+from app.core.config import settings
+from app.core.prometheus import (
+    RATE_LIMIT_LEASE_FAIL_OPEN,
+    RATE_LIMIT_LEASE_LOOKUPS,
+    RATE_LIMIT_LEASE_STRANDED_TOKENS,
+)
+from app.core.resources import resources
+
+_ACQUIRE_SCRIPT = """
+local used = tonumber(redis.call('GET', KEYS[1]) or '0')
+local grant = math.min(tonumber(ARGV[1]), tonumber(ARGV[2]) - used)
+if grant <= 0 then return {0, used} end
+used = redis.call('INCRBY', KEYS[1], grant)
+if used == grant then redis.call('EXPIRE', KEYS[1], ARGV[3]) end
+return {grant, used}
+"""
+
+_RELEASE_SCRIPT = """
+for i, key in ipairs(KEYS) do
+  if redis.call('EXISTS', key) == 1 then redis.call('DECRBY', key, ARGV[i]) end
+end
+return #KEYS
+"""
+
+_LEASE_HITS = RATE_LIMIT_LEASE_LOOKUPS.labels("hit")
+_LEASE_MISSES = RATE_LIMIT_LEASE_LOOKUPS.labels("miss")
+
+
+class QuotaStore(Protocol):
+    async def acquire(self, key: str, amount: int, limit: int, window: int) -> tuple[int, int]:
+        """Grant up to ``amount`` tokens of ``limit``; returns (granted, used_after)."""
+        ...
+
+    async def release(self, returns: list[tuple[str, int]]) -> None:
+        """Hand unused tokens back in one batch."""
+        ...
+
+
+class InMemoryQuotaStore:
+    """
+    Process-local central store, used in tests and single-process runs.
+
+    Counters of past windows are swept every ``prune_interval`` seconds; each
+    key gets a new counter per window.
+    """
+
+    def __init__(self, prune_interval: float = 60.0):
+        self.prune_interval = prune_interval
+        self._used: dict[str, tuple[int, float]] = {}
+        self._next_prune = 0.0
+
+    def _prune_expired(self, now: float) -> None:
+        expired = [key for key, (_, expires) in self._used.items() if expires < now]
+        for key in expired:
+            del self._used[key]
+
+    async def acquire(self, key: str, amount: int, limit: int, window: int) -> tuple[int, int]:
+        now = time.time()
+        if now >= self._next_prune:
+            self._prune_expired(now)
+            self._next_prune = now + self.prune_interval
+        used, expires = self._used.get(key, (0, 0.0))
+        if expires < now:
+            used, expires = 0, now + window
+        grant = min(amount, limit - used)
+        if grant <= 0:
+            return 0, used
+        used += grant
+        self._used[key] = (used, expires)
+        return grant, used
+
+    async def release(self, returns: list[tuple[str, int]]) -> None:
+        for key, amount in returns:
+            if key in self._used:
+                used, expires = self._used[key]
+                self._used[key] = (max(0, used - amount), expires)
+
+
+class RedisQuotaStore:
+    """Central store backed by Redis, using Lua scripts for atomic grants."""
+
+    def __init__(self, client):
+        self._client = client
+        self._acquire = self._client.register_script(_ACQUIRE_SCRIPT)
+        self._release = self._client.register_script(_RELEASE_SCRIPT)
+
+    async def acquire(self, key: str, amount: int, limit: int, window: int) -> tuple[int, int]:
+        granted, used = await self._acquire(keys=[key], args=[amount, limit, window])
+        return int(granted), int(used)
+
+    async def release(self, returns: list[tuple[str, int]]) -> None:
+        if returns:
+            await self._release(
+                keys=[key for key, _ in returns], args=[amount for _, amount in returns]
+            )
+
+
+class _Lease:
+    __slots__ = ("store_key", "window_id", "reset", "remaining", "used")
+
+    def __init__(self, store_key: str, window_id: int, reset: float, remaining: int, used: int):
+        self.store_key = store_key
+        self.window_id = window_id
+        self.reset = reset
+        self.remaining = remaining
+        self.used = used
+
+
+class LeaseRateLimiter:
+    """
+    Fixed-window limiter that spends leased quota locally.
+
+    Windows are aligned to the epoch (``now // window``) so every worker agrees
+    on which central counter a lease belongs to. Only one refill per key is
+    in flight at a time: concurrent misses wait for it and share its result
+    rather than each taking a lease and overwriting the others (whose tokens
+    would never be returned). If the central store fails, requests are
+    admitted and counted as ``failed_open``.
+
+    Leases cannot admit more than the central limit; their cost is quota
+    held by one worker that others cannot use. Tokens still unspent when
+    their window ends are counted as ``stranded_tokens``.
+    """
+
+    def __init__(self, store: QuotaStore, lease_fraction: float = 0.1, sync_interval: float = 1.0):
+        self.store = store
+        self.lease_fraction = lease_fraction
+        self.sync_interval = sync_interval
+        self._leases: dict[str, _Lease] = {}
+        # Refills in flight by key; resolve to (granted, used), or None on a store error
+        self._refills: dict[str, asyncio.Future] = {}
+        self._last_sync = time.monotonic()
+        self._sync_task: asyncio.Task | None = None
+
+        self.lease_hits = 0
+        self.lease_misses = 0
+        self.denied = 0
+        self.failed_open = 0
+        self.returned_tokens = 0
+        self.stranded_tokens = 0
+        self.store_errors = 0
+
+    def _lease_size(self, limit: int) -> int:
+        return max(1, int(limit * self.lease_fraction))
+
+    async def hit(
+        self, key: str, limit: int, window: int, now: float | None = None
+    ) -> tuple[bool, int, float]:
+        """
+        Count one request for ``key``.
+
+        Returns:
+            tuple: (allowed, estimated_count, reset)
+        """
+        now = time.time() if now is None else now
+        window_id = int(now // window)
+        reset = float((window_id + 1) * window)
+        self._maybe_schedule_sync()
+
+        while True:
+            lease = self._leases.get(key)
+            if lease is not None and lease.window_id == window_id and lease.remaining > 0:
+                lease.remaining -= 1
+                self.lease_hits += 1
+                _LEASE_HITS.inc()
+                return True, lease.used - lease.remaining, reset
+
+            refill = self._refills.get(key)
+            if refill is None:
+                break
+            outcome = await asyncio.shield(refill)
+            if outcome is None:
+                self._fail_open()
+                return True, 0, reset
+            if outcome[0] <= 0:
+                self.denied += 1
+                return False, outcome[1], reset
+            # Spend from the lease just taken, or refill again if it is gone
+
+        self.lease_misses += 1
+        _LEASE_MISSES.inc()
+        store_key = f"rl:{key}:{window_id}"
+        refill = asyncio.get_running_loop().create_future()
+        self._refills[key] = refill
+        outcome = None
+        try:
+            outcome = await self.store.acquire(store_key, self._lease_size(limit), limit, window)
+        except Exception:
+            self.store_errors += 1
+            self._fail_open()
+            return True, 0, reset
+        finally:
+            del self._refills[key]
+            refill.set_result(outcome)
+
+        granted, used = outcome
+        previous = self._leases.pop(key, None)
+        if previous is not None and previous.window_id != window_id:
+            self._strand(previous.remaining)
+        if granted <= 0:
+            self.denied += 1
+            return False, used, reset
+
+        self._leases[key] = _Lease(store_key, window_id, reset, granted - 1, used)
+        return True, used - (granted - 1), reset
+
+    def _fail_open(self) -> None:
+        self.failed_open += 1
+        RATE_LIMIT_LEASE_FAIL_OPEN.inc()
+
+    def _strand(self, tokens: int) -> None:
+        if tokens > 0:
+            self.stranded_tokens += tokens
+            RATE_LIMIT_LEASE_STRANDED_TOKENS.inc(tokens)
+
+    def _maybe_schedule_sync(self) -> None:
+        if time.monotonic() - self._last_sync < self.sync_interval:
+            return
+        if self._sync_task is not None and not self._sync_task.done():
+            return
+        self._last_sync = time.monotonic()
+        self._sync_task = asyncio.get_running_loop().create_task(self.sync())
+
+    async def sync(self) -> None:
+        """Return every unused lease to the central store in one batch."""
+        now = time.time()
+        leases, self._leases = self._leases, {}
+        returns = []
+        for lease in leases.values():
+            if lease.reset > now:
+                if lease.remaining > 0:
+                    returns.append((lease.store_key, lease.remaining))
+            else:
+                # Leases from past windows are dropped; their central keys expire
+                self._strand(lease.remaining)
+        if not returns:
+            return
+        try:
+            await self.store.release(returns)
+            self.returned_tokens += sum(amount for _, amount in returns)
+        except Exception:
+            self.store_errors += 1
+
+    def stats(self) -> dict[str, float]:
+        """Lease hit rate, fail-open and stranded-token counters for this worker."""
+        lookups = self.lease_hits + self.lease_misses
+        return {
+            "lease_hits": self.lease_hits,
+            "lease_misses": self.lease_misses,
+            "lease_hit_rate": self.lease_hits / lookups if lookups else 0.0,
+            "denied": self.denied,
+            "failed_open": self.failed_open,
+            "returned_tokens": self.returned_tokens,
+            "stranded_tokens": self.stranded_tokens,
+            "store_errors": self.store_errors,
+        }
+
+
+_lease_limiter: LeaseRateLimiter | None = None
+
+
+def get_lease_limiter() -> LeaseRateLimiter:
+    """Return this worker's lease limiter, backed by Redis when ``REDIS_URL`` is set."""
+    global _lease_limiter
+    if _lease_limiter is None:
+        store: QuotaStore = (
+            RedisQuotaStore(resources.get("redis")) if settings.REDIS_URL else InMemoryQuotaStore()
+        )
+        _lease_limiter = LeaseRateLimiter(
+            store,
+            lease_fraction=settings.RATE_LIMIT_LEASE_FRACTION,
+            sync_interval=settings.RATE_LIMIT_LEASE_SYNC_INTERVAL,
+        )
+    return _lease_limiter
@@ -0,0 +1,219 @@
+"""
+Readiness: dependency probes refreshed in the background.
+
+Probes are async callables registered by name (database, Redis, JWKS, model
+backends). A task on the loop runs all of them every ``interval`` seconds,
+concurrently and each bounded by its timeout, and caches the outcome.
+``/api/v1/ready`` only reads that cache, so dependencies see one round of
+probes per interval per worker however often the load balancer asks.
+
+Probes named in ``READINESS_CRITICAL`` are critical, the others are not. The
+worker is ``ready`` when every probe passes, ``degraded`` when only
+non-critical probes fail (it keeps taking traffic) and ``not_ready`` when a
+critical probe fails, has not run yet, or last ran more than ``stale_after``
+seconds ago (the refresher itself is stuck).
+"""
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+
+from app.core.config import settings
+from app.core.prometheus import READINESS_PROBE_DURATION, READINESS_PROBE_FAILURES
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+ERROR = "error"
+TIMEOUT = "timeout"
+PENDING = "pending"
+STALE = "stale"
+
+
+class ProbeResult:
+    __slots__ = ("status", "latency_ms", "error", "checked_at")
+
+    def __init__(
+        self,
+        status: str,
+        latency_ms: float | None = None,
+        error: str | None = None,
+        checked_at: float | None = None,
+    ):
+        self.status = status
+        self.latency_ms = latency_ms
+        self.error = error
+        self.checked_at = checked_at
+
+
+class _Probe:
+    __slots__ = ("check", "critical", "timeout", "result")
+
+    def __init__(self, check: Callable[[], Awaitable[None]], critical: bool, timeout: float):
+        self.check = check
+        self.critical = critical
+        self.timeout = timeout
+        self.result = ProbeResult(PENDING)
+
+
+class ReadinessRegistry:
+    """Named dependency probes run on a schedule, with cached results."""
+
+    def __init__(self, interval: float = 5.0, timeout: float = 2.0, stale_after: float = 15.0):
+        self.interval = interval
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self.rounds = 0
+        self._probes: dict[str, _Probe] = {}
+        self._last_round = 0.0
+        self._task: asyncio.Task | None = None
+
+    def register(
+        self,
+        name: str,
+        check: Callable[[], Awaitable[None]],
+        *,
+        critical: bool = True,
+        timeout: float | None = None,
+    ) -> None:
+        """Register a probe; ``check`` raises (or times out) when the dependency is down."""
+        self._probes[name] = _Probe(check, critical, timeout or self.timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        """Run a first round (so /ready is accurate immediately), then refresh on schedule."""
+        if self._task is not None:
+            return
+        await self.refresh()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Readiness refresh failed")
+
+    async def refresh(self) -> None:
+        """Run every probe once, concurrently, and cache the results."""
+        items = list(self._probes.items())
+        results = await asyncio.gather(*(self._run_probe(name, probe) for name, probe in items))
+        for (_, probe), result in zip(items, results, strict=True):
+            probe.result = result
+        self.rounds += 1
+        self._last_round = time.monotonic()
+
+    async def _run_probe(self, name: str, probe: _Probe) -> ProbeResult:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(probe.check(), probe.timeout)
+        except TimeoutError:
+            status, error = TIMEOUT, f"no answer within {probe.timeout}s"
+        except Exception as exc:
+            status, error = ERROR, f"{type(exc).__name__}: {exc}"
+        else:
+            status, error = OK, None
+        elapsed = time.perf_counter() - start
+        READINESS_PROBE_DURATION.labels(name).observe(elapsed)
+        if status != OK:
+            READINESS_PROBE_FAILURES.labels(name, status).inc()
+        return ProbeResult(status, round(elapsed * 1000, 3), error, time.monotonic())
+
+    async def report(self) -> dict:
+        """
+        Overall status and per-probe results from the cache.
+
+        Without the background refresher (scripts, tests) a round is run here
+        instead, at most once per ``interval``.
+        """
+        now = time.monotonic()
+        if self._task is None and (self.rounds == 0 or now - self._last_round >= self.interval):
+            await self.refresh()
+            now = time.monotonic()
+
+        status = "ready"
+        checks = {}
+        for name, probe in self._probes.items():
+            result = probe.result
+            probe_status = result.status
+            age = None if result.checked_at is None else now - result.checked_at
+            if age is not None and age > self.stale_after:
+                probe_status = STALE
+            if probe_status != OK:
+                if probe.critical:
+                    status = "not_ready"
+                elif status == "ready":
+                    status = "degraded"
+            checks[name] = {
+                "status": probe_status,
+                "critical": probe.critical,
+                "latency_ms": result.latency_ms,
+                "age_s": None if age is None else round(age, 3),
+            }
+            if result.error is not None:
+                checks[name]["error"] = result.error
+        return {"status": status, "checks": checks}
+
+
+async def _check_database() -> None:
+    from app.core.database import get_pool
+
+    await get_pool().check()
+
+
+async def _check_redis() -> None:
+    from app.core.resources import resources
+
+    await resources.get("redis").ping()
+
+
+async def _check_jwks() -> None:
+    from app.core.jwks import get_jwt_verifier
+
+    if not await get_jwt_verifier().jwks.check():
+        raise ValueError("No unexpired signing keys")
+
+
+async def _check_llm_backend() -> None:
+    from app.services.chat_service import check_backend
+
+    await check_backend()
+
+
+_readiness: ReadinessRegistry | None = None
+
+
+def get_readiness() -> ReadinessRegistry:
+    """Return this worker's registry with the probes the configuration needs."""
+    global _readiness
+    if _readiness is None:
+        registry = ReadinessRegistry(
+            interval=settings.READINESS_INTERVAL,
+            timeout=settings.READINESS_TIMEOUT,
+            stale_after=settings.READINESS_INTERVAL * 3,
+        )
+        probes: dict[str, Callable[[], Awaitable[None]]] = {
+            "database": _check_database,
+            "llm_backend": _check_llm_backend,
+        }
+        if settings.REDIS_URL:
+            probes["redis"] = _check_redis
+        if settings.OAUTH_JWKS_URL:
+            probes["jwks"] = _check_jwks
+        for name, check in probes.items():
+            registry.register(name, check, critical=name in settings.READINESS_CRITICAL)
+        _readiness = registry
+    return _readiness
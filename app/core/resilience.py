@@ -0,0 +1,94 @@
+"""
+Resilience helpers for calls to external providers.
+"""
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and calls
+    fail fast for ``reset_timeout`` seconds. Then a single trial call is let
+    through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go through now."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """End a call that recorded no outcome (cancelled, unexpected error); frees the trial."""
+        self._trial_in_flight = False
+
+
+class RetryBudget:
+    """
+    Cap retries to a fraction of recent traffic.
+
+    Every request deposits ``ratio`` tokens and every retry spends one, with a
+    floor of ``min_per_second`` so low-traffic services can still retry. This
+    stops retries from multiplying load on a provider that is already failing.
+    """
+
+    def __init__(self, ratio: float = 0.1, min_per_second: float = 1.0, max_balance: float = 10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_balance = max_balance
+        self._balance = max_balance
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._balance = min(
+            self.max_balance, self._balance + (now - self._updated) * self.min_per_second
+        )
+        self._updated = now
+
+    def record_request(self) -> None:
+        self._refill()
+        self._balance = min(self.max_balance, self._balance + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Take one retry from the budget if available."""
+        self._refill()
+        if self._balance < 1:
+            return False
+        self._balance -= 1
+        return True
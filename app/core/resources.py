@@ -0,0 +1,309 @@
+"""
+Application-lifespan registry for long-lived clients.
+
+HTTP clients, Redis connections and similar resources are created once per
+worker, warmed up at startup (connection pools, TLS handshakes, key sets) and
+closed gracefully at shutdown. ``get`` also creates a resource on first use,
+so code running without the lifespan (scripts, unit tests) still works.
+
+Background services (the loop monitor, access log, transcript writer, usage
+ledger, drain controller and readiness refresher) are registered with a
+``start`` hook instead. A failed warmup is logged and the resource is used
+cold; a failed start fails the worker's startup, since serving without the
+service would silently lose what it records.
+"""
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import httpx
+
+from app.core.config import settings
+from app.core.tracing import inject_trace_context
+
+logger = logging.getLogger(__name__)
+
+
+class _Resource:
+    __slots__ = ("factory", "warmup", "start", "close")
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        warmup: Callable[[Any], Awaitable[None]] | None,
+        start: Callable[[Any], Awaitable[None]] | None,
+        close: Callable[[Any], Awaitable[None]] | None,
+    ):
+        self.factory = factory
+        self.warmup = warmup
+        self.start = start
+        self.close = close
+
+
+class ResourceRegistry:
+    """Named long-lived resources with startup warmup and graceful shutdown."""
+
+    def __init__(self, shutdown_timeout: float = 10.0):
+        self.shutdown_timeout = shutdown_timeout
+        self._resources: dict[str, _Resource] = {}
+        self._instances: dict[str, Any] = {}
+
+    def register(
+        self,
+        name: str,
+        factory: Callable[[], Any],
+        *,
+        warmup: Callable[[Any], Awaitable[None]] | None = None,
+        start: Callable[[Any], Awaitable[None]] | None = None,
+        close: Callable[[Any], Awaitable[None]] | None = None,
+    ) -> None:
+        """
+        Register a resource; it is created lazily or at startup.
+
+        ``warmup`` is best effort; ``start`` is required and fails startup if it raises.
+        """
+        self._resources[name] = _Resource(factory, warmup, start, close)
+
+    def get(self, name: str) -> Any:
+        """Return the instance of ``name``, creating it on first use."""
+        instance = self._instances.get(name)
+        if instance is None:
+            instance = self._resources[name].factory()
+            self._instances[name] = instance
+        return instance
+
+    def override(self, name: str, instance: Any) -> None:
+        """Use ``instance`` for ``name`` (tests, or clients built elsewhere)."""
+        self._instances[name] = instance
+
+    async def startup(self) -> None:
+        """
+        Create every registered resource and run its warmup and start hooks.
+
+        Raises:
+            Exception: whatever a start hook raised, after closing everything
+            created so far
+        """
+        try:
+            for name, resource in self._resources.items():
+                instance = self.get(name)
+                if resource.warmup is not None:
+                    try:
+                        await resource.warmup(instance)
+                    except Exception:
+                        # A cold resource still works; it just pays the setup on first use
+                        logger.warning("Warmup of resource %r failed", name, exc_info=True)
+                if resource.start is not None:
+                    await resource.start(instance)
+        except BaseException:
+            logger.error("Starting resource %r failed; shutting down", name)
+            await self.shutdown()
+            raise
+
+    async def shutdown(self) -> None:
+        """Close resources in reverse creation order."""
+        for name in reversed(list(self._instances)):
+            instance = self._instances.pop(name)
+            resource = self._resources.get(name)
+            if resource is None or resource.close is None:
+                continue
+            try:
+                await asyncio.wait_for(resource.close(instance), self.shutdown_timeout)
+            except Exception:
+                logger.warning("Closing resource %r failed", name, exc_info=True)
+
+
+def _create_oauth_http() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=settings.OAUTH_HTTP_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=settings.OAUTH_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OAUTH_HTTP_MAX_CONNECTIONS,
+        ),
+        event_hooks={"request": [inject_trace_context]},
+    )
+
+
+async def _warm_oauth_http(client: httpx.AsyncClient) -> None:
+    if settings.OAUTH_JWKS_URL:
+        # Fetching the key set also opens a pooled connection to the provider
+        from app.core.jwks import get_jwt_verifier
+
+        await get_jwt_verifier().jwks.refresh()
+
+
+async def _close_http(client: httpx.AsyncClient) -> None:
+    await client.aclose()
+
+
+def _create_redis():
+    import redis.asyncio as redis
+
+    return redis.from_url(settings.REDIS_URL)
+
+
+async def _warm_redis(client) -> None:
+    await client.ping()
+
+
+async def _close_redis(client) -> None:
+    await client.aclose()
+
+
+def _get_loop_monitor():
+    from app.core.loop_monitor import get_loop_monitor
+
+    return get_loop_monitor()
+
+
+async def _start_loop_monitor(monitor) -> None:
+    await monitor.start()
+
+
+async def _stop_loop_monitor(monitor) -> None:
+    await monitor.stop()
+
+
+def _create_span_exporter():
+    from app.core.trace_export import create_span_exporter
+
+    return create_span_exporter()
+
+
+async def _start_span_exporter(exporter) -> None:
+    await exporter.start()
+
+
+async def _stop_span_exporter(exporter) -> None:
+    await exporter.stop()
+
+
+def _get_access_log():
+    from app.core.access_log import access_log
+
+    return access_log
+
+
+async def _start_access_log(log) -> None:
+    from app.core.access_log import open_sink
+
+    # Socket sinks connect lazily on the writer thread
+    log.start(open_sink(settings.ACCESS_LOG_TARGET))
+
+
+async def _stop_access_log(log) -> None:
+    # Joining the writer flushes the queue; keep that off the event loop
+    await asyncio.to_thread(log.stop)
+
+
+def _get_db_pool():
+    from app.core.database import get_pool
+
+    return get_pool()
+
+
+async def _open_db_pool(pool) -> None:
+    await pool.open()
+
+
+async def _close_db_pool(pool) -> None:
+    await pool.close()
+
+
+def _get_transcript_writer():
+    from app.core.transcripts import transcript_writer
+
+    return transcript_writer
+
+
+async def _start_transcript_writer(writer) -> None:
+    await writer.start()
+
+
+async def _stop_transcript_writer(writer) -> None:
+    await writer.stop()
+
+
+def _get_usage_ledger():
+    from app.core.usage import usage_ledger
+
+    return usage_ledger
+
+
+async def _start_usage_ledger(ledger) -> None:
+    await ledger.start()
+
+
+async def _stop_usage_ledger(ledger) -> None:
+    await ledger.stop()
+
+
+def _get_drain_controller():
+    from app.core.drain import drain_controller
+
+    return drain_controller
+
+
+async def _start_drain_controller(controller) -> None:
+    await controller.start()
+
+
+async def _stop_drain_controller(controller) -> None:
+    await controller.stop()
+
+
+def _get_readiness():
+    from app.core.readiness import get_readiness
+
+    return get_readiness()
+
+
+async def _start_readiness(readiness) -> None:
+    await readiness.start()
+
+
+async def _stop_readiness(readiness) -> None:
+    await readiness.stop()
+
+
+resources = ResourceRegistry(shutdown_timeout=settings.RESOURCE_SHUTDOWN_TIMEOUT)
+resources.register("oauth_http", _create_oauth_http, warmup=_warm_oauth_http, close=_close_http)
+resources.register("database", _get_db_pool, warmup=_open_db_pool, close=_close_db_pool)
+if settings.REDIS_URL:
+    resources.register("redis", _create_redis, warmup=_warm_redis, close=_close_redis)
+if settings.LOOP_MONITOR_ENABLED:
+    resources.register(
+        "loop_monitor", _get_loop_monitor, start=_start_loop_monitor, close=_stop_loop_monitor
+    )
+if settings.TRACE_EXPORT_URL:
+    resources.register(
+        "span_exporter",
+        _create_span_exporter,
+        start=_start_span_exporter,
+        close=_stop_span_exporter,
+    )
+if settings.ACCESS_LOG_TARGET:
+    resources.register(
+        "access_log", _get_access_log, start=_start_access_log, close=_stop_access_log
+    )
+resources.register(
+    "drain",
+    _get_drain_controller,
+    start=_start_drain_controller,
+    close=_stop_drain_controller,
+)
+if settings.TRANSCRIPTS_ENABLED:
+    # After the database, so it is flushed before the pool closes
+    resources.register(
+        "transcripts",
+        _get_transcript_writer,
+        start=_start_transcript_writer,
+        close=_stop_transcript_writer,
+    )
+if settings.USAGE_LEDGER_ENABLED:
+    resources.register(
+        "usage_ledger", _get_usage_ledger, start=_start_usage_ledger, close=_stop_usage_ledger
+    )
+# Last, so the first round of probes sees warmed resources
+resources.register("readiness", _get_readiness, start=_start_readiness, close=_stop_readiness)
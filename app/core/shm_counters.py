@@ -0,0 +1,236 @@
+"""
+Shared-memory counter table for node-wide rate limiting.
+
+The table is a fixed-size open-addressing hash stored in an anonymous ``mmap``.
+It is created in the gunicorn master (see ``pre_fork`` in ``gunicorn.conf.py``)
+before any worker is forked, so every worker maps the same pages and sees the
+same counters without a network hop. Memory is bounded by the slot count.
+
+A worker killed while holding the table lock leaves it held for good. A
+process that times out on the lock stops using the table for
+``lock_retry_interval`` seconds (``hit`` and ``adjust`` return None so the
+caller counts per worker) instead of paying the timeout on every request.
+"""
+import hashlib
+import logging
+import mmap
+import multiprocessing
+import struct
+import time
+
+from app.core.prometheus import SHARED_COUNTER_LOCK_TIMEOUTS
+
+logger = logging.getLogger(__name__)
+
+# Slot layout: key hash (0 = empty), counter value, reset/expiry timestamp
+_SLOT = struct.Struct("<Qqd")
+
+
+def _hash_key(key: str) -> int:
+    """Stable 64-bit key hash (``hash()`` is salted per interpreter)."""
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+class SharedCounterTable:
+    """
+    Fixed-window counters shared between forked worker processes.
+
+    Slots whose reset time has passed are reused for new keys, so the table
+    never grows. If no slot can be found within ``max_probe`` steps the table
+    fails open and counts the overflow; if the lock cannot be taken in time it
+    is treated as stuck (see the module docstring).
+    """
+
+    def __init__(
+        self,
+        slots: int = 65536,
+        max_probe: int = 32,
+        lock_timeout: float = 0.05,
+        lock_retry_interval: float = 5.0,
+    ):
+        self.slots = 1 << max(slots - 1, 1).bit_length()
+        self.max_probe = min(max_probe, self.slots)
+        self.lock_timeout = lock_timeout
+        self.lock_retry_interval = lock_retry_interval
+        self._mask = self.slots - 1
+        self._buf = mmap.mmap(-1, self.slots * _SLOT.size)
+        self._lock = multiprocessing.Lock()
+        # Per-process diagnostics
+        self.overflows = 0
+        self.lock_timeouts = 0
+        # Monotonic time until which this process skips the table; 0 while healthy
+        self._skip_until = 0.0
+
+    def available(self) -> bool:
+        """False while this process treats the lock as stuck."""
+        return time.monotonic() >= self._skip_until
+
+    def _acquire(self) -> bool:
+        """Take the lock; on a timeout mark it stuck for ``lock_retry_interval``."""
+        if not self.available():
+            return False
+        if self._lock.acquire(timeout=self.lock_timeout):
+            if self._skip_until:
+                self._skip_until = 0.0
+                logger.info("Shared counter lock available again")
+            return True
+
+        self.lock_timeouts += 1
+        SHARED_COUNTER_LOCK_TIMEOUTS.inc()
+        if not self._skip_until:
+            logger.warning(
+                "Shared counter lock not acquired in %.3fs (held by a dead worker?); "
+                "counting per worker, retrying every %.0fs",
+                self.lock_timeout,
+                self.lock_retry_interval,
+            )
+        self._skip_until = time.monotonic() + self.lock_retry_interval
+        return False
+
+    def _find_slot(self, key_hash: int, now: float, claim: bool) -> int | None:
+        """Return the byte offset of the slot for ``key_hash``, optionally claiming one."""
+        reusable = None
+        index = key_hash & self._mask
+        for _ in range(self.max_probe):
+            offset = index * _SLOT.size
+            slot_hash, _count, reset = _SLOT.unpack_from(self._buf, offset)
+            if slot_hash == key_hash:
+                return offset
+            if slot_hash == 0:
+                if reusable is None:
+                    reusable = offset
+                break
+            if reusable is None and reset < now:
+                reusable = offset
+            index = (index + 1) & self._mask
+
+        if reusable is None or not claim:
+            return None
+        _SLOT.pack_into(self._buf, reusable, key_hash, 0, 0.0)
+        return reusable
+
+    def hit(
+        self, key: str, limit: int, window: float, now: float | None = None, cost: int = 1
+    ) -> tuple[bool, int, float] | None:
+        """
+        Count ``cost`` (one request by default) for ``key`` in a fixed window.
+
+        Returns:
+            tuple | None: (allowed, count, reset) with the same semantics as
+            the in-process rate limit storage, or None if the lock is stuck
+        """
+        now = time.time() if now is None else now
+        key_hash = _hash_key(key)
+
+        if not self._acquire():
+            return None
+        try:
+            offset = self._find_slot(key_hash, now, claim=True)
+            if offset is None:
+                self.overflows += 1
+                return True, 0, now + window
+
+            _, count, reset = _SLOT.unpack_from(self._buf, offset)
+            if reset < now:
+                count, reset = cost, now + window
+            elif count + cost > limit:
+                return False, count, reset
+            else:
+                count += cost
+            _SLOT.pack_into(self._buf, offset, key_hash, count, reset)
+            return True, count, reset
+        finally:
+            self._lock.release()
+
+    def adjust(
+        self, key: str, delta: int, limit: int, ttl: float, now: float | None = None
+    ) -> tuple[bool, int] | None:
+        """
+        Add ``delta`` to a gauge, refusing increments that would exceed ``limit``.
+
+        Every accepted increment pushes the expiry ``ttl`` seconds out, so a
+        gauge left behind by a killed worker resets once its holders would
+        have finished anyway.
+
+        Returns:
+            tuple | None: (allowed, value), or None if the lock is stuck
+        """
+        now = time.time() if now is None else now
+        key_hash = _hash_key(key)
+
+        if not self._acquire():
+            return None
+        try:
+            offset = self._find_slot(key_hash, now, claim=delta > 0)
+            if offset is None:
+                if delta > 0:
+                    self.overflows += 1
+                return True, 0
+
+            _, value, expires = _SLOT.unpack_from(self._buf, offset)
+            if expires < now:
+                value = 0
+            if delta > 0:
+                if value + delta > limit:
+                    return False, value
+                expires = now + ttl
+            value = max(0, value + delta)
+            _SLOT.pack_into(self._buf, offset, key_hash, value, expires)
+            return True, value
+        finally:
+            self._lock.release()
+
+    def get(self, key: str, now: float | None = None) -> tuple[int, float]:
+        """
+        Return (count, reset) for ``key``.
+
+        Expired or missing keys, and every key while the lock is stuck, read as zero.
+        """
+        now = time.time() if now is None else now
+        if not self._acquire():
+            return 0, 0.0
+        try:
+            offset = self._find_slot(_hash_key(key), now, claim=False)
+            if offset is None:
+                return 0, 0.0
+            _, count, reset = _SLOT.unpack_from(self._buf, offset)
+        finally:
+            self._lock.release()
+        if reset < now:
+            return 0, 0.0
+        return count, reset
+
+    def clear(self) -> bool:
+        """Zero every slot; returns False (and clears nothing) while the lock is stuck."""
+        if not self._acquire():
+            return False
+        try:
+            self._buf[:] = bytes(len(self._buf))
+        finally:
+            self._lock.release()
+        return True
+
+    def close(self) -> None:
+        self._buf.close()
+
+
+_shared_table: SharedCounterTable | None = None
+
+
+def init_shared_counters(slots: int = 65536) -> SharedCounterTable:
+    """
+    Create the process-wide table if it does not exist yet.
+
+    Must run in the gunicorn master before workers are forked; calling it
+    again (e.g. from every ``pre_fork``) returns the existing table.
+    """
+    global _shared_table
+    if _shared_table is None:
+        _shared_table = SharedCounterTable(slots=slots)
+    return _shared_table
+
+
+def get_shared_counters() -> SharedCounterTable | None:
+    """Return the shared table, or None when running with per-process storage."""
+    return _shared_table
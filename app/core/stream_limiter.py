@@ -0,0 +1,99 @@
+"""
+Per-user limit on concurrently open chat streams.
+
+Request-count limits do not capture the cost of long-lived SSE responses, so
+each stream holds a slot for as long as it is open. Slots are counted per
+worker, or node-wide through the shared-memory counter table.
+"""
+import logging
+
+from app.core.config import settings
+from app.core.shm_counters import SharedCounterTable, get_shared_counters
+
+logger = logging.getLogger(__name__)
+
+
+class StreamSlot:
+    """A held stream slot; releasing it more than once is a no-op."""
+
+    __slots__ = ("_limiter", "key", "shared", "_released")
+
+    def __init__(self, limiter: "StreamConcurrencyLimiter", key: str, shared: bool = False):
+        self._limiter = limiter
+        self.key = key
+        # Counted in the shared table (False when it fell back to this worker)
+        self.shared = shared
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._limiter._release(self.key, self.shared)
+
+
+class StreamConcurrencyLimiter:
+    """Count open streams per key and refuse new ones over ``max_streams``."""
+
+    def __init__(
+        self,
+        max_streams: int,
+        shared_table: SharedCounterTable | None = None,
+        slot_ttl: float = 3600,
+    ):
+        self.max_streams = max_streams
+        self.shared_table = shared_table
+        self.slot_ttl = slot_ttl
+        self._open: dict[str, int] = {}
+
+    def try_acquire(self, key: str) -> StreamSlot | None:
+        """Take a slot for ``key``, or return None when the cap is reached."""
+        shared = False
+        if self.shared_table is not None:
+            result = self.shared_table.adjust(f"streams:{key}", 1, self.max_streams, self.slot_ttl)
+            if result is not None:
+                if not result[0]:
+                    return None
+                shared = True
+        if not shared and self._open.get(key, 0) >= self.max_streams:
+            return None
+
+        self._open[key] = self._open.get(key, 0) + 1
+        return StreamSlot(self, key, shared)
+
+    def _release(self, key: str, shared: bool) -> None:
+        if shared and self.shared_table is not None:
+            self.shared_table.adjust(f"streams:{key}", -1, self.max_streams, self.slot_ttl)
+
+        remaining = self._open.get(key, 0) - 1
+        if remaining > 0:
+            self._open[key] = remaining
+        else:
+            self._open.pop(key, None)
+
+    def open_streams(self, key: str | None = None) -> int:
+        """Streams open in this worker, for ``key`` or in total."""
+        if key is not None:
+            return self._open.get(key, 0)
+        return sum(self._open.values())
+
+
+_stream_limiter: StreamConcurrencyLimiter | None = None
+
+
+def get_stream_limiter() -> StreamConcurrencyLimiter:
+    """Return this worker's stream limiter, node-wide when configured and available."""
+    global _stream_limiter
+    if _stream_limiter is None:
+        shared = get_shared_counters() if settings.STREAM_CONCURRENCY_SHARED else None
+        if settings.STREAM_CONCURRENCY_SHARED and shared is None:
+            # The table is created by gunicorn's master (pre_fork); plain uvicorn has none
+            logger.warning(
+                "STREAM_CONCURRENCY_SHARED is set but no shared counter table exists; "
+                "stream slots are counted per worker"
+            )
+        _stream_limiter = StreamConcurrencyLimiter(
+            settings.STREAM_CONCURRENCY_LIMIT,
+            shared_table=shared,
+            slot_ttl=settings.STREAM_SLOT_TTL,
+        )
+    return _stream_limiter
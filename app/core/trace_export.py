@@ -0,0 +1,105 @@
+"""
+Batched export of finished spans to a trace collector.
+
+A background task drains the span ring buffer every ``interval`` seconds and
+POSTs the spans as JSON batches. Requests never wait on the collector: if it is
+slow or down, batches are dropped and the ring buffer overwrites old spans.
+"""
+import asyncio
+import logging
+
+import httpx
+
+from app.core.config import settings
+from app.core.tracing import SpanRecorder, span_recorder
+
+logger = logging.getLogger(__name__)
+
+
+def _span_to_dict(record: tuple) -> dict:
+    trace_id, span_id, parent_id, name, start_ns, end_ns, attributes = record
+    return {
+        "traceId": trace_id,
+        "spanId": span_id,
+        "parentSpanId": parent_id,
+        "name": name,
+        "startTimeUnixNano": start_ns,
+        "endTimeUnixNano": end_ns,
+        "attributes": attributes,
+    }
+
+
+class SpanExporter:
+    """Periodically ship spans from a ``SpanRecorder`` to ``url``."""
+
+    def __init__(
+        self,
+        url: str,
+        recorder: SpanRecorder = span_recorder,
+        interval: float = 2.0,
+        batch_size: int = 512,
+        service_name: str = "ai-chat-service",
+        client: httpx.AsyncClient | None = None,
+    ):
+        self.url = url
+        self.recorder = recorder
+        self.interval = interval
+        self.batch_size = batch_size
+        self.service_name = service_name
+        self.client = client or httpx.AsyncClient(timeout=5.0)
+        self._task: asyncio.Task | None = None
+        self.exported = 0
+        self.failed = 0
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.warning("Span export failed", exc_info=True)
+
+    async def flush(self) -> None:
+        """Send everything currently buffered."""
+        while batch := self.recorder.drain(self.batch_size):
+            try:
+                response = await self.client.post(
+                    self.url,
+                    json={
+                        "service": self.service_name,
+                        "spans": [_span_to_dict(record) for record in batch],
+                    },
+                )
+                response.raise_for_status()
+            except httpx.HTTPError:
+                self.failed += len(batch)
+                logger.warning("Dropped %d spans: collector unavailable", len(batch))
+                return
+            self.exported += len(batch)
+
+    async def stop(self) -> None:
+        """Stop the export loop, send what is left and close the client."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        finally:
+            await self.client.aclose()
+
+
+def create_span_exporter() -> SpanExporter:
+    return SpanExporter(
+        settings.TRACE_EXPORT_URL,
+        interval=settings.TRACE_EXPORT_INTERVAL,
+        batch_size=settings.TRACE_EXPORT_BATCH_SIZE,
+        service_name=settings.TRACE_SERVICE_NAME,
+    )
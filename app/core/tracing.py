@@ -1,11 +1,54 @@
-import uuid
-from contextvars import ContextVar
+"""
+Request tracing with W3C Trace Context propagation.
+
+Each request gets a ``Trace`` (from an incoming ``traceparent`` when valid)
+and a tree of ``Span`` objects. Finished spans are stored as plain tuples in a
+preallocated ring buffer that a background exporter drains in batches.
+
+Sampling is decided twice:
+
+- head: follow the caller's sampled flag, else keep ``TRACE_SAMPLE_RATIO``
+- tail: spans of unsampled traces are held until the request finishes and
+  kept anyway if it failed or took longer than ``TRACE_TAIL_LATENCY_MS``
+"""
+import asyncio
+import random
+import re
+import time
+import weakref
+from contextvars import Context, ContextVar
+
+from app.core.config import settings
 
 trace_id_ctx: ContextVar[str | None] = ContextVar("trace_id", default=None)
+_trace_ctx: ContextVar["Trace | None"] = ContextVar("trace", default=None)
+_span_ctx: ContextVar["Span | None"] = ContextVar("span", default=None)
+
+# Tasks do not expose their context before Python 3.12 (``Task.get_context``),
+# so there the request label of each task that starts a span is kept here
+_task_labels: "weakref.WeakKeyDictionary[asyncio.Task, str] | None" = (
+    None if hasattr(asyncio.Task, "get_context") else weakref.WeakKeyDictionary()
+)
+
+_TRACEPARENT_RE = re.compile(r"([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})")
+_TRACE_ID_RE = re.compile(r"[0-9a-f]{32}")
+_INVALID_TRACE_ID = "0" * 32
+_INVALID_SPAN_ID = "0" * 16
+
+# Trace IDs need to be unique, not unpredictable; the module PRNG is reseeded
+# in forked workers and is much cheaper than uuid4/os.urandom
+_getrandbits = random.getrandbits
+_random = random.random
 
 
 def generate_trace_id() -> str:
-    return str(uuid.uuid4())
+    """Return a random 128-bit trace ID as 32 lowercase hex characters."""
+    return f"{_getrandbits(128):032x}"
+
+
+def generate_span_id() -> str:
+    """Return a random 64-bit span ID as 16 lowercase hex characters."""
+    return f"{_getrandbits(64):016x}"
 
 
 def set_trace_id(trace_id: str):
@@ -19,3 +62,250 @@ def get_trace_id() -> str:
         trace_id = generate_trace_id()
         set_trace_id(trace_id)
     return trace_id
+
+
+def parse_traceparent(value: str | None) -> tuple[str, str, bool] | None:
+    """
+    Parse a ``traceparent`` header into (trace_id, parent_span_id, sampled).
+
+    Returns None for missing or invalid headers, in which case a new trace is
+    started. Versions above 00 are accepted as long as the known fields parse.
+    """
+    if not value:
+        return None
+    match = _TRACEPARENT_RE.match(value.strip())
+    if match is None:
+        return None
+    version, trace_id, parent_id, flags = match.groups()
+    if version == "ff" or (version == "00" and len(value.strip()) != 55):
+        return None
+    if trace_id == _INVALID_TRACE_ID or parent_id == _INVALID_SPAN_ID:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 0x01)
+
+
+def format_traceparent(trace_id: str, span_id: str, sampled: bool) -> str:
+    return f"00-{trace_id}-{span_id}-{'01' if sampled else '00'}"
+
+
+class SpanRecorder:
+    """
+    Fixed-size ring buffer of finished spans.
+
+    Slots are allocated up front and recording never blocks or grows memory:
+    when the exporter falls behind, the oldest spans are overwritten and
+    counted in ``dropped``. Only the event loop thread touches it.
+    """
+
+    def __init__(self, capacity: int = 8192):
+        self.capacity = capacity
+        self._slots: list[tuple | None] = [None] * capacity
+        self._write = 0
+        self._read = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self._write - self._read
+
+    def record(self, span: tuple) -> None:
+        if self._write - self._read >= self.capacity:
+            self._read += 1
+            self.dropped += 1
+        self._slots[self._write % self.capacity] = span
+        self._write += 1
+
+    def drain(self, max_items: int) -> list[tuple]:
+        """Remove and return up to ``max_items`` spans, oldest first."""
+        count = min(max_items, self._write - self._read)
+        batch = []
+        for i in range(self._read, self._read + count):
+            index = i % self.capacity
+            batch.append(self._slots[index])
+            self._slots[index] = None
+        self._read += count
+        return batch
+
+
+span_recorder = SpanRecorder(settings.TRACE_BUFFER_SIZE)
+
+
+class Trace:
+    """Per-request trace state: identity, sampling decision and held spans."""
+
+    __slots__ = ("trace_id", "parent_id", "sampled", "tracestate", "w3c", "kept", "_held")
+
+    def __init__(
+        self,
+        trace_id: str,
+        parent_id: str | None = None,
+        sampled: bool = False,
+        tracestate: str | None = None,
+    ):
+        self.trace_id = trace_id
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.tracestate = tracestate
+        # Custom X-Trace-Id values are echoed but cannot be put in a traceparent
+        self.w3c = _TRACE_ID_RE.fullmatch(trace_id) is not None
+        # None until the request finishes and the tail decision is made
+        self.kept: bool | None = None
+        self._held: list[tuple] | None = None if sampled else []
+
+    def _finish_span(self, record: tuple) -> None:
+        if self.sampled or self.kept:
+            span_recorder.record(record)
+        elif self.kept is None:
+            self._held.append(record)
+
+    def finish(self, duration_ms: float, error: bool = False) -> None:
+        """Make the tail sampling decision once the request is done."""
+        if self.kept is not None:
+            return
+        self.kept = self.sampled or error or duration_ms >= settings.TRACE_TAIL_LATENCY_MS
+        if self.kept and self._held:
+            for record in self._held:
+                span_recorder.record(record)
+        self._held = None
+
+
+class Span:
+    """A timed operation within a trace; call ``end`` exactly once."""
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_ns", "attributes")
+
+    def __init__(self, trace: Trace, name: str, parent_id: str | None, attributes: dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = generate_span_id()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.attributes = attributes
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def end(self) -> None:
+        self.trace._finish_span(
+            (
+                self.trace.trace_id,
+                self.span_id,
+                self.parent_id,
+                self.name,
+                self.start_ns,
+                time.time_ns(),
+                self.attributes,
+            )
+        )
+
+
+class _NoopSpan:
+    """Returned outside a traced request so callers need no checks."""
+
+    __slots__ = ()
+    span_id = None
+
+    def set_attribute(self, key: str, value) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def start_trace(
+    traceparent: str | None = None,
+    tracestate: str | None = None,
+    trace_id: str | None = None,
+) -> Trace:
+    """
+    Start the trace for the current request and make it current.
+
+    A valid ``traceparent`` continues the caller's trace and sampling
+    decision. Otherwise ``trace_id`` (e.g. from ``X-Trace-Id``) or a new ID is
+    used and the head sampling ratio applies.
+    """
+    parent = parse_traceparent(traceparent)
+    if parent is not None:
+        trace = Trace(parent[0], parent[1], parent[2], tracestate)
+    else:
+        trace = Trace(
+            trace_id or generate_trace_id(), sampled=_random() < settings.TRACE_SAMPLE_RATIO
+        )
+    _trace_ctx.set(trace)
+    _span_ctx.set(None)
+    set_trace_id(trace.trace_id)
+    return trace
+
+
+def start_span(name: str, activate: bool = False, **attributes) -> Span | _NoopSpan:
+    """
+    Start a span under the current span of the current trace.
+
+    With ``activate`` the span becomes the parent of spans started later in
+    this context; leave it off inside generators, whose context is the
+    consumer's.
+    """
+    trace = _trace_ctx.get()
+    if trace is None:
+        return _NOOP_SPAN
+    parent = _span_ctx.get()
+    span = Span(trace, name, parent.span_id if parent else trace.parent_id, attributes)
+    if activate:
+        _span_ctx.set(span)
+    if _task_labels is not None:
+        _remember_task_label(trace, overwrite=activate)
+    return span
+
+
+def _remember_task_label(trace: "Trace", overwrite: bool) -> None:
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        return
+    if task is not None and (overwrite or task not in _task_labels):
+        _task_labels[task] = _label(trace, _span_ctx.get())
+
+
+def current_traceparent() -> str | None:
+    """``traceparent`` value for outgoing calls made from the current span."""
+    trace = _trace_ctx.get()
+    if trace is None or not trace.w3c:
+        return None
+    span = _span_ctx.get()
+    span_id = span.span_id if span else trace.parent_id
+    if span_id is None:
+        return None
+    return format_traceparent(trace.trace_id, span_id, trace.sampled)
+
+
+def _label(trace: "Trace", root: "Span | None") -> str:
+    path = root.attributes.get("path") if root is not None else None
+    return f"{path or 'request'} trace={trace.trace_id}"
+
+
+def request_label(context: Context) -> str | None:
+    """``"<path> trace=<id>"`` for the request traced in ``context``, if any."""
+    trace = context.get(_trace_ctx)
+    if trace is None:
+        return None
+    return _label(trace, context.get(_span_ctx))
+
+
+def task_label(task: asyncio.Task) -> str | None:
+    """Request label of the traced request ``task`` is working on, if any."""
+    if _task_labels is None:
+        return request_label(task.get_context())
+    return _task_labels.get(task)
+
+
+async def inject_trace_context(request) -> None:
+    """httpx request hook that propagates the current trace to providers."""
+    traceparent = current_traceparent()
+    if traceparent is None or "traceparent" in request.headers:
+        return
+    request.headers["traceparent"] = traceparent
+    tracestate = _trace_ctx.get().tracestate
+    if tracestate:
+        request.headers["tracestate"] = tracestate
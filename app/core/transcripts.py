@@ -0,0 +1,196 @@
+"""
+Write-behind persistence of chat transcripts.
+
+``chat_stream`` hands each finished exchange to ``TranscriptWriter.record``,
+which appends one tuple to a bounded in-memory queue and returns; nothing is
+encoded or written while the response streams. A background task wakes every
+``flush_interval`` seconds (or as soon as a batch is waiting), encodes the
+queued transcripts and inserts them with one ``executemany`` per batch inside
+a transaction. ``stop`` writes whatever is still queued.
+
+A batch that fails to write goes back to the head of the queue and is
+retried on the next flush, so a database outage costs transcripts only once
+the queue is full. When it is, new transcripts (and the newest of a requeued
+batch) are dropped; drops, and anything still unwritten when ``stop``
+returns, are counted in ``chat_transcripts_dropped_total`` and the current
+backlog is exported as ``chat_transcript_queue_depth``.
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+
+from app.core.config import settings
+from app.core.database import ConnectionPool, DatabaseSession, Statement, get_pool
+from app.core.prometheus import TRANSCRIPT_QUEUE_DEPTH, TRANSCRIPTS_DROPPED
+
+logger = logging.getLogger(__name__)
+
+# Field order of the tuples passed to ``TranscriptWriter.record``
+FIELDS = (
+    "created_at",
+    "trace_id",
+    "user_id",
+    "auth_method",
+    "backend",
+    "messages",
+    "response",
+    "outcome",
+    "tokens",
+    "ttft_ms",
+    "duration_ms",
+)
+
+CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS chat_transcripts (
+    created_at DOUBLE PRECISION NOT NULL,
+    trace_id TEXT,
+    user_id TEXT NOT NULL,
+    auth_method TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    messages TEXT NOT NULL,
+    response TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    ttft_ms DOUBLE PRECISION,
+    duration_ms DOUBLE PRECISION NOT NULL
+)
+"""
+
+INSERT_TRANSCRIPT = Statement(
+    f"INSERT INTO chat_transcripts ({', '.join(FIELDS)}) "
+    f"VALUES ({', '.join(f'${i}' for i in range(1, len(FIELDS) + 1))})"
+)
+
+
+def _encode(entry: tuple) -> tuple:
+    # messages: ChatMessage models; response: the streamed tokens, stored as JSON arrays
+    messages = json.dumps([message.model_dump() for message in entry[5]])
+    return (*entry[:5], messages, json.dumps(entry[6]), *entry[7:])
+
+
+class TranscriptWriter:
+    """Bounded queue of transcripts bulk-inserted by a background task."""
+
+    def __init__(
+        self,
+        pool: ConnectionPool | None = None,
+        maxsize: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+    ):
+        self.pool = pool
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: deque[tuple] = deque()
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def record(self, entry: tuple) -> None:
+        """Queue one transcript (see ``FIELDS``); a no-op until the writer starts."""
+        if self._task is None:
+            return
+        queue = self._queue
+        if len(queue) >= self.maxsize:
+            self.dropped += 1
+            TRANSCRIPTS_DROPPED.labels("overflow").inc()
+            return
+        queue.append(entry)
+        TRANSCRIPT_QUEUE_DEPTH.inc()
+        if len(queue) == self.batch_size:
+            self._wake.set()
+
+    async def start(self) -> None:
+        """Create the table if needed and start the flush task."""
+        if self._task is not None:
+            return
+        if self.pool is None:
+            self.pool = get_pool()
+        session = DatabaseSession(self.pool)
+        try:
+            await session.execute(CREATE_TABLE)
+        finally:
+            await session.close()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush task and write everything still queued."""
+        task = self._task
+        if task is None:
+            return
+        # Let an in-flight batch finish rather than cancelling it half-written
+        self._stopping = True
+        self._wake.set()
+        await task
+        self._task = None
+        if self._queue:
+            # The final flush failed too; nothing will retry these
+            lost = len(self._queue)
+            self._queue.clear()
+            TRANSCRIPT_QUEUE_DEPTH.dec(lost)
+            self.dropped += lost
+            TRANSCRIPTS_DROPPED.labels("write_error").inc(lost)
+            logger.warning("Dropped %d chat transcripts at shutdown: write failed", lost)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Insert queued transcripts in batches of ``batch_size``."""
+        queue = self._queue
+        while queue:
+            batch = [queue.popleft() for _ in range(min(self.batch_size, len(queue)))]
+            TRANSCRIPT_QUEUE_DEPTH.dec(len(batch))
+            session = DatabaseSession(self.pool)
+            try:
+                async with session.transaction():
+                    await session.executemany(INSERT_TRANSCRIPT, [_encode(e) for e in batch])
+            except Exception:
+                self.failed += len(batch)
+                self._requeue(batch)
+                logger.warning(
+                    "Chat transcript write failed; %d kept for retry", len(batch), exc_info=True
+                )
+                return
+            finally:
+                await session.close()
+            self.written += len(batch)
+
+    def _requeue(self, batch: list[tuple]) -> None:
+        """Put a failed batch back at the head of the queue, within ``maxsize``."""
+        queue = self._queue
+        queue.extendleft(reversed(batch))
+        TRANSCRIPT_QUEUE_DEPTH.inc(len(batch))
+        overflow = len(queue) - self.maxsize
+        if overflow > 0:
+            # Oldest first, like record(): the newest transcripts give way
+            for _ in range(overflow):
+                queue.pop()
+            TRANSCRIPT_QUEUE_DEPTH.dec(overflow)
+            self.dropped += overflow
+            TRANSCRIPTS_DROPPED.labels("overflow").inc(overflow)
+
+
+transcript_writer = TranscriptWriter(
+    maxsize=settings.TRANSCRIPT_QUEUE_SIZE,
+    batch_size=settings.TRANSCRIPT_BATCH_SIZE,
+    flush_interval=settings.TRANSCRIPT_FLUSH_INTERVAL,
+)
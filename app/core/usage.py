@@ -0,0 +1,202 @@
+"""
+Per-user usage ledger for the chat endpoints.
+
+Each finished chat request adds to four counters for its user and UTC day:
+requests, prompt tokens, completion tokens and stream seconds. The counters
+live in a dict in this worker until a background task flushes them every
+``flush_interval`` seconds as one batch of additive upserts, so the database
+sees one row write per active user per interval rather than one per request.
+
+Upserts add to the stored totals (``requests = requests + excluded.requests``),
+so any number of workers can flush into the same rows without coordination.
+A batch that fails to write is merged back into the in-memory counters and
+retried on the next flush. Totals read from the database therefore lag by up
+to ``flush_interval``. They cover every worker only when ``DATABASE_URL`` is a
+database the workers share; with the default in-memory SQLite each worker
+counts into its own copy.
+"""
+import asyncio
+import datetime
+import logging
+
+from app.core.config import settings
+from app.core.database import ConnectionPool, DatabaseSession, Statement, get_pool
+
+logger = logging.getLogger(__name__)
+
+CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS usage_ledger (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    requests BIGINT NOT NULL,
+    prompt_tokens BIGINT NOT NULL,
+    completion_tokens BIGINT NOT NULL,
+    stream_seconds DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (user_id, day)
+)
+"""
+
+UPSERT_USAGE = Statement(
+    "INSERT INTO usage_ledger (user_id, day, requests, prompt_tokens, completion_tokens, "
+    "stream_seconds) VALUES ($1, $2, $3, $4, $5, $6) "
+    "ON CONFLICT (user_id, day) DO UPDATE SET "
+    "requests = usage_ledger.requests + excluded.requests, "
+    "prompt_tokens = usage_ledger.prompt_tokens + excluded.prompt_tokens, "
+    "completion_tokens = usage_ledger.completion_tokens + excluded.completion_tokens, "
+    "stream_seconds = usage_ledger.stream_seconds + excluded.stream_seconds"
+)
+
+_TOTALS = (
+    "SELECT user_id, CAST(SUM(requests) AS BIGINT), CAST(SUM(prompt_tokens) AS BIGINT), "
+    "CAST(SUM(completion_tokens) AS BIGINT), SUM(stream_seconds), MIN(day), MAX(day) "
+    "FROM usage_ledger WHERE day >= $1 {user_filter}GROUP BY user_id "
+    "ORDER BY SUM(prompt_tokens) + SUM(completion_tokens) DESC, user_id LIMIT $2"
+)
+TOTALS = _TOTALS.format(user_filter="")
+USER_TOTALS = _TOTALS.format(user_filter="AND user_id = $3 ")
+
+
+def _today() -> str:
+    return datetime.datetime.now(datetime.UTC).date().isoformat()
+
+
+class UsageLedger:
+    """In-memory per-user counters flushed to the database in bulk."""
+
+    def __init__(self, pool: ConnectionPool | None = None, flush_interval: float = 10.0):
+        self.pool = pool
+        self.flush_interval = flush_interval
+        # (user_id, day) -> [requests, prompt_tokens, completion_tokens, stream_seconds]
+        self._pending: dict[tuple[str, str], list] = {}
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self._schema_ready = False
+        self.flushed = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def record(
+        self, user_id: str, prompt_tokens: int, completion_tokens: int, stream_seconds: float
+    ) -> None:
+        """Count one chat request for ``user_id``; a no-op until the ledger starts."""
+        if self._task is None:
+            # Never flushed (USAGE_LEDGER_ENABLED is off, or no lifespan), so never counted
+            return
+        key = (user_id, _today())
+        counters = self._pending.get(key)
+        if counters is None:
+            self._pending[key] = [1, prompt_tokens, completion_tokens, stream_seconds]
+        else:
+            counters[0] += 1
+            counters[1] += prompt_tokens
+            counters[2] += completion_tokens
+            counters[3] += stream_seconds
+
+    def merge(self, pending: dict[tuple[str, str], list]) -> None:
+        """Add counters from another snapshot (a failed batch) into this ledger."""
+        for key, values in pending.items():
+            counters = self._pending.get(key)
+            if counters is None:
+                self._pending[key] = list(values)
+            else:
+                for i, value in enumerate(values):
+                    counters[i] += value
+
+    async def _ensure_schema(self, session: DatabaseSession) -> None:
+        if not self._schema_ready:
+            await session.execute(CREATE_TABLE)
+            self._schema_ready = True
+
+    async def start(self) -> None:
+        """Create the table if needed and start the flush task."""
+        if self._task is not None:
+            return
+        if self.pool is None:
+            self.pool = get_pool()
+        session = DatabaseSession(self.pool)
+        try:
+            await self._ensure_schema(session)
+        finally:
+            await session.close()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush task and write the remaining counters."""
+        task = self._task
+        if task is not None:
+            # Cancelling mid-COMMIT would merge back rows that were written
+            self._stopping = True
+            self._wake.set()
+            await task
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Upsert everything counted since the last flush in one transaction."""
+        if not self._pending:
+            return
+        if self.pool is None:
+            self.pool = get_pool()
+        # Requests finishing while the batch is written start a fresh dict
+        pending, self._pending = self._pending, {}
+        rows = [(user_id, day, *values) for (user_id, day), values in pending.items()]
+        session = DatabaseSession(self.pool)
+        try:
+            await self._ensure_schema(session)
+            async with session.transaction():
+                await session.executemany(UPSERT_USAGE, rows)
+        except asyncio.CancelledError:
+            # Shutdown mid-flush: stop() writes these again
+            self.merge(pending)
+            raise
+        except Exception:
+            self.failed += 1
+            self.merge(pending)
+            logger.warning("Usage flush failed; %d rows kept for retry", len(rows), exc_info=True)
+            return
+        finally:
+            await session.close()
+        self.flushed += len(rows)
+
+    async def totals(
+        self,
+        session: DatabaseSession,
+        since: datetime.date,
+        user_id: str | None = None,
+        limit: int = 100,
+    ) -> list[dict]:
+        """Flushed totals per user from ``since`` (UTC day) on, largest token users first."""
+        await self._ensure_schema(session)
+        if user_id is None:
+            rows = await session.fetch(TOTALS, since.isoformat(), limit)
+        else:
+            rows = await session.fetch(USER_TOTALS, since.isoformat(), limit, user_id)
+        return [
+            {
+                "user_id": row[0],
+                "requests": row[1],
+                "prompt_tokens": row[2],
+                "completion_tokens": row[3],
+                "stream_seconds": round(row[4], 3),
+                "first_day": row[5],
+                "last_day": row[6],
+            }
+            for row in rows
+        ]
+
+
+usage_ledger = UsageLedger(flush_interval=settings.USAGE_FLUSH_INTERVAL)
@@ -0,0 +1,138 @@
+"""
+Worker warmup: do the one-off work of a first request before taking traffic.
+
+Left alone, the first requests a worker serves pay for work that is deferred
+until something needs it: the OpenAPI schema and docs pages are rendered on
+the first ``/openapi.json`` or ``/docs``, ``jose`` is imported by the first
+bearer token, ``slowapi`` by the first rate-limited request, and the anyio
+thread pool that runs sync dependencies starts on first use.
+
+``warm_app`` is the CPU-only part (schema and docs bytes, route tables, model
+validators and serializers, imports). It starts no threads, so with ``preload_app`` gunicorn
+runs it once in the master before forking and every worker inherits the
+result. ``warm_worker`` repeats it (cheaply, everything is cached) and adds
+the per-process part; it runs in each worker's lifespan.
+
+``freeze_for_fork`` is the master's last step before forking. It builds the
+remaining read-only tables (the API key index) and moves every object into
+the GC's permanent generation, so collections in the workers never write to
+the inherited objects and their pages stay shared copy-on-write.
+"""
+import gc
+import importlib
+import logging
+import time
+
+import anyio.to_thread
+import fastapi.routing
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, ValidationError
+
+from app.api.docs import get_documents
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _lazy_modules() -> list[str]:
+    """Modules the configured request path imports on first use."""
+    modules = ["app.core.api_key_auth"]
+    if not settings.OAUTH_INTROSPECTION_URL:
+        # Bearer tokens are decoded locally (JWKS or the demo HS256 path)
+        modules.append("jose.jwt")
+    if settings.RATE_LIMIT_ENABLED and settings.RATE_LIMIT_MODE != "lease":
+        modules.append("slowapi")
+    return modules
+
+
+def _api_routes(app: FastAPI) -> list[APIRoute]:
+    """Every API route, resolving lazily built route tables on the way."""
+    iter_route_contexts = getattr(fastapi.routing, "iter_route_contexts", None)
+    if iter_route_contexts is None:
+        # FastAPI versions without it copy included routes into ``app.routes``
+        return [route for route in app.routes if isinstance(route, APIRoute)]
+    return [
+        context.original_route
+        for context in iter_route_contexts(app.routes)
+        if isinstance(context.original_route, APIRoute)
+    ]
+
+
+def _route_models(route: APIRoute) -> list[type[BaseModel]]:
+    candidates = [route.response_model]
+    candidates.extend(param.field_info.annotation for param in route.dependant.body_params)
+    return [m for m in candidates if isinstance(m, type) and issubclass(m, BaseModel)]
+
+
+def _exercise_model(model: type[BaseModel]) -> None:
+    """Run the model's schema examples through validation and serialization."""
+    extra = model.model_config.get("json_schema_extra")
+    examples = extra.get("examples", []) if isinstance(extra, dict) else []
+    for example in examples:
+        try:
+            instance = model.model_validate(example)
+        except ValidationError:
+            continue
+        instance.model_dump_json()
+        jsonable_encoder(instance)
+
+
+def warm_app(app: FastAPI) -> dict:
+    """
+    Build everything a first request would, without starting threads.
+
+    Returns:
+        dict: counts of what was warmed and the time taken, for logging
+    """
+    started = time.perf_counter()
+    for module in _lazy_modules():
+        importlib.import_module(module)
+
+    get_documents(app)
+    routes = _api_routes(app)
+    models = {model for route in routes for model in _route_models(route)}
+    for model in models:
+        _exercise_model(model)
+
+    return {
+        "routes": len(routes),
+        "models": len(models),
+        "ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def freeze_for_fork() -> dict:
+    """
+    Build shared read-only tables and freeze the heap before workers fork.
+
+    Call with the GC disabled since startup (so the heap has no holes freed
+    by collections); it is enabled again once everything is frozen.
+
+    Returns:
+        dict: API keys indexed and objects frozen, for logging
+    """
+    from app.core.key_store import get_key_store
+
+    keys = len(get_key_store())
+    gc.freeze()
+    gc.enable()
+    return {"api_keys": keys, "frozen": gc.get_freeze_count()}
+
+
+async def warm_worker(app: FastAPI) -> None:
+    """Warm this worker process: ``warm_app`` plus per-process state."""
+    stats = warm_app(app)
+    if "slowapi" in _lazy_modules():
+        from app.middleware.rate_limit import get_limiter
+
+        get_limiter()
+    # Starts the thread pool that runs sync endpoints and dependencies
+    await anyio.to_thread.run_sync(lambda: None)
+    logger.info(
+        "Worker warm: %d routes, %d models in %.1f ms",
+        stats["routes"],
+        stats["models"],
+        stats["ms"],
+    )
@@ -1,24 +1,58 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
+from app.api.docs import router as docs_router
+from app.api.prometheus import router as prometheus_router
 from app.api.router import api_router
 from app.core.config import settings
+from app.core.resources import resources
+from app.core.warmup import warm_worker
 from app.middleware.auth_middleware import AuthMiddleware
+from app.middleware.health_fast_path import HealthFastPathMiddleware
+from app.middleware.load_shedding import LoadSheddingMiddleware
 from app.middleware.rate_limit import RateLimitMiddleware
 from app.middleware.tracing import TracingMiddleware
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Create and warm long-lived clients per worker; close them on shutdown."""
+    await resources.startup()
+    if settings.WARMUP_ENABLED:
+        await warm_worker(app)
+    try:
+        yield
+    finally:
+        await resources.shutdown()
+
+
 app = FastAPI(
     title="AI Chat Service",
     description="A FastAPI-based AI Chat Service with streaming support, authentication, and rate limiting",
     version="1.0.0",
-    docs_url="/docs",
-    redoc_url="/redoc",
-    openapi_url="/openapi.json",
+    # Schema and docs pages are served pre-built by app.api.docs
+    docs_url=None,
+    redoc_url=None,
+    openapi_url=None,
+    lifespan=lifespan,
 )
 
-# Middleware order matters: Auth -> Rate Limit -> Tracing
-app.add_middleware(AuthMiddleware)
+# Middleware order matters: Auth -> Rate Limit -> Tracing -> Load shedding -> Health.
+# The last middleware added runs first, so the list below is innermost first: auth
+# must run before the rate limiter so it can key on the user and read the key's plan.
 if settings.RATE_LIMIT_ENABLED:
     app.add_middleware(RateLimitMiddleware)
+app.add_middleware(AuthMiddleware)
 app.add_middleware(TracingMiddleware)
+if settings.LOOP_MONITOR_ENABLED:
+    # Outside tracing, so shed requests cost as little as possible
+    app.add_middleware(LoadSheddingMiddleware)
+if settings.HEALTH_FAST_PATH_ENABLED:
+    # Liveness probes are answered before any other middleware runs
+    app.add_middleware(HealthFastPathMiddleware)
 
 app.include_router(api_router, prefix="/api")
+app.include_router(prometheus_router)
+app.include_router(docs_router)
@@ -1,10 +1,11 @@
 from collections.abc import Awaitable, Callable
 
-from fastapi import HTTPException, Request
+from fastapi import HTTPException, Request, status
 from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+from starlette.responses import JSONResponse, Response
 
 from app.core.auth import get_auth_context
+from app.core.prometheus import AUTH_ATTEMPTS
 
 
 class AuthMiddleware(BaseHTTPMiddleware):
@@ -20,6 +21,8 @@ class AuthMiddleware(BaseHTTPMiddleware):
         public_paths = [
             "/api/v1/health",
             "/api/v1/ready",
+            "/api/v1/metrics",
+            "/metrics",
             "/api/v1/auth/login",
             "/api/v1/auth/callback",
             "/docs",
@@ -36,10 +39,19 @@ class AuthMiddleware(BaseHTTPMiddleware):
 
             if api_key or authorization:
                 auth_context = await get_auth_context(api_key=api_key, authorization=authorization)
+                AUTH_ATTEMPTS.labels(auth_context.auth_method, "success").inc()
                 request.state.user_id = auth_context.user_id
                 request.state.auth_method = auth_context.auth_method
+                request.state.plan = auth_context.plan
+
+                plan = auth_context.plan
+                if plan is not None and not plan.allows(request.url.path):
+                    return JSONResponse(
+                        status_code=status.HTTP_403_FORBIDDEN,
+                        content={"detail": f"Route not allowed on the '{plan.name}' plan"},
+                    )
         except HTTPException:
             # Auth failed, but let the endpoint handle it
-            pass
+            AUTH_ATTEMPTS.labels("api_key" if api_key else "oauth", "failure").inc()
 
         return await call_next(request)
@@ -0,0 +1,70 @@
+import json
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.tracing import (
+    format_traceparent,
+    generate_span_id,
+    generate_trace_id,
+    parse_traceparent,
+)
+
+HEALTH_PATH = "/api/v1/health"
+
+# HealthResponse(status="ok", trace_id=...) as JSONResponse encodes it
+_BODY_PREFIX = b'{"status":"ok","trace_id":"'
+_BODY_SUFFIX = b'"}'
+_CONTENT_TYPE = (b"content-type", b"application/json")
+
+
+class HealthFastPathMiddleware:
+    """
+    Answer liveness probes at the outermost ASGI layer.
+
+    ``GET /api/v1/health`` never reaches the other middleware, dependency
+    injection or response validation: the response is pre-encoded and only
+    the trace ID (continued from ``traceparent`` or ``X-Trace-Id``, else new)
+    is spliced into it. Probes are therefore not traced, counted in request
+    metrics or written to the access log. The route in ``app.api.v1.health``
+    still documents the endpoint and serves it when this middleware is off.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] != HEALTH_PATH or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = tracestate = trace_id = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+            elif name == b"tracestate":
+                tracestate = value
+            elif name == b"x-trace-id":
+                trace_id = value.decode("latin-1")
+
+        headers = [_CONTENT_TYPE]
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id = parent[0]
+            traceparent = format_traceparent(trace_id, generate_span_id(), parent[2])
+            headers.append((b"traceparent", traceparent.encode("latin-1")))
+            if tracestate:
+                headers.append((b"tracestate", tracestate))
+        elif not trace_id:
+            trace_id = generate_trace_id()
+
+        if trace_id.isascii() and trace_id.isalnum():
+            encoded = trace_id.encode("latin-1")
+        else:
+            # Caller-chosen IDs may need escaping to stay valid JSON
+            encoded = json.dumps(trace_id).encode()[1:-1]
+        body = _BODY_PREFIX + encoded + _BODY_SUFFIX
+        headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        headers.append((b"x-trace-id", trace_id.encode("latin-1")))
+
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,39 @@
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.loop_monitor import get_loop_monitor
+from app.core.prometheus import REQUESTS_SHED
+
+
+class LoadSheddingMiddleware:
+    """
+    Reject new requests with 503 while the event loop is lagging.
+
+    Admitting more work to a lagging loop delays every open SSE stream on the
+    worker, so new requests are turned away until the loop catches up. Probes
+    and scrapes are always admitted. A plain ASGI middleware so the check costs
+    one attribute lookup per request.
+    """
+
+    exempt_paths = frozenset({"/api/v1/health", "/api/v1/ready", "/api/v1/metrics", "/metrics"})
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.monitor = get_loop_monitor()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] == "http"
+            and self.monitor.overloaded
+            and scope["path"] not in self.exempt_paths
+        ):
+            REQUESTS_SHED.inc()
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server is overloaded, retry shortly"},
+                headers={"Retry-After": str(settings.LOAD_SHED_RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
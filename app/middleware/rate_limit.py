@@ -2,23 +2,48 @@ import time
 from collections.abc import Awaitable, Callable
 
 from fastapi import HTTPException, Request, status
-from slowapi import Limiter
-from slowapi.util import get_remote_address
 from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp
 
 from app.core.config import settings
+from app.core.key_store import KeyPlan
+from app.core.prometheus import RATE_LIMIT_REJECTIONS
+from app.core.rate_lease import get_lease_limiter
+from app.core.shm_counters import get_shared_counters
 
-# Initialize rate limiter
-limiter = Limiter(key_func=get_remote_address)
+_limiter = None
 
-# Rate limit storage (in-memory for demo, use Redis in production)
-if settings.REDIS_URL:
-    # Configure Redis storage if available
-    pass
-else:
-    # Use in-memory storage (type ignore for private attribute)
-    limiter.storage = {}  # type: ignore[attr-defined]
+
+def get_remote_address(request: Request) -> str:
+    """Client IP address of the request, or 127.0.0.1 if there is none."""
+    if not request.client or not request.client.host:
+        return "127.0.0.1"
+    return request.client.host
+
+
+def get_limiter():
+    """
+    Return the rate limiter whose ``storage`` holds the in-process windows.
+
+    Created on first use: slowapi (and the ``limits`` package it pulls in)
+    takes a few hundred milliseconds to import, paid by every worker.
+    """
+    global _limiter
+    if _limiter is None:
+        from slowapi import Limiter
+
+        _limiter = Limiter(key_func=get_remote_address)
+        # Use in-memory storage (type ignore for private attribute)
+        _limiter.storage = {}  # type: ignore[attr-defined]
+    return _limiter
+
+
+def __getattr__(name: str):
+    # ``limiter`` stays importable from this module without importing slowapi
+    if name == "limiter":
+        return get_limiter()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_rate_limit_key(request: Request) -> str:
@@ -36,12 +61,128 @@ def get_rate_limit_key(request: Request) -> str:
     return ip_address
 
 
+def get_rate_limits(request: Request) -> tuple[int, int]:
+    """
+    Get (per-minute, per-hour) limits for the request.
+    Uses the API key's plan when auth attached one, else the global settings.
+    """
+    plan = getattr(request.state, "plan", None)
+    if isinstance(plan, KeyPlan):
+        return plan.rate_limit_per_minute, plan.rate_limit_per_hour
+    return settings.RATE_LIMIT_PER_MINUTE, settings.RATE_LIMIT_PER_HOUR
+
+
+# Seconds between sweeps of expired windows out of ``limiter.storage``
+STORAGE_PRUNE_INTERVAL = 60.0
+_next_prune = 0.0
+
+
+def _prune_expired(storage: dict, now: float) -> None:
+    """Drop windows that have ended; otherwise every client key seen stays forever."""
+    expired = [key for key, entry in storage.items() if entry["reset"] < now]
+    for key in expired:
+        del storage[key]
+
+
+def _consume(
+    key: str, limit: int, window: int, now: float, cost: int = 1
+) -> tuple[bool, int, float]:
+    """
+    Count one request (or ``cost`` units) against a fixed-window counter.
+
+    Uses the node-wide shared-memory table when the gunicorn master created
+    one and its lock is usable, otherwise the per-process ``limiter.storage``
+    dict, which is swept of expired windows every ``STORAGE_PRUNE_INTERVAL``
+    seconds.
+
+    Returns:
+        tuple: (allowed, count, reset)
+    """
+    global _next_prune
+    table = get_shared_counters() if settings.RATE_LIMIT_SHARED_MEMORY else None
+    if table is not None:
+        result = table.hit(key, limit, window, now, cost)
+        if result is not None:
+            return result
+
+    storage = get_limiter().storage  # type: ignore[attr-defined]
+    if now >= _next_prune:
+        _prune_expired(storage, now)
+        _next_prune = now + STORAGE_PRUNE_INTERVAL
+    entry = storage.get(key)
+    if entry is None or entry["reset"] < now:
+        storage[key] = {"count": cost, "reset": now + window}
+        return True, cost, now + window
+    if entry["count"] + cost > limit:
+        return False, entry["count"], entry["reset"]
+    entry["count"] += cost
+    return True, entry["count"], entry["reset"]
+
+
+def _peek(key: str, now: float) -> int:
+    """Current count of a fixed-window counter without adding to it."""
+    table = get_shared_counters() if settings.RATE_LIMIT_SHARED_MEMORY else None
+    if table is not None and table.available():
+        return table.get(key, now)[0]
+    entry = get_limiter().storage.get(key)  # type: ignore[attr-defined]
+    if entry is None or entry["reset"] < now:
+        return 0
+    return entry["count"]
+
+
+# Plan token budgets are spent over this window, counted from the first use
+TOKEN_BUDGET_WINDOW = 86400
+
+
+def token_budget_exhausted(key: str, plan: KeyPlan | None) -> bool:
+    """
+    Whether ``key`` has used up its plan's ``token_budget`` for the window.
+
+    Budgets are counted like the request limits (node-wide with the shared
+    table, else per worker), and only while rate limiting is enabled.
+    """
+    if not settings.RATE_LIMIT_ENABLED or plan is None or plan.token_budget is None:
+        return False
+    return _peek(f"{key}:tokens", time.time()) >= plan.token_budget
+
+
+def charge_tokens(key: str, plan: KeyPlan | None, tokens: int) -> None:
+    """Spend ``tokens`` of ``key``'s plan budget; streamed tokens are always charged."""
+    if not settings.RATE_LIMIT_ENABLED or plan is None or plan.token_budget is None:
+        return
+    if tokens > 0:
+        _consume(f"{key}:tokens", 2**62, TOKEN_BUDGET_WINDOW, time.time(), cost=tokens)
+
+
+async def _check(key: str, limit: int, window: int, now: float) -> tuple[bool, int, float]:
+    """Count one request using the configured ``RATE_LIMIT_MODE``."""
+    if settings.RATE_LIMIT_MODE == "lease":
+        return await get_lease_limiter().hit(key, limit, window, now)
+    return _consume(key, limit, window, now)
+
+
 class RateLimitMiddleware(BaseHTTPMiddleware):
     """
     Rate limiting middleware using slowapi.
     Limits requests per minute and per hour.
     """
 
+    def __init__(self, app: ASGIApp):
+        super().__init__(app)
+        self.dispatch_func = self._dispatch_with_response
+
+    async def _dispatch_with_response(
+        self, request: Request, call_next: Callable[[Request], Awaitable[Response]]
+    ) -> Response:
+        # Middleware runs outside FastAPI's exception handlers, so the 429 raised
+        # by ``dispatch`` is turned into a response here rather than a 500
+        try:
+            return await self.dispatch(request, call_next)
+        except HTTPException as exc:
+            return JSONResponse(
+                status_code=exc.status_code, content={"detail": exc.detail}, headers=exc.headers
+            )
+
     async def dispatch(
         self, request: Request, call_next: Callable[[Request], Awaitable[Response]]
     ) -> Response:
@@ -49,6 +190,7 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         if request.url.path in [
             "/api/v1/health",
             "/api/v1/ready",
+            "/metrics",
             "/docs",
             "/openapi.json",
             "/redoc",
@@ -58,61 +200,48 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         # Get rate limit key
         key = get_rate_limit_key(request)
 
-        # Check per-minute limit
-        minute_key = f"{key}:minute"
-        storage = limiter.storage  # type: ignore[attr-defined]
-        minute_count = storage.get(minute_key, {}).get("count", 0)
-        minute_reset = storage.get(minute_key, {}).get("reset", 0)
-
+        per_minute, per_hour = get_rate_limits(request)
         current_time = time.time()
 
-        if minute_reset < current_time:
-            # Reset minute counter
-            storage[minute_key] = {"count": 1, "reset": current_time + 60}
-        else:
-            if minute_count >= settings.RATE_LIMIT_PER_MINUTE:
-                raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail=f"Rate limit exceeded: {settings.RATE_LIMIT_PER_MINUTE} requests per minute",
-                    headers={
-                        "X-RateLimit-Limit": str(settings.RATE_LIMIT_PER_MINUTE),
-                        "X-RateLimit-Remaining": "0",
-                        "X-RateLimit-Reset": str(int(minute_reset)),
-                    },
-                )
-            storage[minute_key]["count"] += 1
+        # Check per-minute limit
+        allowed, minute_count, minute_reset = await _check(
+            f"{key}:minute", per_minute, 60, current_time
+        )
+        if not allowed:
+            RATE_LIMIT_REJECTIONS.labels("minute").inc()
+            request.state.rate_limit = "rejected:minute"
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded: {per_minute} requests per minute",
+                headers={
+                    "X-RateLimit-Limit": str(per_minute),
+                    "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset": str(int(minute_reset)),
+                },
+            )
 
         # Check per-hour limit
-        hour_key = f"{key}:hour"
-        hour_count = storage.get(hour_key, {}).get("count", 0)
-        hour_reset = storage.get(hour_key, {}).get("reset", 0)
-
-        if hour_reset < current_time:
-            # Reset hour counter
-            storage[hour_key] = {"count": 1, "reset": current_time + 3600}
-        else:
-            if hour_count >= settings.RATE_LIMIT_PER_HOUR:
-                raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail=f"Rate limit exceeded: {settings.RATE_LIMIT_PER_HOUR} requests per hour",
-                    headers={
-                        "X-RateLimit-Limit": str(settings.RATE_LIMIT_PER_HOUR),
-                        "X-RateLimit-Remaining": "0",
-                        "X-RateLimit-Reset": str(int(hour_reset)),
-                    },
-                )
-            storage[hour_key]["count"] += 1
-
+        allowed, hour_count, hour_reset = await _check(f"{key}:hour", per_hour, 3600, current_time)
+        if not allowed:
+            RATE_LIMIT_REJECTIONS.labels("hour").inc()
+            request.state.rate_limit = "rejected:hour"
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded: {per_hour} requests per hour",
+                headers={
+                    "X-RateLimit-Limit": str(per_hour),
+                    "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset": str(int(hour_reset)),
+                },
+            )
+
+        request.state.rate_limit = "allowed"
         response = await call_next(request)
 
         # Add rate limit headers
-        response.headers["X-RateLimit-Limit-Minute"] = str(settings.RATE_LIMIT_PER_MINUTE)
-        response.headers["X-RateLimit-Limit-Hour"] = str(settings.RATE_LIMIT_PER_HOUR)
-        response.headers["X-RateLimit-Remaining-Minute"] = str(
-            max(0, settings.RATE_LIMIT_PER_MINUTE - storage[minute_key]["count"])
-        )
-        response.headers["X-RateLimit-Remaining-Hour"] = str(
-            max(0, settings.RATE_LIMIT_PER_HOUR - storage[hour_key]["count"])
-        )
+        response.headers["X-RateLimit-Limit-Minute"] = str(per_minute)
+        response.headers["X-RateLimit-Limit-Hour"] = str(per_hour)
+        response.headers["X-RateLimit-Remaining-Minute"] = str(max(0, per_minute - minute_count))
+        response.headers["X-RateLimit-Remaining-Hour"] = str(max(0, per_hour - hour_count))
 
         return response
@@ -1,14 +1,189 @@
+import time
+from collections.abc import AsyncIterator, Callable
+
 from fastapi import Request
+from fastapi.routing import APIRoute
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.routing import Match
+
+from app.core.access_log import access_log
+from app.core.prometheus import observe_request
+from app.core.tracing import Span, Trace, format_traceparent, start_span, start_trace
+
+
+def _route_template(request: Request) -> str | None:
+    """Path template of the route for ``request`` (``/items/{id}``), or None if none matches."""
+    scope = request.scope
+    if "route" not in scope:
+        # Rejected by a middleware before routing (403, 429): find the route it was for
+        router = getattr(scope.get("app"), "router", None)
+        for candidate in getattr(router, "routes", ()):
+            match, child_scope = candidate.matches(scope)
+            if match is not Match.NONE:
+                scope = {**scope, **child_scope}
+                break
+        else:
+            return None
+    route = scope.get("route")
+    path = scope["path"]
+    path_regex = getattr(route, "path_regex", None)
+    if path_regex is not None and path_regex.match(path):
+        return route.path
+    # Newer FastAPI keeps included routes relative to their router; put the
+    # parameter names back into the full path instead
+    for name, value in scope.get("path_params", {}).items():
+        path = path.replace(str(value), f"{{{name}}}", 1)
+    return path
+
 
-from app.core.tracing import generate_trace_id, set_trace_id
+def _log_access(
+    request: Request, status_code: int, trace: Trace, duration: float, bytes_sent: int
+) -> None:
+    state = request.state
+    timer = getattr(state, "stream_timer", None)
+    ttft_ms = tokens = None
+    if timer is not None:
+        tokens = timer.tokens
+        if timer.first is not None:
+            ttft_ms = round((timer.first - timer.start) * 1000, 3)
+    client = request.client
+    access_log.record(
+        (
+            time.time(),
+            request.method,
+            request.url.path,
+            status_code,
+            round(duration * 1000, 3),
+            bytes_sent,
+            client.host if client else None,
+            trace.trace_id,
+            getattr(state, "user_id", None),
+            getattr(state, "auth_method", None),
+            getattr(state, "rate_limit", None),
+            ttft_ms,
+            tokens,
+        )
+    )
+
+
+def _complete(
+    request: Request,
+    status_code: int,
+    root: Span,
+    trace: Trace,
+    start: float,
+    error: bool,
+    bytes_sent: int = 0,
+) -> None:
+    duration = time.perf_counter() - start
+    root.end()
+    trace.finish(duration * 1000, error)
+    observe_request(request.method, _route_template(request), status_code, duration)
+    if access_log.running:
+        _log_access(request, status_code, trace, duration, bytes_sent)
+
+
+async def _end_after_body(
+    body: AsyncIterator[bytes],
+    request: Request,
+    status_code: int,
+    root: Span,
+    trace: Trace,
+    start: float,
+    error: bool,
+) -> AsyncIterator[bytes]:
+    # For streaming responses the request is only done once the body is sent
+    sent = 0
+    try:
+        async for chunk in body:
+            sent += len(chunk)
+            yield chunk
+    except BaseException:
+        error = True
+        raise
+    finally:
+        _complete(request, status_code, root, trace, start, error, sent)
 
 
 class TracingMiddleware(BaseHTTPMiddleware):
+    """
+    Trace requests, record request count and duration metrics and queue an
+    access log record.
+
+    Added last so it is the outermost middleware and its timing covers the
+    others as well.
+    """
+
     async def dispatch(self, request: Request, call_next):
-        trace_id = request.headers.get("X-Trace-Id") or generate_trace_id()
-        set_trace_id(trace_id)
+        start = time.perf_counter()
+        trace = start_trace(
+            traceparent=request.headers.get("traceparent"),
+            tracestate=request.headers.get("tracestate"),
+            trace_id=request.headers.get("X-Trace-Id"),
+        )
+        root = start_span(
+            "http.request", activate=True, method=request.method, path=request.url.path
+        )
+
+        try:
+            response = await call_next(request)
+        except Exception:
+            root.set_attribute("error", True)
+            _complete(request, 500, root, trace, start, error=True)
+            raise
+
+        root.set_attribute("status_code", response.status_code)
+        response.headers["X-Trace-Id"] = trace.trace_id
+        if trace.w3c:
+            response.headers["traceparent"] = format_traceparent(
+                trace.trace_id, root.span_id, trace.sampled
+            )
+            if trace.tracestate:
+                response.headers["tracestate"] = trace.tracestate
 
-        response = await call_next(request)
-        response.headers["X-Trace-Id"] = trace_id
+        error = response.status_code >= 500
+        body = getattr(response, "body_iterator", None)
+        if body is not None and response.headers.get("content-type", "").startswith(
+            "text/event-stream"
+        ):
+            response.body_iterator = _end_after_body(
+                body, request, response.status_code, root, trace, start, error
+            )
+        else:
+            # Other bodies are already produced; skip the per-chunk wrapper
+            length = response.headers.get("content-length")
+            _complete(
+                request,
+                response.status_code,
+                root,
+                trace,
+                start,
+                error,
+                int(length) if length else 0,
+            )
         return response
+
+
+class TracedRoute(APIRoute):
+    """
+    Route class that records a ``route.handler`` span.
+
+    The span covers body parsing, validation, dependencies (including auth)
+    and the endpoint up to the response object.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        path = self.path
+
+        async def traced_handler(request: Request):
+            span = start_span("route.handler", route=path)
+            try:
+                return await handler(request)
+            except Exception as exc:
+                span.set_attribute("error", type(exc).__name__)
+                raise
+            finally:
+                span.end()
+
+        return traced_handler
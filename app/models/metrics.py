@@ -0,0 +1,46 @@
+from pydantic import BaseModel, Field
+
+
+class HistogramSummary(BaseModel):
+    """Quantile summary of a latency or throughput histogram."""
+
+    count: int = Field(..., description="Number of recorded values", examples=[120])
+    mean: float = Field(..., description="Mean value", examples=[84.2])
+    p50: float = Field(..., description="Median", examples=[80.1])
+    p90: float = Field(..., description="90th percentile", examples=[120.5])
+    p99: float = Field(..., description="99th percentile", examples=[210.0])
+    max: float = Field(..., description="Largest recorded value", examples=[250.3])
+
+
+class StreamMetricsEntry(BaseModel):
+    """Streaming latency metrics for one route and backend."""
+
+    route: str = Field(..., description="Request path", examples=["/api/v1/chat/stream"])
+    backend: str = Field(..., description="Model backend", examples=["simulated"])
+    completed: int = Field(..., description="Streams that ran to completion", examples=[118])
+    aborted: int = Field(
+        ..., description="Streams cut short by errors or disconnects", examples=[2]
+    )
+    ttft_ms: HistogramSummary = Field(..., description="Time to first token (ms)")
+    inter_token_ms: HistogramSummary = Field(..., description="Gap between tokens (ms)")
+    duration_ms: HistogramSummary = Field(..., description="Whole stream duration (ms)")
+    tokens_per_sec: HistogramSummary = Field(..., description="Decode throughput per stream")
+
+
+class LoopLagSummary(HistogramSummary):
+    """Event loop lag of the worker (ms) and its admission state."""
+
+    current: float = Field(..., description="Most recent lag sample (ms)", examples=[0.4])
+    slow_callbacks: int = Field(
+        ..., description="Times the loop was blocked past the slow threshold", examples=[0]
+    )
+    overloaded: bool = Field(..., description="Whether new requests are being shed")
+
+
+class MetricsResponse(BaseModel):
+    """Streaming metrics of the worker that served the request."""
+
+    streams: list[StreamMetricsEntry] = Field(
+        ..., description="One entry per route and backend that has served streams"
+    )
+    event_loop_lag_ms: LoopLagSummary = Field(..., description="Event loop lag samples (ms)")
@@ -0,0 +1,33 @@
+import datetime
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+
+class UserUsage(BaseModel):
+    """Usage totals of one user over the requested days."""
+
+    user_id: str = Field(..., description="Authenticated user ID", examples=["user1"])
+    requests: int = Field(..., description="Chat requests served", examples=[42])
+    prompt_tokens: int = Field(..., description="Tokens in the request messages", examples=[1830])
+    completion_tokens: int = Field(..., description="Tokens streamed back", examples=[9120])
+    stream_seconds: float = Field(
+        ..., description="Total time spent streaming responses", examples=[311.5]
+    )
+    first_day: datetime.date = Field(..., description="First UTC day with usage in the range")
+    last_day: datetime.date = Field(..., description="Last UTC day with usage in the range")
+
+
+class UsageResponse(BaseModel):
+    """Per-user usage totals flushed by all workers."""
+
+    since: datetime.date = Field(..., description="First UTC day included")
+    scope: Literal["all_workers", "this_worker"] = Field(
+        ...,
+        description="this_worker when DATABASE_URL is in-memory SQLite: every worker then "
+        "keeps its own ledger and the totals cover only the worker that answered",
+        examples=["all_workers"],
+    )
+    users: list[UserUsage] = Field(
+        ..., description="One entry per user, largest token consumers first"
+    )
@@ -2,6 +2,18 @@ import asyncio
 
 from app.core.tracing import get_trace_id
 
+# Label for latency metrics; one per model backend once real ones are added
+BACKEND_NAME = "simulated"
+
+
+def count_tokens(text: str) -> int:
+    """Token count for usage accounting; the simulated backend streams whitespace-split words."""
+    return len(text.split())
+
+
+async def check_backend() -> None:
+    """Readiness probe for the model backend; the simulated one is always up."""
+
 
 async def stream_chat_tokens(prompt: str):
     """
@@ -0,0 +1,45 @@
+"""
+Gunicorn worker class that drains chat streams before the worker exits.
+
+``uvicorn.workers.UvicornWorker`` serves with a plain ``uvicorn.Server``,
+whose exit the app cannot observe: depending on the uvicorn version its
+signal handlers are installed with ``loop.add_signal_handler`` or
+``signal.signal``. This worker serves with ``DrainingServer`` instead, which
+tells the drain controller (``app.core.drain``) when it is asked to exit.
+
+Use it with ``worker_class = "app.workers.DrainingUvicornWorker"``.
+"""
+import sys
+from types import FrameType
+
+from gunicorn.arbiter import Arbiter
+from uvicorn.server import Server
+from uvicorn.workers import UvicornWorker
+
+from app.core.drain import drain_controller
+
+
+class DrainingServer(Server):
+    """uvicorn server that starts the stream drain as soon as it is told to exit."""
+
+    def handle_exit(self, sig: int, frame: FrameType | None) -> None:
+        super().handle_exit(sig, frame)
+        drain_controller.exit_requested()
+
+    async def serve(self, sockets=None) -> None:
+        # Before the lifespan starts the controller, which then polls this server
+        drain_controller.watch(self)
+        await super().serve(sockets=sockets)
+
+
+class DrainingUvicornWorker(UvicornWorker):
+    """``UvicornWorker`` serving with ``DrainingServer``."""
+
+    async def _serve(self) -> None:
+        # UvicornWorker._serve with the server class swapped
+        self.config.app = self.wsgi
+        server = DrainingServer(config=self.config)
+        self._install_sigquit_handler()
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)
@@ -0,0 +1 @@
+"""Performance benchmarks for the AI Chat Service (not part of the test suite)."""
@@ -0,0 +1,185 @@
+"""
+Shared versus unique memory of preloaded gunicorn workers.
+
+Starts gunicorn with ``gunicorn.conf.py`` (``preload_app`` on) on a free local
+port, sends ``--requests`` requests spread over the workers (health, ready,
+OpenAPI, authenticated chat streams) so every worker has served traffic and
+run its own garbage collections, then reads ``/proc/<pid>/smaps_rollup`` of
+each worker:
+
+- ``unique_mb`` (USS): private pages, what one more worker costs
+- ``shared_mb``: pages still shared copy-on-write with the master and siblings
+- ``pss_mb``: proportional share, what the worker costs on a fully packed node
+
+The run is repeated with ``GUNICORN_GC_FREEZE`` on and off (``--modes``) so the
+effect of freezing the master heap before fork is visible, and reports how
+many workers fit in ``--node-mb`` of memory for each mode. Linux only.
+
+Usage:
+    python -m benchmarks.bench_fork_memory [--workers 4] [--requests 2000]
+        [--modes freeze,no_freeze] [--node-mb 1024] [--output FILE]
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_KEY = "test-api-key-123"
+CHAT = {"messages": [{"role": "user", "content": "hello"}]}
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _smaps_kb(pid: int) -> dict[str, int]:
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as smaps:
+        for line in smaps:
+            name, _, rest = line.partition(":")
+            if name in SMAPS_FIELDS:
+                values[name] = int(rest.split()[0])
+    return values
+
+
+def _children(pid: int) -> list[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat:
+                # Fields after the parenthesised command name: state, ppid, ...
+                ppid = int(stat.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def _wait_ready(client: httpx.Client, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {process.returncode}")
+        try:
+            if client.get("/api/v1/health").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("gunicorn did not become ready")
+
+
+def _drive(client: httpx.Client, requests: int) -> None:
+    auth = {"X-API-Key": API_KEY}
+    for n in range(requests):
+        kind = n % 8
+        if kind == 0:
+            # Streams pace their tokens, so keep them to one in eight requests
+            client.post("/api/v1/chat/stream", json=CHAT, headers=auth)
+        elif kind == 1:
+            client.get("/openapi.json")
+        elif kind < 5:
+            client.get("/api/v1/ready")
+        else:
+            client.get("/api/v1/health")
+
+
+def _mb(kb: float) -> float:
+    return round(kb / 1024, 1)
+
+
+def measure(freeze: bool, workers: int, requests: int) -> dict:
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "GUNICORN_BIND": f"127.0.0.1:{port}",
+            "GUNICORN_WORKERS": str(workers),
+            "GUNICORN_PRELOAD_APP": "True",
+            "GUNICORN_GC_FREEZE": str(freeze),
+            "GUNICORN_MAX_REQUESTS": "0",
+            "GUNICORN_PIDFILE": os.path.join(tmp, "gunicorn.pid"),
+            "PROMETHEUS_MULTIPROC_DIR": os.path.join(tmp, "metrics"),
+            "ACCESS_LOG_TARGET": os.devnull,
+            # Every request comes from one address
+            "RATE_LIMIT_ENABLED": "false",
+            "STREAM_CONCURRENCY_LIMIT": "1000",
+        }
+        process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app"],
+            cwd=ROOT,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            # A new connection per request, so the kernel spreads them over workers
+            limits = httpx.Limits(max_keepalive_connections=0)
+            with httpx.Client(base_url=f"http://127.0.0.1:{port}", limits=limits) as client:
+                _wait_ready(client, process)
+                _drive(client, requests)
+            pids = _children(process.pid)
+            samples = [_smaps_kb(pid) for pid in pids]
+            master = _smaps_kb(process.pid)
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=60)
+
+    unique = [s["Private_Clean"] + s["Private_Dirty"] for s in samples]
+    shared = [s["Shared_Clean"] + s["Shared_Dirty"] for s in samples]
+    return {
+        "gc_freeze": freeze,
+        "workers": len(samples),
+        "master_rss_mb": _mb(master["Rss"]),
+        "worker_rss_mb": _mb(sum(s["Rss"] for s in samples) / len(samples)),
+        "worker_unique_mb": _mb(sum(unique) / len(unique)),
+        "worker_shared_mb": _mb(sum(shared) / len(shared)),
+        "worker_pss_mb": _mb(sum(s["Pss"] for s in samples) / len(samples)),
+        "shared_fraction": round(sum(shared) / sum(s["Rss"] for s in samples), 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--modes", default="freeze,no_freeze")
+    parser.add_argument("--node-mb", type=float, default=1024.0)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        sys.exit("bench_fork_memory needs Linux /proc/<pid>/smaps_rollup")
+
+    results = {}
+    for mode in args.modes.split(","):
+        result = measure(mode == "freeze", args.workers, args.requests)
+        # The master and the shared pages are paid once; each worker adds its unique pages
+        result["workers_per_node"] = int(
+            (args.node_mb - result["master_rss_mb"]) // result["worker_unique_mb"]
+        )
+        results[mode] = result
+
+    output = json.dumps({"node_mb": args.node_mb, "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Import-time budget for the application module.
+
+Every gunicorn worker started without ``preload_app`` (and every worker
+recycled by ``max_requests`` in that mode) imports ``app.main`` from scratch.
+This runs ``python -X importtime -c "import app.main"`` in fresh interpreters,
+keeps the fastest of ``--runs``, and reports the total along with the
+packages that cost the most (self time summed per top-level package).
+
+The run fails (exit 1) when the total is above ``--budget-ms`` or when a
+module that must stay lazy (``LAZY_MODULES``: imported on first use or by
+warmup, never at import) shows up.
+
+Usage:
+    python -m benchmarks.bench_import [--runs 5] [--budget-ms 1500] [--top 15]
+        [--module app.main]
+"""
+import argparse
+import json
+import subprocess
+import sys
+from collections import defaultdict
+
+# Optional or rarely used dependencies that ``import app.main`` must not load
+LAZY_MODULES = ("jose", "slowapi", "limits", "redis")
+
+
+def _parse(stderr: str) -> list[tuple[str, int, int]]:
+    """(module, self_us, cumulative_us) for each ``-X importtime`` line."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure(module: str) -> list[tuple[str, int, int]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return _parse(result.stderr)
+
+
+def report(rows: list[tuple[str, int, int]], module: str, top: int) -> dict:
+    total_us = next(cumulative for name, _, cumulative in rows if name == module)
+    by_package: dict[str, int] = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+    ranked = sorted(by_package.items(), key=lambda item: item[1], reverse=True)
+    imported = {name for name, _, _ in rows}
+    return {
+        "module": module,
+        "total_ms": round(total_us / 1000, 1),
+        "modules_imported": len(rows),
+        "lazy_modules_imported": [m for m in LAZY_MODULES if m in imported],
+        "top_packages_ms": {name: round(us / 1000, 1) for name, us in ranked[:top]},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500.0)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--module", default="app.main")
+    args = parser.parse_args()
+
+    runs = [report(measure(args.module), args.module, args.top) for _ in range(args.runs)]
+    best = min(runs, key=lambda r: r["total_ms"])
+    print(json.dumps(best, indent=2))
+
+    failures = []
+    if best["total_ms"] > args.budget_ms:
+        failures.append(f"import {args.module} took {best['total_ms']} ms")
+    if best["lazy_modules_imported"]:
+        failures.append(f"imported at startup: {', '.join(best['lazy_modules_imported'])}")
+    for line in failures:
+        print(f"FAIL {line} (budget {args.budget_ms} ms)", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+    print(
+        f"import {args.module}: {best['total_ms']} ms (budget {args.budget_ms} ms)", file=sys.stderr
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+JWT verification throughput per core.
+
+Signs RS256 tokens with a throwaway key, serves the public key from a stand-in
+JWKS endpoint and measures, on a single thread:
+
+- cold: every token is new, so each verification runs the signature check
+- cached: the same tokens again, served from the claims cache until ``exp``
+
+Usage:
+    python -m benchmarks.bench_jwt_verify [--tokens 2000]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+from app.core.jwks import JWKSCache, JWTVerifier
+
+
+def _make_keys() -> tuple[str, dict]:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    public_jwk = jwk.construct(public_pem, algorithm="RS256").to_dict()
+    public_jwk = {key: (v.decode() if isinstance(v, bytes) else v) for key, v in public_jwk.items()}
+    public_jwk["kid"] = "bench-key"
+    return private_pem, public_jwk
+
+
+async def run(n_tokens: int) -> dict:
+    private_pem, public_jwk = _make_keys()
+
+    def jwks_handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"keys": [public_jwk]})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(jwks_handler))
+    verifier = JWTVerifier(
+        JWKSCache("https://idp.bench/jwks", client=client),
+        algorithms=["RS256"],
+        cache_size=n_tokens,
+    )
+    exp = int(time.time()) + 3600
+    tokens = [
+        jwt.encode(
+            {"sub": f"user{i}", "exp": exp}, private_pem, "RS256", headers={"kid": "bench-key"}
+        )
+        for i in range(n_tokens)
+    ]
+
+    results = {}
+    for label in ("cold", "cached"):
+        start = time.perf_counter()
+        for token in tokens:
+            await verifier.verify(token)
+        elapsed = time.perf_counter() - start
+        results[label] = {
+            "verifications_per_sec": round(n_tokens / elapsed),
+            "us_per_verification": round(elapsed / n_tokens * 1e6, 2),
+        }
+    await client.aclose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tokens", type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.tokens)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+"""
+Load test for the chat stream, health and auth endpoints.
+
+A closed-loop load generator: ``--concurrency`` clients each send requests
+back to back for ``--duration`` seconds per scenario, and the harness records
+requests per second, latency percentiles, TTFT and inter-token latency (from
+the SSE ``data:`` events of ``/api/v1/chat/stream``) and resident memory.
+
+Two targets:
+
+- in-process (default): the app is driven through a streaming ASGI transport,
+  once per middleware configuration (``--configs``), with rate and stream
+  limits raised so the limiters are measured without rejecting load. Memory
+  is this process's RSS, so it includes the load generator.
+- live (``--url http://127.0.0.1:8000``): a running server, e.g. gunicorn
+  started with ``RATE_LIMIT_PER_MINUTE``, ``RATE_LIMIT_PER_HOUR`` and
+  ``STREAM_CONCURRENCY_LIMIT`` raised. Memory is the summed RSS of the
+  gunicorn master in ``--pid-file`` and its workers (Linux only).
+
+Results are printed (or written to ``--output``) as JSON. With ``--baseline``
+they are compared against a stored run and the command exits 1 if requests
+per second, p99 latency, p99 TTFT or memory is worse by more than
+``--tolerance``; ``--save-baseline`` stores the run as the new baseline.
+
+Usage:
+    python -m benchmarks.bench_load [--duration 5] [--concurrency 20]
+        [--configs full,no_rate_limit,auth_only] [--scenarios chat_stream,health,auth_bearer]
+        [--url URL] [--output FILE] [--baseline FILE [--save-baseline]] [--tolerance 0.2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import ExitStack
+from unittest.mock import patch
+
+import httpx
+from fastapi import FastAPI
+from jose import jwt
+
+from app.api.prometheus import router as prometheus_router
+from app.api.router import api_router
+from app.core.config import settings
+from app.core.metrics import LogLinearHistogram
+from app.core.resources import resources
+from app.core.stream_limiter import get_stream_limiter
+from app.middleware.auth_middleware import AuthMiddleware
+from app.middleware.health_fast_path import HealthFastPathMiddleware
+from app.middleware.load_shedding import LoadSheddingMiddleware
+from app.middleware.rate_limit import RateLimitMiddleware
+from app.middleware.tracing import TracingMiddleware
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline_load.json")
+
+# Same order as app.main (first added is innermost): the rate limiter runs after
+# auth, so it keys on the user and the key's plan rather than the client IP
+CONFIGS = {
+    "full": (
+        RateLimitMiddleware,
+        AuthMiddleware,
+        TracingMiddleware,
+        LoadSheddingMiddleware,
+        HealthFastPathMiddleware,
+    ),
+    "no_rate_limit": (
+        AuthMiddleware,
+        TracingMiddleware,
+        LoadSheddingMiddleware,
+        HealthFastPathMiddleware,
+    ),
+    "auth_only": (AuthMiddleware,),
+}
+
+# (dotted key, higher is worse)
+REGRESSION_CHECKS = (
+    ("rps", False),
+    ("latency_ms.p99", True),
+    ("ttft_ms.p99", True),
+    ("rss_mb", True),
+)
+
+
+class _QueueStream(httpx.AsyncByteStream):
+    def __init__(self, queue: asyncio.Queue, task: asyncio.Task, disconnect: asyncio.Event):
+        self._queue = queue
+        self._task = task
+        self._disconnect = disconnect
+
+    async def __aiter__(self):
+        while (chunk := await self._queue.get()) is not None:
+            yield chunk
+
+    async def aclose(self) -> None:
+        self._disconnect.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=5)
+        except (TimeoutError, asyncio.CancelledError):
+            pass
+
+
+class StreamingASGITransport(httpx.AsyncBaseTransport):
+    """
+    In-process transport that hands body chunks to the client as they are sent.
+
+    ``httpx.ASGITransport`` returns only once the app has sent the whole body,
+    which hides time-to-first-token.
+    """
+
+    def __init__(self, app: Callable):
+        self.app = app
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": request.method,
+            "scheme": request.url.scheme,
+            "path": request.url.path,
+            "raw_path": request.url.raw_path.split(b"?")[0],
+            "query_string": request.url.query,
+            "root_path": "",
+            "headers": [(key.lower(), value) for key, value in request.headers.raw],
+            "server": (request.url.host, request.url.port or 80),
+            # Callers can pose as distinct clients with extensions={"client": (host, port)}
+            "client": request.extensions.get("client", ("127.0.0.1", 50000)),
+        }
+        loop = asyncio.get_running_loop()
+        started: asyncio.Future = loop.create_future()
+        queue: asyncio.Queue = asyncio.Queue()
+        disconnect = asyncio.Event()
+        request_sent = False
+
+        async def receive() -> dict:
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                started.set_result(message)
+            elif message["type"] == "http.response.body":
+                if message.get("body"):
+                    queue.put_nowait(message["body"])
+                if not message.get("more_body", False):
+                    queue.put_nowait(None)
+
+        async def run() -> None:
+            try:
+                await self.app(scope, receive, send)
+            except Exception as exc:
+                if not started.done():
+                    started.set_exception(exc)
+            finally:
+                queue.put_nowait(None)
+
+        task = loop.create_task(run())
+        message = await started
+        return httpx.Response(
+            message["status"],
+            headers=message.get("headers", []),
+            stream=_QueueStream(queue, task, disconnect),
+            request=request,
+        )
+
+
+def build_app(middleware: tuple[type, ...]) -> FastAPI:
+    """The service's routes behind the given middleware stack."""
+    app = FastAPI()
+    for cls in middleware:
+        app.add_middleware(cls)
+    app.include_router(api_router, prefix="/api")
+    app.include_router(prometheus_router)
+    return app
+
+
+class ScenarioStats:
+    """Counters and latency histograms (seconds, microsecond resolution)."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latency = LogLinearHistogram(scale=1e6)
+        self.ttft = LogLinearHistogram(scale=1e6)
+        self.inter_token = LogLinearHistogram(scale=1e6)
+
+    def observe(self, start: float, ok: bool) -> None:
+        self.requests += 1
+        if not ok:
+            self.errors += 1
+        self.latency.record(time.perf_counter() - start)
+
+    def summary(self, elapsed: float) -> dict:
+        result = {
+            "requests": self.requests,
+            "errors": self.errors,
+            "rps": round(self.requests / elapsed, 1),
+            "latency_ms": self.latency.summary(1e3),
+        }
+        if self.ttft.count:
+            result["ttft_ms"] = self.ttft.summary(1e3)
+            result["inter_token_ms"] = self.inter_token.summary(1e3)
+        return result
+
+
+def _scenarios(
+    prompt_words: int, api_key: str, bearer_token: str
+) -> dict[str, Callable[[httpx.AsyncClient, ScenarioStats], Awaitable[None]]]:
+    chat_body = {"messages": [{"role": "user", "content": " ".join(["word"] * prompt_words)}]}
+
+    async def get(client: httpx.AsyncClient, stats: ScenarioStats, path: str, headers=None):
+        start = time.perf_counter()
+        try:
+            response = await client.get(path, headers=headers)
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        stats.observe(start, ok)
+
+    async def health(client: httpx.AsyncClient, stats: ScenarioStats) -> None:
+        await get(client, stats, "/api/v1/health")
+
+    async def auth_bearer(client: httpx.AsyncClient, stats: ScenarioStats) -> None:
+        await get(client, stats, "/api/v1/auth/me", {"Authorization": f"Bearer {bearer_token}"})
+
+    async def chat_stream(client: httpx.AsyncClient, stats: ScenarioStats) -> None:
+        start = time.perf_counter()
+        last = None
+        try:
+            async with client.stream(
+                "POST", "/api/v1/chat/stream", json=chat_body, headers={"X-API-Key": api_key}
+            ) as response:
+                ok = response.status_code == 200
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    now = time.perf_counter()
+                    if last is None:
+                        stats.ttft.record(now - start)
+                    else:
+                        stats.inter_token.record(now - last)
+                    last = now
+        except httpx.HTTPError:
+            ok = False
+        stats.observe(start, ok)
+
+    return {"chat_stream": chat_stream, "health": health, "auth_bearer": auth_bearer}
+
+
+def _rss_mb(pids: list[int]) -> float | None:
+    """Summed resident memory of ``pids`` from /proc; None where unavailable."""
+    page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+    total = 0
+    try:
+        for pid in pids:
+            with open(f"/proc/{pid}/statm") as statm:
+                total += int(statm.read().split()[1]) * page_size
+    except (OSError, ValueError):
+        return None
+    return round(total / 2**20, 1)
+
+
+def _server_pids(pid_file: str) -> list[int]:
+    """The gunicorn master in ``pid_file`` and its children (Linux)."""
+    try:
+        with open(pid_file) as f:
+            master = int(f.read().strip())
+    except (OSError, ValueError):
+        return []
+    pids = [master]
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as stat:
+                    # ppid is the second field after the parenthesised command
+                    ppid = int(stat.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            if ppid == master:
+                pids.append(int(entry))
+    return pids
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Callable[[httpx.AsyncClient, ScenarioStats], Awaitable[None]],
+    concurrency: int,
+    duration: float,
+    warmup: float,
+) -> tuple[ScenarioStats, float]:
+    """Drive ``scenario`` from ``concurrency`` clients; returns stats and elapsed time."""
+
+    async def loop(stats: ScenarioStats, until: float) -> None:
+        while time.perf_counter() < until:
+            await scenario(client, stats)
+
+    if warmup > 0:
+        warm_until = time.perf_counter() + warmup
+        await asyncio.gather(*(loop(ScenarioStats(), warm_until) for _ in range(concurrency)))
+
+    stats = ScenarioStats()
+    start = time.perf_counter()
+    await asyncio.gather(*(loop(stats, start + duration) for _ in range(concurrency)))
+    return stats, time.perf_counter() - start
+
+
+async def _run_target(
+    client: httpx.AsyncClient, scenarios: dict, args: argparse.Namespace, pids: list[int]
+) -> dict:
+    results = {}
+    for name, scenario in scenarios.items():
+        stats, elapsed = await run_scenario(
+            client, scenario, args.concurrency, args.duration, args.warmup
+        )
+        results[name] = stats.summary(elapsed)
+        results[name]["rss_mb"] = _rss_mb(pids)
+    return results
+
+
+async def run(args: argparse.Namespace) -> dict:
+    all_scenarios = _scenarios(args.prompt_words, args.api_key, args.bearer_token)
+    scenarios = {name: all_scenarios[name] for name in args.scenarios}
+    results = {}
+
+    if args.url:
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+            results[args.label] = await _run_target(
+                client, scenarios, args, _server_pids(args.pid_file)
+            )
+        return results
+
+    with ExitStack() as stack:
+        # Measure the limiters' cost without them rejecting the load
+        for name in ("RATE_LIMIT_PER_MINUTE", "RATE_LIMIT_PER_HOUR"):
+            stack.enter_context(patch.object(settings, name, 10**9))
+        stack.enter_context(patch.object(get_stream_limiter(), "max_streams", 10**9))
+        await resources.startup()
+        try:
+            for config in args.configs:
+                transport = StreamingASGITransport(build_app(CONFIGS[config]))
+                async with httpx.AsyncClient(
+                    transport=transport, base_url="http://bench", timeout=60
+                ) as client:
+                    results[config] = await _run_target(client, scenarios, args, [os.getpid()])
+        finally:
+            await resources.shutdown()
+    return results
+
+
+def _lookup(entry: dict, dotted: str) -> float | None:
+    for key in dotted.split("."):
+        if not isinstance(entry, dict) or key not in entry:
+            return None
+        entry = entry[key]
+    return entry
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Describe every check in ``REGRESSION_CHECKS`` that is worse than ``tolerance``."""
+    regressions = []
+    for config, scenarios in baseline.get("results", {}).items():
+        for scenario, base in scenarios.items():
+            current = results.get(config, {}).get(scenario)
+            if current is None:
+                continue
+            for key, higher_is_worse in REGRESSION_CHECKS:
+                old, new = _lookup(base, key), _lookup(current, key)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old
+                if (change > tolerance) if higher_is_worse else (change < -tolerance):
+                    regressions.append(f"{config}/{scenario} {key}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="Live server base URL; in-process if omitted")
+    parser.add_argument("--label", default="live", help="Results key for a live run")
+    parser.add_argument("--pid-file", default="/tmp/gunicorn.pid")
+    parser.add_argument("--configs", default=",".join(CONFIGS), type=lambda s: s.split(","))
+    parser.add_argument(
+        "--scenarios", default="chat_stream,health,auth_bearer", type=lambda s: s.split(",")
+    )
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--prompt-words", type=int, default=5)
+    parser.add_argument("--api-key", default="test-api-key-123")
+    parser.add_argument(
+        "--bearer-token",
+        default=jwt.encode({"sub": "bench-user"}, "bench", algorithm="HS256"),
+        help="Defaults to an unsigned demo token, accepted when OAUTH_JWKS_URL is unset",
+    )
+    parser.add_argument("--output", help="Write results here instead of stdout")
+    parser.add_argument("--baseline", nargs="?", const=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    unknown = [c for c in args.configs if c not in CONFIGS] + [
+        s for s in args.scenarios if s not in ("chat_stream", "health", "auth_bearer")
+    ]
+    if unknown:
+        parser.error(f"unknown config or scenario: {', '.join(unknown)}")
+
+    report = {
+        "meta": {
+            "target": args.url or "in-process",
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "prompt_words": args.prompt_words,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "timestamp": int(time.time()),
+        },
+        "results": asyncio.run(run(args)),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    baseline_path = args.baseline or DEFAULT_BASELINE
+    if args.save_baseline:
+        with open(baseline_path, "w") as f:
+            f.write(text + "\n")
+        print(f"Saved baseline to {baseline_path}", file=sys.stderr)
+    elif args.baseline:
+        with open(baseline_path) as f:
+            regressions = compare(report["results"], json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} of {baseline_path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+Hot-path micro-benchmarks with regression budgets.
+
+Each component on the request path is timed on its own:
+
+- ``get_auth_context`` with an API key and with a demo bearer token
+- ``verify_api_key_value`` for valid and unknown keys
+- ``get_rate_limit_key`` plus the per-minute and per-hour counter updates
+- ``TracingMiddleware`` around a plain ASGI app (and the bare app, for reference)
+- ``ChatRequest`` validation for small, medium and large conversations
+- SSE chunk encoding as done by ``/api/v1/chat/stream``
+
+For every benchmark three numbers are reported:
+
+- ``ns_per_op``: best of ``--rounds`` timed runs, with GC disabled like timeit
+- ``alloc_peak_bytes``: peak memory allocated while one operation runs
+  (tracemalloc, median of several operations)
+- ``retained_blocks``: memory blocks still allocated per operation after a run
+  (``sys.getallocatedblocks``); anything above zero is a cache or a leak
+
+CPython keeps no count of allocations, so transient allocation is reported as
+peak bytes rather than allocations per operation.
+
+Budgets are declared in ``budgets_micro.json``. The run fails (exit 1) when a
+measurement is above its budget by more than the tolerance: ``ns_tolerance``
+for timings, ``tolerance`` for memory. Timings vary with machine speed and
+load, so every timed round is paired with a round of a fixed reference
+workload, and each ``ns_per_op`` budget is scaled by how much slower or faster
+the reference ran next to that benchmark than when the budget was written
+(its ``reference_ns``).
+``--write-budgets`` records the current numbers, with headroom, as budgets.
+
+Usage:
+    python -m benchmarks.bench_micro [--filter NAME] [--rounds 5]
+        [--budgets FILE] [--tolerance 0.1] [--ns-tolerance 0.25] [--write-budgets]
+"""
+import argparse
+import asyncio
+import gc
+import hashlib
+import json
+import math
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from unittest.mock import patch
+
+from fastapi import HTTPException
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+
+from app.core.api_key_auth import verify_api_key_value
+from app.core.auth import get_auth_context
+from app.middleware.rate_limit import _consume, get_rate_limit_key
+from app.middleware.tracing import TracingMiddleware
+from app.models.chat import ChatRequest, ChatStreamChunk
+
+DEFAULT_BUDGETS = os.path.join(os.path.dirname(__file__), "budgets_micro.json")
+METRICS = ("ns_per_op", "alloc_peak_bytes", "retained_blocks")
+
+
+class Bench:
+    """One benchmark: ``op`` is called (or awaited if ``is_async``) once per operation."""
+
+    __slots__ = ("name", "op", "is_async")
+
+    def __init__(self, name: str, op: Callable, is_async: bool = False):
+        self.name = name
+        self.op = op
+        self.is_async = is_async
+
+    def run(self, n: int) -> float:
+        """Run ``n`` operations; returns elapsed seconds."""
+        op = self.op
+        if self.is_async:
+
+            async def loop() -> float:
+                start = time.perf_counter()
+                for _ in range(n):
+                    await op()
+                return time.perf_counter() - start
+
+            return asyncio.run(loop())
+        start = time.perf_counter()
+        for _ in range(n):
+            op()
+        return time.perf_counter() - start
+
+    def alloc_peaks(self, samples: int) -> list[int]:
+        """Peak bytes allocated by each of ``samples`` single operations."""
+        op = self.op
+        peaks = []
+        tracemalloc.start()
+        try:
+            if self.is_async:
+
+                async def loop() -> None:
+                    # One event loop for all samples, so its setup is not counted
+                    for _ in range(samples):
+                        tracemalloc.reset_peak()
+                        before = tracemalloc.get_traced_memory()[0]
+                        await op()
+                        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+
+                asyncio.run(loop())
+            else:
+                for _ in range(samples):
+                    tracemalloc.reset_peak()
+                    before = tracemalloc.get_traced_memory()[0]
+                    op()
+                    peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        finally:
+            tracemalloc.stop()
+        return peaks
+
+
+def _chat_payload(messages: int, chars: int) -> dict:
+    content = ("lorem ipsum " * (chars // 12 + 1))[:chars]
+    roles = ("user", "assistant")
+    return {
+        "messages": [{"role": roles[i % 2], "content": content} for i in range(messages)],
+    }
+
+
+def _asgi_request() -> tuple[dict, Callable, Callable]:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/bench",
+        "raw_path": b"/bench",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench")],
+        "server": ("bench", 80),
+        "client": ("127.0.0.1", 50000),
+    }
+
+    async def receive() -> dict:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict) -> None:
+        pass
+
+    return scope, receive, send
+
+
+def build_benchmarks() -> list[Bench]:
+    benches = []
+
+    api_key = "test-api-key-123"
+    bearer = "Bearer oauth_bench"
+    benches.append(Bench("get_auth_context.api_key", lambda: get_auth_context(api_key, None), True))
+    benches.append(
+        Bench("get_auth_context.bearer_demo", lambda: get_auth_context(None, bearer), True)
+    )
+
+    benches.append(Bench("verify_api_key_value.valid", lambda: verify_api_key_value(api_key)))
+
+    def verify_unknown() -> None:
+        try:
+            verify_api_key_value("not-a-key")
+        except HTTPException:
+            pass
+
+    benches.append(Bench("verify_api_key_value.unknown", verify_unknown))
+
+    scope, receive, send = _asgi_request()
+    rate_request = Request(dict(scope))
+    rate_request.state.user_id = "user1"
+
+    def rate_limit() -> None:
+        key = get_rate_limit_key(rate_request)
+        now = time.time()
+        _consume(f"{key}:minute", 10**9, 60, now)
+        _consume(f"{key}:hour", 10**9, 3600, now)
+
+    benches.append(Bench("rate_limit.key_and_update", rate_limit))
+
+    plain = PlainTextResponse("ok")
+
+    async def plain_app(scope, receive, send) -> None:
+        await plain(scope, receive, send)
+
+    traced_app = TracingMiddleware(plain_app)
+    benches.append(Bench("asgi.plain_app", lambda: plain_app(dict(scope), receive, send), True))
+    benches.append(
+        Bench("asgi.tracing_middleware", lambda: traced_app(dict(scope), receive, send), True)
+    )
+
+    for label, messages, chars in (("small", 1, 20), ("medium", 10, 200), ("large", 50, 2000)):
+        payload = _chat_payload(messages, chars)
+        benches.append(
+            Bench(f"chat_request.validate.{label}", lambda p=payload: ChatRequest.model_validate(p))
+        )
+
+    chunk = {"token": "Hello", "trace_id": "4bf92f3577b34da6a3ce929d0e0e4736", "finished": False}
+    benches.append(
+        Bench(
+            "sse_chunk.encode",
+            lambda: f"data: {ChatStreamChunk(**chunk).model_dump_json()}\n\n",
+        )
+    )
+    return benches
+
+
+def _reference_op() -> str:
+    # Fixed mix of the work the hot paths do: hashing, dict lookups, formatting
+    digest = hashlib.sha256(b"reference-key").digest()
+    counters = {"minute": 1, "hour": 2}
+    counters["minute"] = counters.get("minute", 0) + 1
+    return f"user:{digest[:4].hex()}:{counters['minute']}"
+
+
+REFERENCE = Bench("reference", _reference_op)
+
+
+def _calibrate(bench: Bench, min_time: float) -> int:
+    """Smallest 1/2/5 x 10^k operation count whose run takes ``min_time``."""
+    n = 1
+    while True:
+        for factor in (1, 2, 5):
+            if bench.run(n * factor) >= min_time:
+                return n * factor
+        n *= 10
+
+
+def _best_ns(bench: Bench, n: int, rounds: int) -> float:
+    """Best time per operation of ``rounds`` runs of ``n`` operations, GC disabled."""
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return min(bench.run(n) for _ in range(rounds)) / n * 1e9
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def measure(bench: Bench, rounds: int, min_time: float, reference_n: int | None = None) -> dict:
+    """
+    Time ``bench`` and measure its allocations.
+
+    With ``reference_n``, each timed round is paired with a round of the
+    reference workload run right before it, so both see the same machine
+    state; ``reference_ns`` is the reference's best time in those rounds.
+    """
+    n = _calibrate(bench, min_time)
+    best = reference = math.inf
+    for _ in range(rounds):
+        if reference_n is not None:
+            reference = min(reference, _best_ns(REFERENCE, reference_n, 1))
+        best = min(best, _best_ns(bench, n, 1))
+
+    peaks = bench.alloc_peaks(7)
+
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    bench.run(n)
+    gc.collect()
+    retained = (sys.getallocatedblocks() - blocks) / n
+
+    result = {
+        "ns_per_op": round(best, 1),
+        "alloc_peak_bytes": int(statistics.median(peaks)),
+        "retained_blocks": round(max(retained, 0.0), 3),
+        "ops": n,
+    }
+    if reference_n is not None:
+        result["reference_ns"] = round(reference, 1)
+    return result
+
+
+def check_budgets(
+    results: dict,
+    budgets: dict,
+    tolerance: float,
+    ns_tolerance: float | None = None,
+) -> list[str]:
+    """
+    Describe every measurement above its budget by more than the tolerance.
+
+    ``ns_per_op`` budgets use ``ns_tolerance`` and, when both the result and
+    the budget carry a ``reference_ns``, are multiplied by their ratio; memory
+    metrics use ``tolerance``.
+    """
+    if ns_tolerance is None:
+        ns_tolerance = tolerance
+    failures = []
+    for name, budget in budgets.items():
+        result = results.get(name)
+        if result is None:
+            continue
+        speed = 1.0
+        if result.get("reference_ns") and budget.get("reference_ns"):
+            speed = result["reference_ns"] / budget["reference_ns"]
+        for metric in METRICS:
+            if metric not in budget:
+                continue
+            limit, allowed = budget[metric], tolerance
+            if metric == "ns_per_op":
+                limit, allowed = round(limit * speed, 1), ns_tolerance
+            if result[metric] > limit * (1 + allowed):
+                failures.append(
+                    f"{name} {metric}: {result[metric]} over budget {limit} "
+                    f"(+{allowed:.0%} allowed)"
+                )
+    return failures
+
+
+def _budget_from(result: dict) -> dict:
+    # Headroom for machine-to-machine variance in timings
+    budget = {
+        "ns_per_op": math.ceil(result["ns_per_op"] * 1.5 / 100) * 100,
+        "alloc_peak_bytes": math.ceil(result["alloc_peak_bytes"] * 1.25 / 64) * 64,
+        "retained_blocks": max(0.5, round(result["retained_blocks"] * 1.5, 2)),
+    }
+    if "reference_ns" in result:
+        budget["reference_ns"] = result["reference_ns"]
+    return budget
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--filter", default="", help="Only run benchmarks containing this")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timed round")
+    parser.add_argument("--budgets", default=DEFAULT_BUDGETS)
+    parser.add_argument("--tolerance", type=float, help="Overrides the budgets file")
+    parser.add_argument("--ns-tolerance", type=float, help="Overrides the budgets file")
+    parser.add_argument("--write-budgets", action="store_true")
+    args = parser.parse_args()
+
+    results = {}
+    # A reference round takes a tenth of a benchmark round
+    reference_n = _calibrate(REFERENCE, args.min_time / 10)
+    # Demo bearer tokens are only accepted without a configured provider
+    with patch("app.core.oauth.settings.OAUTH_JWKS_URL", None), patch(
+        "app.core.oauth.settings.OAUTH_INTROSPECTION_URL", None
+    ):
+        for bench in build_benchmarks():
+            if args.filter in bench.name:
+                results[bench.name] = measure(bench, args.rounds, args.min_time, reference_n)
+                print(f"{bench.name}: {results[bench.name]}", file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+    if args.write_budgets:
+        budgets = {"tolerance": args.tolerance or 0.1, "benchmarks": {}}
+        if os.path.exists(args.budgets):
+            with open(args.budgets) as f:
+                budgets = json.load(f)
+        budgets["ns_tolerance"] = args.ns_tolerance or budgets.get("ns_tolerance", 0.25)
+        budgets["benchmarks"].update({name: _budget_from(r) for name, r in results.items()})
+        with open(args.budgets, "w") as f:
+            f.write(json.dumps(budgets, indent=2) + "\n")
+        print(f"Wrote budgets to {args.budgets}", file=sys.stderr)
+        return
+
+    with open(args.budgets) as f:
+        budgets = json.load(f)
+    tolerance = args.tolerance if args.tolerance is not None else budgets.get("tolerance", 0.1)
+    ns_tolerance = (
+        args.ns_tolerance if args.ns_tolerance is not None else budgets.get("ns_tolerance", 0.25)
+    )
+    failures = check_budgets(results, budgets["benchmarks"], tolerance, ns_tolerance)
+    for line in failures:
+        print(f"OVER BUDGET {line}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+    print(
+        f"All benchmarks within budget (+{ns_tolerance:.0%} time, +{tolerance:.0%} memory)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
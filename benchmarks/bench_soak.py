@@ -0,0 +1,235 @@
+"""
+Memory soak test for a long-running worker.
+
+Drives the full app in-process (through the streaming ASGI transport of
+``bench_load``) with a mix that stresses per-client state:
+
+- anonymous requests, each from a new client address, so every one creates
+  fresh rate-limit windows
+- authenticated chat streams abandoned after the first event (client
+  disconnect mid-stream)
+- a few authenticated streams read to the end
+
+Rate-limit windows are driven by a simulated clock that advances
+``--seconds-per-request`` per request, so a run of a million requests covers
+hours of window expiry in minutes.
+
+The first ``--warmup`` fraction of the run fills caches and windows. After it,
+RSS and the size of the rate-limit storage are sampled at intervals, and a
+tracemalloc snapshot taken at the start of the steady state is compared with
+one at the end to list the allocation sites that grew most. The run fails
+(exit 1) if RSS grows by more than ``--max-growth-mb`` during the steady state.
+
+Usage:
+    python -m benchmarks.bench_soak [--requests 1000000] [--concurrency 50]
+        [--warmup 0.5] [--max-growth-mb 16] [--no-tracemalloc] [--output FILE]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import ExitStack
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import httpx
+
+from app.core.config import settings
+from app.core.resources import resources
+from app.core.stream_limiter import get_stream_limiter
+from app.main import app
+from app.middleware import rate_limit
+from benchmarks.bench_load import StreamingASGITransport, _rss_mb
+
+API_KEY = "test-api-key-123"
+SHORT_CHAT = {"messages": [{"role": "user", "content": "hello"}]}
+LONG_CHAT = {"messages": [{"role": "user", "content": " ".join(["word"] * 50)}]}
+
+
+class SimulatedClock:
+    """Wall clock for the rate limiter that advances a fixed step per request."""
+
+    def __init__(self, step: float):
+        self.start = time.time()
+        self.step = step
+        self.requests = 0
+
+    def time(self) -> float:
+        return self.start + self.requests * self.step
+
+
+def _client_address(n: int) -> tuple[str, int]:
+    return f"10.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}", 40000 + n % 20000
+
+
+async def _anonymous(client: httpx.AsyncClient, n: int) -> None:
+    await client.post(
+        "/api/v1/chat/stream", json=SHORT_CHAT, extensions={"client": _client_address(n)}
+    )
+
+
+async def _abandoned_stream(client: httpx.AsyncClient, n: int) -> None:
+    async with client.stream(
+        "POST", "/api/v1/chat/stream", json=LONG_CHAT, headers={"X-API-Key": API_KEY}
+    ) as response:
+        async for _ in response.aiter_raw():
+            break
+
+
+async def _completed_stream(client: httpx.AsyncClient, n: int) -> None:
+    async with client.stream(
+        "POST", "/api/v1/chat/stream", json=SHORT_CHAT, headers={"X-API-Key": API_KEY}
+    ) as response:
+        async for _ in response.aiter_raw():
+            pass
+
+
+def _request_kind(n: int):
+    if n % 100 == 0:
+        return _completed_stream
+    if n % 4 == 0:
+        return _abandoned_stream
+    return _anonymous
+
+
+def _top_growth(start: tracemalloc.Snapshot, end: tracemalloc.Snapshot, limit: int) -> list:
+    filters = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, __file__),
+    )
+    stats = end.filter_traces(filters).compare_to(start.filter_traces(filters), "lineno")
+    return [
+        {
+            "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_diff_kb": round(stat.size_diff / 1024, 1),
+            "count_diff": stat.count_diff,
+        }
+        for stat in stats[:limit]
+        if stat.size_diff > 0
+    ]
+
+
+def _slope(points: list[tuple[int, float]]) -> float:
+    """Least-squares slope of (requests, MB) samples, in MB per 100k requests."""
+    if len(points) < 2:
+        return 0.0
+    xs, ys = zip(*points, strict=True)
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    var = sum((x - mean_x) ** 2 for x in xs)
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys, strict=True))
+    return cov / var * 100000 if var else 0.0
+
+
+async def soak(args: argparse.Namespace, clock: SimulatedClock) -> dict:
+    counter = itertools.count()
+    warmup_end = int(args.requests * args.warmup)
+    sample_every = max(1, (args.requests - warmup_end) // args.samples)
+    samples: list[dict] = []
+    snapshots: dict[str, tracemalloc.Snapshot] = {}
+    errors = 0
+
+    def sample(n: int) -> None:
+        if args.tracemalloc and "start" not in snapshots:
+            # Before reading RSS: the snapshot itself stays in memory
+            snapshots["start"] = tracemalloc.take_snapshot()
+        samples.append(
+            {
+                "requests": n,
+                "rss_mb": _rss_mb([os.getpid()]),
+                "rate_limit_keys": len(rate_limit.limiter.storage),
+                "open_stream_keys": len(get_stream_limiter()._open),
+            }
+        )
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        nonlocal errors
+        while (n := next(counter)) < args.requests:
+            clock.requests = n
+            try:
+                await _request_kind(n)(client, n)
+            except httpx.HTTPError:
+                errors += 1
+            if n >= warmup_end and (n - warmup_end) % sample_every == 0:
+                sample(n)
+
+    transport = StreamingASGITransport(app)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(transport=transport, base_url="http://soak", timeout=30) as client:
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    sample(args.requests)
+
+    steady = [(s["requests"], s["rss_mb"]) for s in samples if s["rss_mb"] is not None]
+    growth = round(steady[-1][1] - steady[0][1], 1) if steady else None
+    report = {
+        "requests": args.requests,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 1),
+        "requests_per_sec": round(args.requests / elapsed),
+        "simulated_hours": round(args.requests * args.seconds_per_request / 3600, 2),
+        "steady_rss_growth_mb": growth,
+        "steady_rss_slope_mb_per_100k": round(_slope(steady), 3),
+        "samples": samples,
+    }
+    if args.tracemalloc:
+        report["top_growth"] = _top_growth(
+            snapshots["start"], tracemalloc.take_snapshot(), args.top
+        )
+    return report
+
+
+async def run(args: argparse.Namespace) -> dict:
+    clock = SimulatedClock(args.seconds_per_request)
+    with ExitStack() as stack:
+        stack.enter_context(patch.object(rate_limit, "time", SimpleNamespace(time=clock.time)))
+        stack.enter_context(patch.object(settings, "RATE_LIMIT_PER_MINUTE", 10**9))
+        stack.enter_context(patch.object(settings, "RATE_LIMIT_PER_HOUR", 10**9))
+        stack.enter_context(patch.object(get_stream_limiter(), "max_streams", 10**9))
+        if args.tracemalloc:
+            tracemalloc.start(1)
+            stack.callback(tracemalloc.stop)
+        await resources.startup()
+        try:
+            return await soak(args, clock)
+        finally:
+            await resources.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=1_000_000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--warmup", type=float, default=0.5, help="Fraction of the run")
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--seconds-per-request", type=float, default=0.01)
+    parser.add_argument("--max-growth-mb", type=float, default=16.0)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false")
+    parser.add_argument("--output", help="Write the report here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    growth = report["steady_rss_growth_mb"]
+    if growth is not None and growth > args.max_growth_mb:
+        print(
+            f"FAIL steady-state RSS grew {growth} MB (limit {args.max_growth_mb} MB)",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    print(f"Steady-state RSS growth {growth} MB (limit {args.max_growth_mb} MB)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
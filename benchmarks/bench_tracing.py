@@ -0,0 +1,119 @@
+"""
+Per-request overhead of tracing.
+
+Drives a minimal app in-process through the ASGI transport and compares
+requests per second of the previous uuid4 ``X-Trace-Id`` middleware against
+``TracingMiddleware`` with head sampling off (IDs and spans created, then
+dropped) and fully on (every span recorded into the ring buffer). Both are
+``BaseHTTPMiddleware`` subclasses, so the difference is the cost of tracing
+itself. Spans are not exported; the numbers cover the request path only.
+
+End-to-end rates are noisy on shared machines, so the per-request cost of the
+tracing calls alone is also reported (``tracing_us_per_request``).
+
+Usage:
+    python -m benchmarks.bench_tracing [--requests 5000] [--rounds 3]
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from unittest.mock import patch
+
+import httpx
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core import tracing
+from app.middleware.tracing import TracingMiddleware
+
+
+class _TraceIdMiddleware(BaseHTTPMiddleware):
+    """The middleware before W3C tracing: a uuid4 echoed as X-Trace-Id."""
+
+    async def dispatch(self, request: Request, call_next):
+        trace_id = request.headers.get("X-Trace-Id") or str(uuid.uuid4())
+        response = await call_next(request)
+        response.headers["X-Trace-Id"] = trace_id
+        return response
+
+
+def _make_app(middleware: type[BaseHTTPMiddleware]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping() -> dict:
+        return {"ok": True}
+
+    app.add_middleware(middleware)
+    return app
+
+
+async def _measure(app: FastAPI, n_requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(100):
+            await client.get("/ping")
+        start = time.perf_counter()
+        for _ in range(n_requests):
+            await client.get("/ping")
+        return n_requests / (time.perf_counter() - start)
+
+
+def _tracing_cost_us(n: int = 100000) -> float:
+    """Microseconds for the trace/span work the middleware does per request."""
+    start = time.perf_counter()
+    for _ in range(n):
+        trace = tracing.start_trace(None, None, None)
+        root = tracing.start_span("http.request", activate=True, method="GET", path="/ping")
+        root.set_attribute("status_code", 200)
+        tracing.format_traceparent(trace.trace_id, root.span_id, trace.sampled)
+        root.end()
+        trace.finish(1.0)
+    elapsed = time.perf_counter() - start
+    tracing.span_recorder.drain(tracing.span_recorder.capacity)
+    return elapsed / n * 1e6
+
+
+async def run(n_requests: int, rounds: int) -> dict:
+    configs = {
+        "trace_id_only": (_TraceIdMiddleware, None),
+        "traced_unsampled": (TracingMiddleware, 0.0),
+        "traced_sampled": (TracingMiddleware, 1.0),
+    }
+    best = dict.fromkeys(configs, 0.0)
+    # Interleave rounds and keep the best of each so drift hits all configs alike
+    for _ in range(rounds):
+        for label, (middleware, ratio) in configs.items():
+            with patch.object(tracing.settings, "TRACE_SAMPLE_RATIO", ratio or 0.0):
+                rate = await _measure(_make_app(middleware), n_requests)
+            tracing.span_recorder.drain(tracing.span_recorder.capacity)
+            best[label] = max(best[label], rate)
+
+    baseline = best["trace_id_only"]
+    results = {
+        label: {
+            "requests_per_sec": round(rate),
+            "overhead_pct": round((baseline / rate - 1) * 100, 1),
+        }
+        for label, rate in best.items()
+    }
+    for label, ratio in (("traced_unsampled", 0.0), ("traced_sampled", 1.0)):
+        with patch.object(tracing.settings, "TRACE_SAMPLE_RATIO", ratio):
+            cost = _tracing_cost_us()
+        results[label]["tracing_us_per_request"] = round(cost, 2)
+        results[label]["tracing_pct_of_request"] = round(cost * baseline / 1e4, 2)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.requests, args.rounds)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 """
 Gunicorn configuration for production deployment.
 """
+import gc
+import glob
 import multiprocessing
 import os
+import sys
 
 # Server socket
 bind = os.getenv("GUNICORN_BIND", "127.0.0.1:8000")
@@ -10,13 +13,18 @@ backlog = int(os.getenv("GUNICORN_BACKLOG", "2048"))
 
 # Worker processes
 workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
-worker_class = "uvicorn.workers.UvicornWorker"
+# UvicornWorker that drains chat streams before exiting (app.core.drain)
+worker_class = "app.workers.DrainingUvicornWorker"
 worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
 timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
 keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
 
 # Logging
-accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")  # stdout
+# Access logs are written by the app as JSON lines from a background thread
+# (ACCESS_LOG_TARGET, stdout by default). Set GUNICORN_ACCESS_LOG to also get
+# gunicorn's synchronous plain-text access log.
+os.environ.setdefault("ACCESS_LOG_TARGET", "-")
+accesslog = os.getenv("GUNICORN_ACCESS_LOG")
 errorlog = os.getenv("GUNICORN_ERROR_LOG", "-")  # stderr
 loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
 access_log_format = (
@@ -43,6 +51,15 @@ tmp_upload_dir = None
 max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
 max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "50"))
 preload_app = os.getenv("GUNICORN_PRELOAD_APP", "True").lower() == "true"
+# Copy-on-write sharing: the preloading master keeps the GC off while it
+# imports and warms the app, then freezes the heap (when_ready) so the first
+# collection in each worker does not touch, and so copy, every inherited
+# object. Measure with `make bench-fork-memory`.
+freeze_gc = preload_app and os.getenv("GUNICORN_GC_FREEZE", "True").lower() == "true"
+# Only before the first import of the app: this file runs again on every
+# SIGHUP reload, and when_ready (which turns the GC back on) does not.
+if freeze_gc and "app.main" not in sys.modules:
+    gc.disable()
 
 # Security
 limit_request_line = int(os.getenv("GUNICORN_LIMIT_REQUEST_LINE", "4094"))
@@ -51,13 +68,62 @@ limit_request_field_size = int(os.getenv("GUNICORN_LIMIT_REQUEST_FIELD_SIZE", "8
 
 # Graceful timeout for worker restart
 graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+# A recycled worker gives its SSE streams this long to finish, then ends them
+# with a resumable event (app.core.drain); the rest of graceful_timeout is
+# left for the lifespan shutdown that flushes transcripts and usage.
+os.environ.setdefault("DRAIN_TIMEOUT", str(max(graceful_timeout - 5, 1)))
 
 # StatsD (optional, for monitoring)
 # statsd_host = "127.0.0.1:8125"
 # statsd_prefix = "gunicorn"
 
+# Prometheus: workers write metrics to mmap files here, aggregated on scrape.
+# Set up before the app (and prometheus_client) is imported by preload_app.
+metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/fastapi-llm-metrics")
+os.makedirs(metrics_dir, exist_ok=True)
+
+
+def on_starting(server):
+    """Called just before the master process is initialized."""
+    # Files from a previous run are removed here, once: this config file is
+    # executed again on every SIGHUP reload, when the files belong to live
+    # workers. A master re-executed by USR2 (GUNICORN_FD set) shares the
+    # directory with the old master's workers, and the files this master
+    # created while preloading the app are its own.
+    if "GUNICORN_FD" in os.environ:
+        return
+    own_suffix = f"_{os.getpid()}.db"
+    for stale_file in glob.glob(os.path.join(metrics_dir, "*.db")):
+        if not stale_file.endswith(own_suffix):
+            os.remove(stale_file)
+
+
 def when_ready(server):
     """Called just after the server is started."""
+    from app.core.config import settings
+    from app.core.database import is_process_local
+
+    if server.cfg.preload_app and settings.WARMUP_ENABLED:
+        # The app is already imported here; warm it once so forked workers inherit
+        # the schema, validators and imports instead of each building their own
+        from app.core.warmup import warm_app
+        from app.main import app
+
+        stats = warm_app(app)
+        server.log.info("Warmed app in master: %s", stats)
+    if (
+        server.cfg.workers > 1
+        and settings.USAGE_LEDGER_ENABLED
+        and is_process_local(settings.DATABASE_URL)
+    ):
+        server.log.warning(
+            "DATABASE_URL is in-memory SQLite: each worker keeps its own usage ledger "
+            "and /api/v1/admin/usage reports only the worker that answers"
+        )
+    if freeze_gc:
+        from app.core.warmup import freeze_for_fork
+
+        server.log.info("Froze master heap for workers: %s", freeze_for_fork())
     server.log.info("Server is ready. Spawning workers")
 
 
@@ -68,16 +134,32 @@ def on_exit(server):
 
 def worker_int(worker):
     """Called when a worker receives INT or QUIT signal."""
-    worker.log.info("worker received INT or QUIT signal")
+    from app.core.drain import drain_controller
+
+    # The uvicorn worker also logs this summary from the app when its drain ends
+    worker.log.info(
+        "worker received INT or QUIT signal; streams: %s", drain_controller.summary()
+    )
 
 
 def pre_fork(server, worker):
     """Called just before a worker is forked."""
-    pass
+    from app.core.config import settings
+
+    if freeze_gc:
+        # Also share what the master allocated since the last fork
+        gc.freeze()
+    if settings.RATE_LIMIT_SHARED_MEMORY or settings.STREAM_CONCURRENCY_SHARED:
+        # Created once in the master; every forked worker inherits the mapping
+        from app.core.shm_counters import init_shared_counters
+
+        init_shared_counters(settings.RATE_LIMIT_SHARED_SLOTS)
 
 
 def post_fork(server, worker):
     """Called just after a worker has been forked."""
+    # Frozen objects stay shared; the worker's own garbage must be collected
+    gc.enable()
     server.log.info("Worker spawned (pid: %s)", worker.pid)
 
 
@@ -86,6 +168,17 @@ def pre_exec(server):
     server.log.info("Forking new master process")
 
 
+def child_exit(server, worker):
+    """Called in the master just after a worker has exited."""
+    from app.core.prometheus import archive_dead_worker
+
+    # Workers recycled by max_requests would otherwise leave files behind
+    archive_dead_worker(worker.pid)
+
+
 def worker_abort(worker):
     """Called when a worker times out."""
-    worker.log.info("worker timeout")
+    from app.core.drain import drain_controller
+
+    # Streams still active here are cut without the final drain event
+    worker.log.info("worker timeout; streams: %s", drain_controller.summary())
@@ -6,14 +6,16 @@ import json
 import sys
 from pathlib import Path
 
+from app.api.docs import get_documents
 from app.main import app
 
 
 def validate_openapi_schema():
     """Validate that OpenAPI schema is generated correctly."""
     try:
-        # Generate OpenAPI schema
-        schema = app.openapi()
+        # The pre-serialized schema, exactly as /openapi.json serves it
+        document = get_documents(app)["openapi"]
+        schema = json.loads(document.body)
 
         # Basic validation
         assert "openapi" in schema, "Missing 'openapi' field"
@@ -62,6 +64,8 @@ def validate_openapi_schema():
         print(f"   - Version: {schema['info']['version']}")
         print(f"   - Paths: {len(schema['paths'])}")
         print(f"   - Schemas: {len(schemas)}")
+        print(f"   - Size: {len(document.body)} bytes ({len(document.gzip_body)} gzipped)")
+        print(f"   - ETag: {document.etag}")
 
         # Save schema for inspection
         output_file = Path("openapi_schema.json")
@@ -0,0 +1,156 @@
+"""
+Unit tests for the background JSON access log.
+"""
+import json
+import socket
+import threading
+
+import pytest
+
+from app.core.access_log import FIELDS, AccessLog, access_log, open_sink
+
+
+class MemorySink:
+    def __init__(self):
+        self.lines: list[bytes] = []
+        self.closed = False
+
+    def write(self, lines: list[bytes]) -> None:
+        self.lines.extend(lines)
+
+    def close(self) -> None:
+        self.closed = True
+
+    def records(self) -> list[dict]:
+        return [json.loads(line) for line in self.lines]
+
+
+class FailingSink(MemorySink):
+    def write(self, lines: list[bytes]) -> None:
+        raise ConnectionRefusedError
+
+
+def _entry(n: int) -> tuple:
+    return (n,) + (None,) * (len(FIELDS) - 1)
+
+
+class TestAccessLog:
+    """Test cases for the queue, writer thread and overflow policies."""
+
+    def test_records_written_as_json_lines(self, tmp_path):
+        """Test that records reach a file sink as one JSON object per line."""
+        path = tmp_path / "access.log"
+        log = AccessLog(flush_interval=0.01)
+        log.start(open_sink(str(path)))
+        log.record((1.5, "GET", "/api/v1/health", 200, 0.4, 17) + (None,) * 7)
+        log.stop()
+
+        (line,) = path.read_text().splitlines()
+        record = json.loads(line)
+        assert list(record) == list(FIELDS)
+        assert record["path"] == "/api/v1/health"
+        assert record["bytes"] == 17
+        assert log.written == 1
+
+    def test_record_noop_until_started(self):
+        """Test that nothing is queued while the writer is not running."""
+        log = AccessLog()
+        log.record(_entry(1))
+
+        assert len(log._queue) == 0
+
+    @pytest.mark.parametrize(
+        "overflow, kept",
+        [("drop_new", [0, 1, 2]), ("drop_old", [2, 3, 4])],
+    )
+    def test_overflow_policy(self, overflow, kept):
+        """Test that a full queue drops new or old records without blocking."""
+        sink = MemorySink()
+        log = AccessLog(maxsize=3, batch_size=100, flush_interval=60, overflow=overflow)
+        log.start(sink)
+        for n in range(5):
+            log.record(_entry(n))
+        log.stop()
+
+        assert log.dropped == 2
+        assert [record["ts"] for record in sink.records()] == kept
+        assert sink.closed
+
+    def test_unknown_overflow_policy_rejected(self):
+        """Test that only known overflow policies are accepted."""
+        with pytest.raises(ValueError):
+            AccessLog(overflow="block")
+
+    def test_sink_errors_counted(self):
+        """Test that write errors drop the batch instead of raising."""
+        log = AccessLog(flush_interval=60)
+        log.start(FailingSink())
+        log.record(_entry(1))
+        log.stop()
+
+        assert log.failed == 1
+        assert log.written == 0
+
+    def test_tcp_sink(self):
+        """Test that a tcp:// target receives newline-delimited JSON."""
+        server = socket.create_server(("127.0.0.1", 0))
+        port = server.getsockname()[1]
+        received = []
+
+        def accept():
+            conn, _ = server.accept()
+            with conn:
+                while data := conn.recv(65536):
+                    received.append(data)
+
+        reader = threading.Thread(target=accept)
+        reader.start()
+        log = AccessLog(flush_interval=60)
+        log.start(open_sink(f"tcp://127.0.0.1:{port}"))
+        log.record(_entry(1))
+        log.record(_entry(2))
+        log.stop()
+        reader.join(timeout=5)
+        server.close()
+
+        lines = b"".join(received).splitlines()
+        assert [json.loads(line)["ts"] for line in lines] == [1, 2]
+
+
+class TestAccessLogMiddleware:
+    """Test cases for the records produced by requests."""
+
+    @pytest.fixture
+    def sink(self):
+        sink = MemorySink()
+        access_log.start(sink)
+        yield sink
+        access_log.stop()
+
+    def test_stream_record(self, client, sink, mock_api_key, mock_chat_request):
+        """Test that a chat stream is logged with user, rate limit, TTFT and tokens."""
+        response = client.post(
+            "/api/v1/chat/stream", headers={"X-API-Key": mock_api_key}, json=mock_chat_request
+        )
+        access_log.stop()
+
+        (record,) = [r for r in sink.records() if r["path"] == "/api/v1/chat/stream"]
+        assert record["status"] == 200
+        assert record["trace_id"] == response.headers["X-Trace-Id"]
+        assert record["user_id"] == "user1"
+        assert record["auth_method"] == "api_key"
+        assert record["rate_limit"] == "allowed"
+        assert record["tokens"] > 0
+        assert record["ttft_ms"] > 0
+        assert record["bytes"] == len(response.content)
+
+    def test_plain_record(self, client, sink):
+        """Test that non-streaming responses are logged with their size."""
+        response = client.get("/api/v1/ready")
+        access_log.stop()
+
+        (record,) = sink.records()
+        assert record["method"] == "GET"
+        assert record["bytes"] == len(response.content)
+        assert record["user_id"] is None
+        assert record["tokens"] is None
@@ -0,0 +1,279 @@
+"""
+Unit tests for the pooled async database layer.
+"""
+import asyncio
+import sqlite3
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.core.database import (
+    ConnectionPool,
+    DatabaseSession,
+    PoolTimeout,
+    Statement,
+    _driver_for,
+    _sqlite_sql,
+    get_db,
+    is_process_local,
+)
+
+
+def _pool(**kwargs) -> ConnectionPool:
+    return ConnectionPool("sqlite:///:memory:", **kwargs)
+
+
+class TestConnectionPool:
+    """Test cases for pool sizing, reuse and health checks."""
+
+    @pytest.mark.asyncio
+    async def test_open_creates_min_size_connections(self):
+        """Test that open() connects min_size connections ahead of use."""
+        pool = _pool(min_size=2)
+        await pool.open()
+
+        assert pool.stats()["idle"] == 2
+        await pool.close()
+        assert pool.stats()["size"] == 0
+
+    @pytest.mark.asyncio
+    async def test_connections_reused(self):
+        """Test that a released connection is handed out again."""
+        pool = _pool()
+        async with pool.connection() as first:
+            pass
+        async with pool.connection() as second:
+            pass
+
+        assert first is second
+        assert pool.stats()["size"] == 1
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_acquire_times_out_at_max_size(self):
+        """Test that acquiring beyond max_size raises PoolTimeout."""
+        pool = _pool(max_size=1, acquire_timeout=0.05)
+        conn = await pool.acquire()
+
+        with pytest.raises(PoolTimeout):
+            await pool.acquire()
+        await pool.release(conn)
+        assert pool.stats()["in_use"] == 0
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_waiter_gets_released_connection(self):
+        """Test that a waiting acquire is served when a connection is released."""
+        pool = _pool(max_size=1)
+        conn = await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+
+        await pool.release(conn)
+        assert await waiter is conn
+        await pool.release(conn)
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_closed_connection_replaced(self):
+        """Test that a connection closed while idle is replaced on acquire."""
+        pool = _pool()
+        async with pool.connection() as conn:
+            pass
+        await pool.driver.close(conn.raw)
+
+        async with pool.connection() as fresh:
+            assert fresh is not conn
+        assert pool.stats()["replaced"] == 1
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_stale_connection_pinged(self):
+        """Test that a long-idle connection is pinged and kept when healthy."""
+        pool = _pool(health_check_after=10)
+        async with pool.connection() as conn:
+            pass
+        conn.released_at = time.monotonic() - 60
+
+        async with pool.connection() as again:
+            assert again is conn
+        assert pool.stats()["replaced"] == 0
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_memory_databases_shared_within_pool_only(self):
+        """Test that pooled connections share one in-memory database per pool."""
+        pool, other = _pool(), _pool()
+        session = DatabaseSession(pool)
+        await session.execute("CREATE TABLE t (x INTEGER)")
+        await session.execute("INSERT INTO t VALUES ($1)", 7)
+
+        async with pool.connection():
+            # The session holds one connection, so this query opens a second
+            peer = DatabaseSession(pool)
+            assert await peer.fetchval("SELECT x FROM t") == 7
+            await peer.close()
+        await session.close()
+
+        stranger = DatabaseSession(other)
+        with pytest.raises(sqlite3.OperationalError, match="no such table: t"):
+            await stranger.fetch("SELECT x FROM t")
+        await stranger.close()
+        await pool.close()
+        await other.close()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_writers_serialised(self):
+        """Test that concurrent transactions and writes on one in-memory database all succeed."""
+        pool = _pool(max_size=5)
+        setup = DatabaseSession(pool)
+        await setup.execute("CREATE TABLE t (x INTEGER)")
+        await setup.close()
+
+        async def write_transaction(i: int) -> None:
+            session = DatabaseSession(pool)
+            try:
+                async with session.transaction():
+                    await session.execute("INSERT INTO t VALUES ($1)", i)
+                    await asyncio.sleep(0)
+                    await session.executemany("INSERT INTO t VALUES ($1)", [(i,), (i,)])
+            finally:
+                await session.close()
+
+        async def write_and_read(i: int) -> int:
+            session = DatabaseSession(pool)
+            try:
+                await session.execute("INSERT INTO t VALUES ($1)", i)
+                return await session.fetchval("SELECT COUNT(*) FROM t")
+            finally:
+                await session.close()
+
+        await asyncio.gather(
+            *(write_transaction(i) for i in range(10)), *(write_and_read(i) for i in range(10))
+        )
+
+        session = DatabaseSession(pool)
+        assert await session.fetchval("SELECT COUNT(*) FROM t") == 40
+        await session.close()
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_failed_transaction_frees_other_writers(self):
+        """Test that a rolled-back transaction lets other sessions write again."""
+        pool = _pool(max_size=2)
+        session = DatabaseSession(pool)
+        await session.execute("CREATE TABLE t (x INTEGER)")
+        with pytest.raises(sqlite3.OperationalError, match="no such table: missing"):
+            async with session.transaction():
+                await session.execute("INSERT INTO t VALUES ($1)", 1)
+                await session.execute("INSERT INTO missing VALUES ($1)", 1)
+
+        other = DatabaseSession(pool)
+        await asyncio.wait_for(other.execute("INSERT INTO t VALUES ($1)", 2), 1)
+        assert await other.fetchval("SELECT COUNT(*) FROM t") == 1
+        await other.close()
+        await session.close()
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_check(self):
+        """Test that the readiness check runs SELECT 1 on a pooled connection."""
+        pool = _pool()
+
+        await pool.check()
+        assert pool.stats() == {
+            "size": 1,
+            "idle": 1,
+            "in_use": 0,
+            "max_size": 10,
+            "replaced": 0,
+        }
+        await pool.close()
+
+    def test_unsupported_scheme_rejected(self):
+        """Test that unknown DATABASE_URL schemes fail fast."""
+        with pytest.raises(ValueError):
+            _driver_for("mysql://localhost/app")
+
+    def test_process_local_urls(self):
+        """Test that only in-memory SQLite counts as a per-worker database."""
+        assert is_process_local("sqlite:///:memory:")
+        assert is_process_local("sqlite://")
+        assert not is_process_local("sqlite:///data/app.db")
+        assert not is_process_local("postgresql://db/app")
+
+
+class TestDatabaseSession:
+    """Test cases for request-scoped sessions."""
+
+    @pytest.mark.asyncio
+    async def test_connection_acquired_lazily(self):
+        """Test that a session holds no connection until it queries."""
+        pool = _pool()
+        session = DatabaseSession(pool)
+        assert not session.active
+        assert pool.stats()["size"] == 0
+
+        assert await session.fetchval("SELECT $1 + $2", 2, 3) == 5
+        assert session.active
+        assert pool.stats()["in_use"] == 1
+
+        await session.close()
+        assert not session.active
+        assert pool.stats()["in_use"] == 0
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_get_db_without_queries_never_touches_pool(self):
+        """Test that the get_db dependency is free for routes that do not query."""
+        pool = _pool()
+
+        with patch("app.core.database.get_pool", return_value=pool):
+            dependency = get_db()
+            session = await dependency.__anext__()
+            with pytest.raises(StopAsyncIteration):
+                await dependency.__anext__()
+
+        assert not session.active
+        assert pool.stats()["size"] == 0
+
+    @pytest.mark.asyncio
+    async def test_transaction_rolls_back_on_error(self):
+        """Test that an exception inside transaction() discards its writes."""
+        pool = _pool()
+        session = DatabaseSession(pool)
+        await session.execute("CREATE TABLE t (x INTEGER)")
+
+        with pytest.raises(RuntimeError):
+            async with session.transaction():
+                await session.execute("INSERT INTO t VALUES ($1)", 1)
+                raise RuntimeError("boom")
+        async with session.transaction():
+            await session.executemany("INSERT INTO t VALUES ($1)", [(2,), (3,)])
+
+        assert [row[0] for row in await session.fetch("SELECT x FROM t ORDER BY x")] == [2, 3]
+        assert await session.fetchrow("SELECT x FROM t WHERE x = $1", 9) is None
+        await session.close()
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_statement_objects_accepted(self):
+        """Test that declared statements run through the session like plain SQL."""
+        pool = _pool()
+        session = DatabaseSession(pool)
+        square = Statement("SELECT $1 * $1")
+        try:
+            assert await session.fetchval(square, 4) == 16
+        finally:
+            Statement.registry.remove(square)
+            await session.close()
+            await pool.close()
+
+
+class TestPlaceholders:
+    """Test cases for translating Postgres placeholders to SQLite."""
+
+    def test_numbered_placeholders_translated(self):
+        """Test that $n becomes ?n so argument order is preserved."""
+        assert _sqlite_sql("SELECT $2, $1, $10") == "SELECT ?2, ?1, ?10"
@@ -0,0 +1,99 @@
+"""
+Unit tests for the pre-built OpenAPI schema and documentation pages.
+"""
+import gzip
+import json
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.docs import get_documents, router
+
+
+@pytest.fixture
+def docs_client():
+    app = FastAPI(title="Docs Test", openapi_url=None, docs_url=None, redoc_url=None)
+
+    @app.get("/items")
+    async def items() -> list[str]:
+        return []
+
+    app.include_router(router)
+    return TestClient(app)
+
+
+class TestStaticDocs:
+    """Test cases for /openapi.json, /docs and /redoc."""
+
+    def test_openapi_schema_served(self, docs_client):
+        """Test that the schema matches app.openapi() and carries a strong ETag."""
+        response = docs_client.get("/openapi.json", headers={"Accept-Encoding": "identity"})
+
+        assert response.status_code == 200
+        assert response.json() == docs_client.app.openapi()
+        assert response.headers["etag"].startswith('"')
+        assert "content-encoding" not in response.headers
+        assert response.headers["vary"] == "Accept-Encoding"
+
+    def test_gzip_variant(self, docs_client):
+        """Test that gzip-capable clients get the precompressed body with its own tag."""
+        plain = docs_client.get("/openapi.json", headers={"Accept-Encoding": "identity"})
+        response = docs_client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["etag"] != plain.headers["etag"]
+        assert response.json() == plain.json()
+
+    def test_gzip_refused_with_zero_quality(self, docs_client):
+        """Test that gzip;q=0 gets the uncompressed body."""
+        response = docs_client.get("/openapi.json", headers={"Accept-Encoding": "gzip;q=0"})
+
+        assert "content-encoding" not in response.headers
+
+    @pytest.mark.parametrize("path", ["/openapi.json", "/docs", "/redoc"])
+    def test_if_none_match_returns_304(self, docs_client, path):
+        """Test that a matching If-None-Match (weak or strong) gets an empty 304."""
+        etag = docs_client.get(path).headers["etag"]
+
+        for if_none_match in (etag, f'"other", W/{etag}', "*"):
+            response = docs_client.get(path, headers={"If-None-Match": if_none_match})
+            assert response.status_code == 304
+            assert response.content == b""
+            assert response.headers["etag"] == etag
+
+        assert docs_client.get(path, headers={"If-None-Match": '"other"'}).status_code == 200
+
+    def test_docs_pages_point_at_schema(self, docs_client):
+        """Test that the Swagger UI and ReDoc pages reference the schema URL."""
+        assert "/openapi.json" in docs_client.get("/docs").text
+        assert "/openapi.json" in docs_client.get("/redoc").text
+        assert docs_client.get("/docs/oauth2-redirect").status_code == 200
+
+    def test_schema_built_once(self, docs_client):
+        """Test that requests reuse the pre-built bytes instead of regenerating."""
+        get_documents(docs_client.app)
+        with patch.object(docs_client.app, "openapi") as openapi:
+            docs_client.get("/openapi.json")
+            docs_client.get("/docs")
+            docs_client.get("/redoc")
+        openapi.assert_not_called()
+
+    def test_root_path_added_to_servers(self, docs_client):
+        """Test that a proxy root_path is listed in servers, as FastAPI does."""
+        client = TestClient(docs_client.app, root_path="/prefix")
+
+        response = client.get("/openapi.json")
+
+        assert response.json()["servers"] == [{"url": "/prefix"}]
+        assert "/prefix/openapi.json" in client.get("/docs").text
+
+    def test_deterministic_gzip(self, docs_client):
+        """Test that every build produces identical compressed bytes."""
+        first = get_documents(docs_client.app)["openapi"]
+        docs_client.app.state.static_docs = {}
+        second = get_documents(docs_client.app)["openapi"]
+
+        assert first.gzip_body == second.gzip_body
+        assert json.loads(gzip.decompress(second.gzip_body)) == json.loads(second.body)
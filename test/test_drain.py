@@ -0,0 +1,223 @@
+"""
+Unit tests for draining chat streams on worker shutdown.
+"""
+import asyncio
+import json
+import os
+import signal
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+from uvicorn import Config
+
+from app.core.drain import DrainController, StreamCut, _server_exiting
+from app.main import app
+from app.workers import DrainingServer
+
+
+async def _tokens(n: int, delay: float = 0.0):
+    for i in range(n):
+        await asyncio.sleep(delay)
+        yield i
+
+
+async def _collect(controller: DrainController, chunks) -> list:
+    return [chunk async for chunk in controller.guard(chunks)]
+
+
+class TestDrainController:
+    """Test cases for bounding in-flight streams once draining starts."""
+
+    @pytest.mark.asyncio
+    async def test_chunks_pass_through(self):
+        """Test that streams are untouched while the worker is not draining."""
+        controller = DrainController()
+
+        assert await _collect(controller, _tokens(3)) == [0, 1, 2]
+        assert controller.summary() == {
+            "draining": False,
+            "active": 0,
+            "finished": 0,
+            "cut": 0,
+            "refused": 0,
+        }
+
+    @pytest.mark.asyncio
+    async def test_stream_finishing_in_time_counted(self):
+        """Test that streams ending before the deadline count as finished."""
+        controller = DrainController(timeout=5)
+        task = asyncio.create_task(_collect(controller, _tokens(3, delay=0.01)))
+        await asyncio.sleep(0.005)
+        controller.begin()
+
+        assert await task == [0, 1, 2]
+        assert controller.finished == 1
+        assert controller.cut == 0
+
+    @pytest.mark.asyncio
+    async def test_stalled_stream_cut_at_deadline(self):
+        """Test that a wait already in progress when draining starts is bounded."""
+        controller = DrainController(timeout=0.05)
+        task = asyncio.create_task(_collect(controller, _tokens(3, delay=60)))
+        await asyncio.sleep(0.01)
+        assert controller.active == 1
+
+        controller.begin()
+        with pytest.raises(StreamCut):
+            await asyncio.wait_for(task, 1)
+        assert controller.cut == 1
+        assert controller.active == 0
+
+    @pytest.mark.asyncio
+    async def test_backend_timeout_not_mistaken_for_cut(self):
+        """Test that a TimeoutError from the backend itself propagates unchanged."""
+
+        async def failing():
+            raise TimeoutError("backend timed out")
+            yield
+
+        controller = DrainController()
+        with pytest.raises(TimeoutError):
+            await _collect(controller, failing())
+        assert controller.cut == 0
+
+    def test_resume_event(self):
+        """Test the final SSE event sent to streams cut by the drain."""
+        event = DrainController(retry_ms=1500).resume_event("abc123", 7)
+
+        lines = event.rstrip("\n").split("\n")
+        assert lines[:3] == ["event: drain", "id: abc123:7", "retry: 1500"]
+        data = json.loads(lines[3].removeprefix("data: "))
+        assert data == {
+            "reason": "worker_draining",
+            "trace_id": "abc123",
+            "tokens_sent": 7,
+            "resumable": True,
+        }
+        assert event.endswith("\n\n")
+
+    def test_server_exit_detection(self):
+        """Test that both signalled exits and max_requests recycling are detected."""
+        state = SimpleNamespace(total_requests=10)
+        config = SimpleNamespace(limit_max_requests=100)
+        server = SimpleNamespace(should_exit=False, server_state=state, config=config)
+        assert not _server_exiting(server)
+
+        state.total_requests = 100
+        assert _server_exiting(server)
+
+        state.total_requests = 0
+        server.should_exit = True
+        assert _server_exiting(server)
+
+
+class TestDrainingServer:
+    """Test cases for noticing that the serving uvicorn server exits."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("install", ["add_signal_handler", "signal"])
+    async def test_signalled_exit_starts_drain(self, install):
+        """Test that SIGTERM starts the drain however uvicorn installs its handler."""
+        controller = DrainController(poll_interval=60)
+        server = DrainingServer(Config(app))
+        loop = asyncio.get_running_loop()
+        previous = signal.getsignal(signal.SIGTERM)
+        with patch("app.workers.drain_controller", controller):
+            controller.watch(server)
+            await controller.start()
+            if install == "add_signal_handler":
+                # uvicorn 0.27 (Server.install_signal_handlers): getsignal() sees asyncio's handler
+                loop.add_signal_handler(signal.SIGTERM, server.handle_exit, signal.SIGTERM, None)
+            else:
+                # uvicorn 0.29+ (Server.capture_signals)
+                signal.signal(signal.SIGTERM, server.handle_exit)
+            try:
+                os.kill(os.getpid(), signal.SIGTERM)
+                for _ in range(100):
+                    if controller.draining:
+                        break
+                    await asyncio.sleep(0.01)
+            finally:
+                if install == "add_signal_handler":
+                    loop.remove_signal_handler(signal.SIGTERM)
+                signal.signal(signal.SIGTERM, previous)
+                await controller.stop()
+
+        assert server.should_exit
+        assert controller.draining
+
+    @pytest.mark.asyncio
+    async def test_serve_registers_server(self):
+        """Test that the server hands itself to the drain controller before serving."""
+        controller = DrainController()
+        server = DrainingServer(Config(app))
+        with patch("app.workers.drain_controller", controller), patch(
+            "uvicorn.server.Server.serve", AsyncMock()
+        ) as serve:
+            await server.serve()
+
+        serve.assert_awaited_once()
+        assert controller._server is server
+
+    @pytest.mark.asyncio
+    async def test_max_requests_exit_starts_drain(self):
+        """Test that reaching limit_max_requests, which sends no signal, starts the drain."""
+        controller = DrainController(poll_interval=0.01)
+        state = SimpleNamespace(total_requests=0)
+        config = SimpleNamespace(limit_max_requests=10)
+        controller.watch(SimpleNamespace(should_exit=False, server_state=state, config=config))
+        await controller.start()
+
+        state.total_requests = 10
+        for _ in range(100):
+            if controller.draining:
+                break
+            await asyncio.sleep(0.01)
+        await controller.stop()
+
+        assert controller.draining
+
+
+class TestDrainingEndpoint:
+    """Test cases for the chat endpoint while the worker drains."""
+
+    def test_new_streams_refused(self, client, mock_api_key, mock_chat_request):
+        """Test that a draining worker answers 503 and closes the connection."""
+        controller = DrainController()
+        controller.draining = True
+        with patch("app.api.v1.chat.drain_controller", controller):
+            response = client.post(
+                "/api/v1/chat/stream", headers={"X-API-Key": mock_api_key}, json=mock_chat_request
+            )
+
+        assert response.status_code == 503
+        assert response.headers["connection"] == "close"
+        assert response.headers["retry-after"] == "1"
+        assert controller.refused == 1
+
+    @pytest.mark.asyncio
+    async def test_running_stream_ends_with_resume_event(self, mock_api_key):
+        """Test that a stream still running at the deadline ends with the drain event."""
+        controller = DrainController(timeout=0.15)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            with patch("app.api.v1.chat.drain_controller", controller):
+                request = asyncio.create_task(
+                    http.post(
+                        "/api/v1/chat/stream",
+                        headers={"X-API-Key": mock_api_key},
+                        json={"messages": [{"role": "user", "content": " ".join(["word"] * 20)}]},
+                    )
+                )
+                await asyncio.sleep(0.05)
+                controller.begin()
+                response = await request
+
+        events = response.text.rstrip("\n").split("\n\n")
+        assert response.status_code == 200
+        assert 1 <= len(events) - 1 < 20
+        assert events[-1].startswith("event: drain\n")
+        assert json.loads(events[-1].rsplit("data: ", 1)[1])["tokens_sent"] == len(events) - 1
+        assert controller.cut == 1
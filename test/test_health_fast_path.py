@@ -0,0 +1,79 @@
+"""
+Unit tests for the liveness probe fast path.
+"""
+import json
+
+import pytest
+
+from app.main import app
+from app.middleware.health_fast_path import HealthFastPathMiddleware
+
+TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+async def _unreachable(scope, receive, send):
+    raise AssertionError("request reached the application")
+
+
+async def _call(middleware, path: str, headers: list[tuple[bytes, bytes]]) -> list[dict]:
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": headers}
+    await middleware(scope, None, send)
+    return messages
+
+
+class TestHealthFastPath:
+    """Test cases for HealthFastPathMiddleware."""
+
+    @pytest.mark.asyncio
+    async def test_answered_without_inner_app(self):
+        """Test that probes never reach the middleware stack or the route."""
+        start, body = await _call(HealthFastPathMiddleware(_unreachable), "/api/v1/health", [])
+
+        headers = dict(start["headers"])
+        data = json.loads(body["body"])
+        assert start["status"] == 200
+        assert data["status"] == "ok"
+        assert headers[b"x-trace-id"].decode() == data["trace_id"]
+        assert int(headers[b"content-length"]) == len(body["body"])
+
+    def test_matches_route_response(self, client):
+        """Test that the fast path returns what the documented route would."""
+        response = client.get("/api/v1/health")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        assert list(response.json()) == ["status", "trace_id"]
+        assert response.headers["X-Trace-Id"] == response.json()["trace_id"]
+
+    def test_traceparent_continued(self, client):
+        """Test that a valid traceparent's trace ID is used and propagated."""
+        response = client.get(
+            "/api/v1/health", headers={"traceparent": TRACEPARENT, "tracestate": "vendor=1"}
+        )
+
+        assert response.json()["trace_id"] == "4bf92f3577b34da6a3ce929d0e0e4736"
+        assert response.headers["traceparent"].startswith("00-4bf92f3577b34da6a3ce929d0e0e4736-")
+        assert response.headers["tracestate"] == "vendor=1"
+
+    def test_caller_trace_id_escaped(self, client):
+        """Test that a caller-chosen X-Trace-Id is spliced in as valid JSON."""
+        trace_id = 'abc-"\\x'
+        response = client.get("/api/v1/health", headers={"X-Trace-Id": trace_id})
+
+        assert response.json()["trace_id"] == trace_id
+        assert response.headers["X-Trace-Id"] == trace_id
+
+    def test_other_methods_fall_through(self, client):
+        """Test that only GET is short-circuited."""
+        assert client.post("/api/v1/health").status_code == 405
+
+    def test_endpoint_still_documented(self):
+        """Test that the route and its response model stay in the schema."""
+        operation = app.openapi()["paths"]["/api/v1/health"]["get"]
+
+        assert "HealthResponse" in json.dumps(operation["responses"]["200"])
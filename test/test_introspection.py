@@ -0,0 +1,173 @@
+"""
+Unit tests for OAuth token introspection.
+"""
+import asyncio
+import time
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.core.introspection import IntrospectionClient
+from app.core.oauth import verify_bearer_token
+from app.core.resilience import CircuitBreaker, CircuitOpenError
+
+
+class IntrospectionServer:
+    """Local stand-in for the provider's introspection endpoint."""
+
+    def __init__(self, active_tokens: dict[str, dict] | None = None, delay: float = 0.0):
+        self.active_tokens = active_tokens or {}
+        self.delay = delay
+        self.failing = False
+        self.requests = 0
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        await asyncio.sleep(self.delay)
+        if self.failing:
+            return httpx.Response(503)
+        token = dict(httpx.QueryParams(request.content.decode()))["token"]
+        claims = self.active_tokens.get(token)
+        if claims is None:
+            return httpx.Response(200, json={"active": False})
+        return httpx.Response(200, json={"active": True, **claims})
+
+    def client(self, **kwargs) -> IntrospectionClient:
+        http = httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+        return IntrospectionClient(
+            "https://idp.test/introspect", "client", "secret", client=http, **kwargs
+        )
+
+
+class TestIntrospectionClient:
+    """Test cases for the introspection client."""
+
+    @pytest.mark.asyncio
+    async def test_active_token(self):
+        """Test that an active token returns its claims."""
+        server = IntrospectionServer({"tok": {"sub": "user7", "exp": time.time() + 60}})
+
+        result = await server.client().introspect("tok")
+        assert result["active"] is True
+        assert result["sub"] == "user7"
+
+    @pytest.mark.asyncio
+    async def test_concurrent_lookups_single_flight(self):
+        """Test that concurrent lookups of one token make a single request."""
+        server = IntrospectionServer({"tok": {"sub": "user7"}}, delay=0.05)
+        client = server.client()
+
+        results = await asyncio.gather(*(client.introspect("tok") for _ in range(20)))
+
+        assert server.requests == 1
+        assert all(result["sub"] == "user7" for result in results)
+
+    @pytest.mark.asyncio
+    async def test_results_cached_for_token_lifetime(self):
+        """Test that results are cached but not beyond the token's exp."""
+        server = IntrospectionServer(
+            {"short": {"sub": "a", "exp": time.time() + 0.05}, "long": {"sub": "b"}}
+        )
+        client = server.client(cache_ttl=300)
+        await client.introspect("long")
+        await client.introspect("long")
+        assert server.requests == 1
+
+        await client.introspect("short")
+        await asyncio.sleep(0.1)
+        await client.introspect("short")
+        assert server.requests == 3
+
+    @pytest.mark.asyncio
+    async def test_inactive_tokens_negatively_cached(self):
+        """Test that inactive results are cached briefly."""
+        server = IntrospectionServer()
+        client = server.client(negative_ttl=30)
+        await client.introspect("bogus")
+        await client.introspect("bogus")
+
+        assert server.requests == 1
+
+    @pytest.mark.asyncio
+    async def test_circuit_opens_on_provider_outage(self):
+        """Test that repeated provider failures fail fast."""
+        server = IntrospectionServer()
+        server.failing = True
+        client = server.client(breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.introspect("tok")
+        with pytest.raises(CircuitOpenError):
+            await client.introspect("tok")
+        assert server.requests == 2
+
+    @pytest.mark.asyncio
+    async def test_unexpected_error_frees_half_open_trial(self):
+        """Test that a trial call failing unexpectedly still lets the circuit recover."""
+        server = IntrospectionServer({"tok": {"sub": "user7"}})
+        client = server.client(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0))
+        client.breaker.record_failure()
+
+        with patch.object(client.client, "post", side_effect=RuntimeError("bug")):
+            with pytest.raises(RuntimeError):
+                await client.introspect("tok")
+        assert (await client.introspect("tok"))["active"] is True
+        assert client.breaker.state == "closed"
+
+    @pytest.mark.asyncio
+    async def test_non_object_response_is_an_error(self):
+        """Test that a JSON body that is not an object is treated as a provider error."""
+
+        async def handler(request):
+            return httpx.Response(200, json=["active"])
+
+        http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client = IntrospectionClient("https://idp.test/introspect", "c", "s", client=http)
+
+        with pytest.raises(ValueError):
+            await client.introspect("tok")
+        assert client.breaker.failures == 1
+
+
+class TestBearerTokenIntrospection:
+    """Test cases for bearer verification through introspection."""
+
+    @pytest.mark.asyncio
+    async def test_opaque_token_introspected(self):
+        """Test that opaque bearer tokens are introspected."""
+        server = IntrospectionServer({"opaque-token": {"sub": "user9"}})
+        with patch("app.core.oauth.settings.OAUTH_INTROSPECTION_URL", "https://idp.test"), patch(
+            "app.core.oauth.get_introspection_client", return_value=server.client()
+        ):
+            auth_context = await verify_bearer_token("Bearer opaque-token")
+
+        assert auth_context.user_id == "user9"
+
+    @pytest.mark.asyncio
+    async def test_inactive_token_rejected(self):
+        """Test that inactive tokens get 401."""
+        server = IntrospectionServer()
+        with patch("app.core.oauth.settings.OAUTH_INTROSPECTION_URL", "https://idp.test"), patch(
+            "app.core.oauth.get_introspection_client", return_value=server.client()
+        ):
+            with pytest.raises(HTTPException) as exc_info:
+                await verify_bearer_token("Bearer oauth_test123")
+
+        assert exc_info.value.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_provider_outage_returns_503(self):
+        """Test that an open circuit surfaces as 503, not 401."""
+        server = IntrospectionServer()
+        client = server.client(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+        client.breaker.record_failure()
+        with patch("app.core.oauth.settings.OAUTH_INTROSPECTION_URL", "https://idp.test"), patch(
+            "app.core.oauth.get_introspection_client", return_value=client
+        ):
+            with pytest.raises(HTTPException) as exc_info:
+                await verify_bearer_token("Bearer opaque-token")
+
+        assert exc_info.value.status_code == 503
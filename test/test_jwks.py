@@ -0,0 +1,220 @@
+"""
+Unit tests for JWKS-based JWT verification.
+"""
+import base64
+import time
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from jose import JWTError, jwt
+
+from app.core.jwks import JWKSCache, JWTVerifier
+from app.core.oauth import verify_bearer_token
+
+SECRET = b"test-signing-secret-0123456789abcdef"
+
+
+def _jwk(kid: str, secret: bytes = SECRET) -> dict:
+    k = base64.urlsafe_b64encode(secret).rstrip(b"=").decode()
+    return {"kty": "oct", "kid": kid, "alg": "HS256", "k": k}
+
+
+def _token(kid: str = "key-1", secret: bytes = SECRET, **claims) -> str:
+    payload = {"sub": "user42", "exp": int(time.time()) + 300, **claims}
+    return jwt.encode(payload, secret, algorithm="HS256", headers={"kid": kid})
+
+
+class JWKSServer:
+    """Local stand-in for the provider's JWKS endpoint."""
+
+    def __init__(self, *kids: str, cache_control: str | None = None):
+        self.keys = [_jwk(kid) for kid in kids]
+        self.cache_control = cache_control
+        self.status = 200
+        self.requests = 0
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        headers = {"Cache-Control": self.cache_control} if self.cache_control else {}
+        return httpx.Response(self.status, json={"keys": self.keys}, headers=headers)
+
+    def cache(self, **kwargs) -> JWKSCache:
+        client = httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+        return JWKSCache("https://idp.test/jwks", client=client, **kwargs)
+
+
+class TestJWKSCache:
+    """Test cases for the JWKS key cache."""
+
+    @pytest.mark.asyncio
+    async def test_keys_cached_by_kid(self):
+        """Test that keys are fetched once and served from cache."""
+        server = JWKSServer("key-1", "key-2")
+        cache = server.cache()
+
+        assert (await cache.get_key("key-1"))["kid"] == "key-1"
+        assert (await cache.get_key("key-2"))["kid"] == "key-2"
+        assert server.requests == 1
+
+    @pytest.mark.asyncio
+    async def test_unknown_kid_refetch_is_rate_limited(self):
+        """Test that unknown kids cause at most one refetch per interval."""
+        server = JWKSServer("key-1")
+        cache = server.cache(min_refetch_interval=60)
+        await cache.get_key("key-1")
+
+        for _ in range(5):
+            assert await cache.get_key("forged") is None
+        assert server.requests == 1
+
+    @pytest.mark.asyncio
+    async def test_unknown_kid_picks_up_rotated_key(self):
+        """Test that a rotated key is found after the refetch interval."""
+        server = JWKSServer("key-1")
+        cache = server.cache(min_refetch_interval=0)
+        await cache.get_key("key-1")
+        server.keys.append(_jwk("key-2"))
+
+        assert (await cache.get_key("key-2"))["kid"] == "key-2"
+        assert server.requests == 2
+
+    @pytest.mark.asyncio
+    async def test_failed_fetch_retried_once_per_interval(self):
+        """Test that requests during a provider outage do not each refetch the key set."""
+        server = JWKSServer("key-1")
+        server.status = 503
+        cache = server.cache(min_refetch_interval=60)
+
+        with pytest.raises(httpx.HTTPStatusError):
+            await cache.get_key("key-1")
+        for _ in range(5):
+            with pytest.raises(ValueError, match="JWKS fetch failed"):
+                await cache.get_key("key-1")
+        assert server.requests == 1
+
+        server.status = 200
+        cache._fetched_at -= 60
+        assert (await cache.get_key("key-1"))["kid"] == "key-1"
+        assert server.requests == 2
+
+    @pytest.mark.asyncio
+    async def test_check_counts_unexpired_keys(self):
+        """Test that the readiness check fetches once and reports the key count."""
+        server = JWKSServer("key-1", "key-2")
+        cache = server.cache()
+
+        assert await cache.check() == 2
+        assert await cache.check() == 2
+        assert server.requests == 1
+
+    @pytest.mark.asyncio
+    async def test_background_refresh_before_expiry(self):
+        """Test that a lookup near expiry refreshes without blocking."""
+        server = JWKSServer("key-1")
+        cache = server.cache(ttl=100, refresh_margin=0.5)
+        await cache.get_key("key-1")
+        cache._expires_at = time.monotonic() + 10
+
+        assert await cache.get_key("key-1") is not None
+        await cache._refresh_task
+        assert server.requests == 2
+
+    @pytest.mark.asyncio
+    async def test_cache_control_caps_ttl(self):
+        """Test that a shorter max-age from the provider wins."""
+        server = JWKSServer("key-1", cache_control="public, max-age=5")
+        cache = server.cache(ttl=300)
+        await cache.get_key("key-1")
+
+        assert cache._expires_at - time.monotonic() <= 5
+
+
+class TestJWTVerifier:
+    """Test cases for JWT verification."""
+
+    @pytest.mark.asyncio
+    async def test_verify_valid_token(self):
+        """Test that a correctly signed token yields its claims."""
+        verifier = JWTVerifier(JWKSServer("key-1").cache(), algorithms=["HS256"])
+
+        claims = await verifier.verify(_token())
+        assert claims["sub"] == "user42"
+
+    @pytest.mark.asyncio
+    async def test_bad_signature_rejected(self):
+        """Test that a token signed with another key is rejected."""
+        verifier = JWTVerifier(JWKSServer("key-1").cache(), algorithms=["HS256"])
+
+        with pytest.raises(JWTError):
+            await verifier.verify(_token(secret=b"another-secret-0123456789abcdefgh"))
+
+    @pytest.mark.asyncio
+    async def test_expired_token_rejected(self):
+        """Test that expired tokens are rejected."""
+        verifier = JWTVerifier(JWKSServer("key-1").cache(), algorithms=["HS256"])
+
+        with pytest.raises(JWTError):
+            await verifier.verify(_token(exp=int(time.time()) - 10))
+
+    @pytest.mark.asyncio
+    async def test_issuer_and_audience_checked(self):
+        """Test issuer and audience validation."""
+        verifier = JWTVerifier(
+            JWKSServer("key-1").cache(),
+            algorithms=["HS256"],
+            issuer="https://idp.test",
+            audience="chat-api",
+        )
+
+        assert await verifier.verify(_token(iss="https://idp.test", aud="chat-api"))
+        with pytest.raises(JWTError):
+            await verifier.verify(_token(iss="https://evil.test", aud="chat-api"))
+
+    @pytest.mark.asyncio
+    async def test_claims_cached_until_exp(self):
+        """Test that repeated verification of a token skips decoding."""
+        verifier = JWTVerifier(JWKSServer("key-1").cache(), algorithms=["HS256"])
+        token = _token()
+        await verifier.verify(token)
+
+        with patch("jose.jwt.decode") as decode:
+            await verifier.verify(token)
+        decode.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_claims_cache_bounded(self):
+        """Test that the claims cache evicts old entries."""
+        verifier = JWTVerifier(JWKSServer("key-1").cache(), algorithms=["HS256"], cache_size=2)
+        for i in range(4):
+            await verifier.verify(_token(sub=f"user{i}"))
+
+        assert len(verifier._claims) == 2
+
+
+class TestBearerTokenWithJWKS:
+    """Test cases for bearer token verification when JWKS is configured."""
+
+    @pytest.mark.asyncio
+    async def test_jwt_bearer_token_verified(self):
+        """Test that bearer JWTs are verified against the JWKS."""
+        verifier = JWTVerifier(JWKSServer("key-1").cache(), algorithms=["HS256"])
+        with patch("app.core.oauth.settings.OAUTH_JWKS_URL", "https://idp.test/jwks"), patch(
+            "app.core.oauth.get_jwt_verifier", return_value=verifier
+        ):
+            auth_context = await verify_bearer_token(f"Bearer {_token()}")
+
+        assert auth_context.user_id == "user42"
+
+    @pytest.mark.asyncio
+    async def test_demo_tokens_rejected(self):
+        """Test that demo oauth_ tokens are not accepted once JWKS is configured."""
+        verifier = JWTVerifier(JWKSServer("key-1").cache(), algorithms=["HS256"])
+        with patch("app.core.oauth.settings.OAUTH_JWKS_URL", "https://idp.test/jwks"), patch(
+            "app.core.oauth.get_jwt_verifier", return_value=verifier
+        ):
+            with pytest.raises(HTTPException) as exc_info:
+                await verify_bearer_token("Bearer oauth_test123")
+
+        assert exc_info.value.status_code == 401
@@ -0,0 +1,225 @@
+"""
+Unit tests for the hashed API key store.
+"""
+import json
+import os
+import sqlite3
+from unittest.mock import Mock, patch
+
+import pytest
+from fastapi import Request
+
+from app.core.key_store import APIKeyStore, KeyPlan, hash_api_key
+from app.middleware.auth_middleware import AuthMiddleware
+from app.middleware.rate_limit import get_rate_limits
+
+
+@pytest.fixture
+def json_store_path(tmp_path):
+    """Write a JSON key store with two plans."""
+    path = tmp_path / "keys.json"
+    path.write_text(
+        json.dumps(
+            {
+                "plans": {
+                    "pro": {
+                        "rate_limit_per_minute": 600,
+                        "rate_limit_per_hour": 20000,
+                        "token_budget": 1_000_000,
+                    },
+                    "health-only": {"allowed_routes": ["/api/v1/health"]},
+                },
+                "keys": [
+                    {
+                        "key_sha256": hash_api_key("pro-key").hex(),
+                        "user_id": "alice",
+                        "plan": "pro",
+                    },
+                    {"key": "plain-key", "user_id": "bob"},
+                    {"key": "limited-key", "user_id": "carol", "plan": "health-only"},
+                ],
+            }
+        )
+    )
+    return str(path)
+
+
+class TestAPIKeyStore:
+    """Test cases for loading and looking up keys."""
+
+    def test_default_store_uses_settings(self):
+        """Test that the store falls back to settings.API_KEYS."""
+        store = APIKeyStore()
+
+        assert store.lookup("test-api-key-123").user_id == "user1"
+        assert store.lookup("test-api-key-123").plan.name == "default"
+        assert store.lookup("unknown") is None
+
+    def test_json_store_plans(self, json_store_path):
+        """Test that JSON keys resolve to their plan metadata."""
+        store = APIKeyStore(json_store_path)
+
+        record = store.lookup("pro-key")
+        assert record.user_id == "alice"
+        assert record.plan.rate_limit_per_minute == 600
+        assert record.plan.token_budget == 1_000_000
+        assert store.lookup("plain-key").plan.name == "default"
+        assert len(store) == 3
+
+    def test_sqlite_store(self, tmp_path):
+        """Test loading keys and plans from SQLite."""
+        path = str(tmp_path / "keys.db")
+        conn = sqlite3.connect(path)
+        conn.executescript(
+            """
+            CREATE TABLE plans (name TEXT PRIMARY KEY, rate_limit_per_minute INTEGER,
+                rate_limit_per_hour INTEGER, token_budget INTEGER, allowed_routes TEXT);
+            CREATE TABLE api_keys (key_sha256 TEXT PRIMARY KEY, user_id TEXT, plan TEXT);
+            INSERT INTO plans VALUES ('team', 120, 5000, NULL, '/api/v1/chat,/api/v1/auth');
+            """
+        )
+        conn.execute(
+            "INSERT INTO api_keys VALUES (?, ?, ?)", (hash_api_key("db-key").hex(), "dave", "team")
+        )
+        conn.commit()
+        conn.close()
+
+        record = APIKeyStore(path).lookup("db-key")
+
+        assert record.user_id == "dave"
+        assert record.plan.rate_limit_per_hour == 5000
+        assert record.plan.allowed_routes == ("/api/v1/chat", "/api/v1/auth")
+
+    def test_reload_swaps_index(self, json_store_path):
+        """Test that reload picks up added keys."""
+        store = APIKeyStore(json_store_path)
+        with open(json_store_path) as f:
+            data = json.load(f)
+        data["keys"].append({"key": "new-key", "user_id": "erin"})
+        with open(json_store_path, "w") as f:
+            json.dump(data, f)
+
+        assert store.lookup("new-key") is None
+        assert store.reload() is True
+        assert store.lookup("new-key").user_id == "erin"
+
+    def test_failed_reload_keeps_index(self, json_store_path):
+        """Test that a broken file does not wipe the loaded keys."""
+        store = APIKeyStore(json_store_path)
+        with open(json_store_path, "w") as f:
+            f.write("{not json")
+
+        assert store.reload() is False
+        assert store.lookup("pro-key").user_id == "alice"
+
+    def test_lookup_triggers_background_reload(self, json_store_path):
+        """Test that a changed mtime schedules a reload on lookup."""
+        store = APIKeyStore(json_store_path, reload_interval=0)
+        os.utime(json_store_path, ns=(0, 0))
+
+        with patch("app.core.key_store.threading.Thread") as thread:
+            store.lookup("pro-key")
+        thread.assert_called_once()
+
+    def test_plan_allows_routes(self):
+        """Test route prefix matching."""
+        plan = KeyPlan("chat", 60, 1000, allowed_routes=("/api/v1/chat",))
+
+        assert plan.allows("/api/v1/chat/stream") is True
+        assert plan.allows("/api/v1/auth/me") is False
+        assert KeyPlan("any", 60, 1000).allows("/anything") is True
+
+
+class TestPlanEnforcement:
+    """Test cases for auth and rate limiting reading plan metadata."""
+
+    def test_rate_limits_from_plan(self):
+        """Test that the rate limiter uses the key's plan limits."""
+        request = Mock(spec=Request)
+        request.state.plan = KeyPlan("pro", 600, 20000)
+
+        assert get_rate_limits(request) == (600, 20000)
+
+    def test_rate_limits_default(self):
+        """Test that requests without a plan use global settings."""
+        from app.core.config import settings
+
+        request = Mock(spec=Request)
+        request.state = Mock(spec=[])
+
+        assert get_rate_limits(request) == (
+            settings.RATE_LIMIT_PER_MINUTE,
+            settings.RATE_LIMIT_PER_HOUR,
+        )
+
+    @pytest.mark.asyncio
+    async def test_auth_middleware_blocks_disallowed_route(self, json_store_path):
+        """Test that a key restricted to some routes gets 403 elsewhere."""
+        request = Mock(spec=Request)
+        request.url.path = "/api/v1/chat/stream"
+        request.headers = {"X-API-Key": "limited-key"}
+        request.state = Mock()
+
+        async def call_next(request):
+            raise AssertionError("request should not reach the endpoint")
+
+        with patch(
+            "app.core.api_key_auth.get_key_store", return_value=APIKeyStore(json_store_path)
+        ):
+            response = await AuthMiddleware(app=Mock()).dispatch(request, call_next)
+
+        assert response.status_code == 403
+
+
+class TestPlanLimitsEndToEnd:
+    """Test cases for plan limits applied through the full middleware stack."""
+
+    @pytest.fixture
+    def small_plan_store(self, tmp_path):
+        """Key store with a key whose plan allows two requests a minute and ten tokens."""
+        path = tmp_path / "keys.json"
+        path.write_text(
+            json.dumps(
+                {
+                    "plans": {
+                        "tiny": {
+                            "rate_limit_per_minute": 2,
+                            "rate_limit_per_hour": 100,
+                            "token_budget": 10,
+                        }
+                    },
+                    "keys": [{"key": "tiny-key", "user_id": "tiny-user", "plan": "tiny"}],
+                }
+            )
+        )
+        store = APIKeyStore(str(path))
+        with (
+            patch("app.core.api_key_auth.get_key_store", return_value=store),
+            patch("app.middleware.rate_limit.get_limiter", return_value=Mock(storage={})),
+        ):
+            yield store
+
+    def test_plan_rate_limit_enforced(self, client, small_plan_store):
+        """Test that the key's plan limit, not the global one, is applied."""
+        headers = {"X-API-Key": "tiny-key"}
+        body = {"messages": [{"role": "user", "content": "hi"}]}
+
+        responses = [
+            client.post("/api/v1/chat/stream", headers=headers, json=body) for _ in range(3)
+        ]
+
+        assert [r.status_code for r in responses] == [200, 200, 429]
+        assert responses[0].headers["X-RateLimit-Limit-Minute"] == "2"
+        assert responses[1].headers["X-RateLimit-Remaining-Minute"] == "0"
+
+    def test_plan_token_budget_enforced(self, client, small_plan_store):
+        """Test that a key over its token budget is refused further streams."""
+        headers = {"X-API-Key": "tiny-key"}
+        body = {"messages": [{"role": "user", "content": "one two three four five six"}]}
+
+        first = client.post("/api/v1/chat/stream", headers=headers, json=body)
+        second = client.post("/api/v1/chat/stream", headers=headers, json=body)
+
+        assert first.status_code == 200
+        assert second.status_code == 429
+        assert "Token budget exhausted" in second.json()["detail"]
@@ -0,0 +1,96 @@
+"""
+Unit tests for event loop lag monitoring and load shedding.
+"""
+import asyncio
+import logging
+import time
+
+import pytest
+
+from app.core.loop_monitor import LoopLagMonitor, get_loop_monitor
+
+
+def _validate_giant_request():
+    """Stand-in for CPU-heavy work done on the event loop."""
+    time.sleep(0.3)
+
+
+class TestLoopLagMonitor:
+    """Test cases for lag sampling and slow-callback detection."""
+
+    @pytest.mark.asyncio
+    async def test_lag_measured_when_loop_blocked(self):
+        """Test that blocking the loop shows up as lag."""
+        monitor = LoopLagMonitor(interval=0.01, slow_threshold=10)
+        await monitor.start()
+        try:
+            await asyncio.sleep(0.05)
+            time.sleep(0.1)
+            await asyncio.sleep(0.03)
+        finally:
+            await monitor.stop()
+
+        assert monitor.histogram.count > 1
+        assert monitor.histogram.max / 1e6 >= 0.05
+
+    @pytest.mark.asyncio
+    async def test_slow_callback_stack_logged(self, caplog):
+        """Test that the watchdog logs the stack of the blocking code once."""
+        monitor = LoopLagMonitor(interval=0.01, slow_threshold=0.05)
+        await monitor.start()
+        try:
+            await asyncio.sleep(0.03)
+            with caplog.at_level(logging.WARNING, logger="app.core.loop_monitor"):
+                _validate_giant_request()
+                await asyncio.sleep(0.03)
+        finally:
+            await monitor.stop()
+
+        assert monitor.slow_callbacks == 1
+        assert "_validate_giant_request" in caplog.text
+
+    def test_overloaded_threshold(self):
+        """Test that shedding starts at the threshold and can be disabled."""
+        monitor = LoopLagMonitor(shed_threshold=0.5)
+        monitor.record(0.4)
+        assert not monitor.overloaded
+        monitor.record(0.6)
+        assert monitor.overloaded
+
+        disabled = LoopLagMonitor(shed_threshold=None)
+        disabled.record(10)
+        assert not disabled.overloaded
+
+
+class TestLoadShedding:
+    """Test cases for the load-shedding middleware."""
+
+    @pytest.fixture
+    def overloaded(self):
+        monitor = get_loop_monitor()
+        previous = (monitor.lag, monitor.shed_threshold)
+        monitor.shed_threshold = 0.5
+        monitor.lag = 1.0
+        yield monitor
+        monitor.lag, monitor.shed_threshold = previous
+
+    def test_new_requests_shed(self, client, overloaded, mock_api_key, mock_chat_request):
+        """Test that requests get 503 with Retry-After while overloaded."""
+        response = client.post(
+            "/api/v1/chat/stream", headers={"X-API-Key": mock_api_key}, json=mock_chat_request
+        )
+
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+
+    def test_probes_not_shed(self, client, overloaded):
+        """Test that health checks and scrapes are always admitted."""
+        assert client.get("/api/v1/health").status_code == 200
+        assert client.get("/metrics").status_code == 200
+
+    def test_lag_in_metrics_endpoint(self, client, overloaded):
+        """Test that loop lag is reported by /api/v1/metrics."""
+        lag = client.get("/api/v1/metrics").json()["event_loop_lag_ms"]
+
+        assert lag["current"] == 1000.0
+        assert lag["overloaded"] is True
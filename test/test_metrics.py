@@ -0,0 +1,141 @@
+"""
+Unit tests for streaming latency metrics.
+"""
+import random
+
+import pytest
+
+from app.core.metrics import LogLinearHistogram, StreamMetrics, stream_metrics
+
+
+class TestLogLinearHistogram:
+    """Test cases for the log-linear histogram."""
+
+    def test_small_values_exact(self):
+        """Test that values below the sub-bucket count are exact."""
+        histogram = LogLinearHistogram()
+        for value in range(1, 11):
+            histogram.record(value)
+
+        assert histogram.percentile(50) == 5
+        assert histogram.percentile(100) == 10
+        assert histogram.mean() == 5.5
+
+    def test_percentiles_within_relative_error(self):
+        """Test that quantiles of a wide distribution stay within ~3%."""
+        rng = random.Random(42)
+        values = sorted(rng.lognormvariate(10, 1.5) for _ in range(20000))
+        histogram = LogLinearHistogram()
+        for value in values:
+            histogram.record(value)
+
+        for q in (50, 90, 99):
+            exact = values[int(q / 100 * len(values)) - 1]
+            assert histogram.percentile(q) == pytest.approx(exact, rel=0.035)
+
+    def test_scale_records_seconds_as_microseconds(self):
+        """Test that scaled values come back in the recorded unit."""
+        histogram = LogLinearHistogram(scale=1e6)
+        histogram.record(0.25)
+
+        assert histogram.percentile(50) == pytest.approx(0.25, rel=0.03)
+        assert histogram.summary(1000)["max"] == 250.0
+
+    def test_out_of_range_values_clamped(self):
+        """Test that negative and huge values do not raise."""
+        histogram = LogLinearHistogram(max_bits=20)
+        histogram.record(-5)
+        histogram.record(10**12)
+
+        assert histogram.count == 2
+        assert histogram.percentile(100) == (1 << 20) - 1
+
+    def test_merge(self):
+        """Test that merged histograms report combined quantiles."""
+        low, high = LogLinearHistogram(), LogLinearHistogram()
+        for _ in range(50):
+            low.record(10)
+            high.record(1000)
+        low.merge(high)
+
+        assert low.count == 100
+        assert low.percentile(25) == 10
+        assert low.percentile(90) == pytest.approx(1000, rel=0.03)
+
+    def test_empty(self):
+        """Test that an empty histogram summarises to zeros."""
+        assert LogLinearHistogram().summary() == {
+            "count": 0,
+            "mean": 0.0,
+            "p50": 0.0,
+            "p90": 0.0,
+            "p99": 0.0,
+            "max": 0.0,
+        }
+
+
+class TestStreamTimer:
+    """Test cases for per-stream timing."""
+
+    def test_completed_stream(self):
+        """Test that a completed stream records all four metrics."""
+        metrics = StreamMetrics()
+        timer = metrics.timer("/chat", "test")
+        for _ in range(3):
+            timer.token()
+        timer.finish()
+
+        entry = metrics.snapshot()[0]
+        assert entry["completed"] == 1
+        assert entry["ttft_ms"]["count"] == 1
+        assert entry["inter_token_ms"]["count"] == 2
+        assert entry["duration_ms"]["count"] == 1
+        assert entry["tokens_per_sec"]["count"] == 1
+
+    def test_aborted_stream_only_counted(self):
+        """Test that aborted streams skip duration and throughput."""
+        metrics = StreamMetrics()
+        timer = metrics.timer("/chat", "test")
+        timer.token()
+        timer.finish(completed=False)
+        timer.finish()
+
+        entry = metrics.snapshot()[0]
+        assert (entry["completed"], entry["aborted"]) == (0, 1)
+        assert entry["duration_ms"]["count"] == 0
+
+    def test_keyed_by_route_and_backend(self):
+        """Test that each route/backend pair has its own histograms."""
+        metrics = StreamMetrics()
+        metrics.timer("/chat", "a").finish()
+        metrics.timer("/chat", "b").finish()
+        metrics.timer("/chat", "a").finish()
+
+        completed = {entry["backend"]: entry["completed"] for entry in metrics.snapshot()}
+        assert completed == {"a": 2, "b": 1}
+
+
+class TestMetricsEndpoint:
+    """Test cases for the metrics endpoint."""
+
+    def test_stream_metrics_reported(self, client, mock_api_key):
+        """Test that a finished chat stream shows up in /api/v1/metrics."""
+        stream_metrics.reset()
+        with client.stream(
+            "POST",
+            "/api/v1/chat/stream",
+            headers={"X-API-Key": mock_api_key},
+            json={"messages": [{"role": "user", "content": "one two three"}]},
+        ) as response:
+            for _ in response.iter_lines():
+                pass
+
+        response = client.get("/api/v1/metrics")
+        assert response.status_code == 200
+        entry = response.json()["streams"][0]
+        assert entry["route"] == "/api/v1/chat/stream"
+        assert entry["backend"] == "simulated"
+        assert entry["completed"] == 1
+        assert entry["inter_token_ms"]["count"] == 2
+        # The simulated backend sleeps 100ms between tokens
+        assert entry["inter_token_ms"]["p50"] >= 90
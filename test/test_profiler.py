@@ -0,0 +1,121 @@
+"""
+Unit tests for the sampling profiler and the admin profile endpoint.
+"""
+import asyncio
+import time
+import weakref
+from collections import Counter
+from unittest.mock import patch
+
+import pytest
+
+from app.core.profiler import ProfilerBusyError, SamplingProfiler, format_collapsed
+from app.core.tracing import start_span, start_trace
+
+
+async def _busy_request(seconds: float) -> None:
+    start_trace()
+    start_span("http.request", activate=True, path="/api/v1/chat/stream")
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        _burn_cpu()
+        await asyncio.sleep(0)
+
+
+def _burn_cpu() -> None:
+    end = time.monotonic() + 0.02
+    while time.monotonic() < end:
+        pass
+
+
+class TestSamplingProfiler:
+    """Test cases for the sampling profiler."""
+
+    @pytest.mark.asyncio
+    async def test_samples_labelled_by_request(self):
+        """Test that loop samples name the hot function and the running request."""
+        profiler = SamplingProfiler()
+        task = asyncio.create_task(_busy_request(0.3))
+        counts = await profiler.profile(0.2, interval=0.002)
+        await task
+
+        hot = [stack for stack in counts if "_burn_cpu" in stack]
+        assert hot
+        assert all(stack.startswith("/api/v1/chat/stream trace=") for stack in hot)
+
+    @pytest.mark.asyncio
+    async def test_samples_labelled_without_task_context(self):
+        """Test labelling through the task label map used before Python 3.12."""
+        with patch("app.core.tracing._task_labels", weakref.WeakKeyDictionary()):
+            profiler = SamplingProfiler()
+            task = asyncio.create_task(_busy_request(0.3))
+            counts = await profiler.profile(0.2, interval=0.002)
+            await task
+
+        hot = [stack for stack in counts if "_burn_cpu" in stack]
+        assert hot
+        assert all(stack.startswith("/api/v1/chat/stream trace=") for stack in hot)
+
+    @pytest.mark.asyncio
+    async def test_idle_loop_labelled_idle(self):
+        """Test that samples with no running task are labelled idle."""
+        counts = await SamplingProfiler().profile(0.05, interval=0.002)
+
+        assert counts
+        assert all(stack.split(";", 1)[0] == "idle" for stack in counts)
+
+    @pytest.mark.asyncio
+    async def test_one_profile_at_a_time(self):
+        """Test that a second concurrent profile is refused."""
+        profiler = SamplingProfiler()
+        first = asyncio.create_task(profiler.profile(0.1))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(ProfilerBusyError):
+            await profiler.profile(0.1)
+        await first
+
+    def test_format_collapsed_hottest_first(self):
+        """Test the collapsed-stack text format."""
+        counts = Counter({"idle;select": 3, "task;main;work": 7})
+
+        assert format_collapsed(counts) == "task;main;work 7\nidle;select 3\n"
+
+
+class TestProfileEndpoint:
+    """Test cases for /api/v1/admin/profile."""
+
+    def test_requires_admin(self, client, mock_api_key):
+        """Test that authenticated non-admins get 403."""
+        response = client.get(
+            "/api/v1/admin/profile?seconds=0.05", headers={"X-API-Key": mock_api_key}
+        )
+
+        assert response.status_code == 403
+
+    def test_requires_authentication(self, client):
+        """Test that anonymous callers get 401."""
+        assert client.get("/api/v1/admin/profile?seconds=0.05").status_code == 401
+
+    def test_admin_gets_collapsed_stacks(self, client, mock_api_key):
+        """Test that admins receive collapsed stacks from the serving worker."""
+        with patch("app.core.auth.settings.ADMIN_USER_IDS", ["user1"]):
+            response = client.get(
+                "/api/v1/admin/profile?seconds=0.05&interval_ms=2",
+                headers={"X-API-Key": mock_api_key},
+            )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "X-Worker-PID" in response.headers
+        line = response.text.splitlines()[0]
+        assert int(line.rsplit(" ", 1)[1]) > 0
+
+    def test_duration_capped(self, client, mock_api_key):
+        """Test that overly long profiles are rejected."""
+        with patch("app.core.auth.settings.ADMIN_USER_IDS", ["user1"]):
+            response = client.get(
+                "/api/v1/admin/profile?seconds=3600", headers={"X-API-Key": mock_api_key}
+            )
+
+        assert response.status_code == 422
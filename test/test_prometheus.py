@@ -0,0 +1,155 @@
+"""
+Unit tests for the Prometheus metrics endpoint and multiprocess aggregation.
+"""
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+
+from prometheus_client import REGISTRY, CollectorRegistry
+from prometheus_client.mmap_dict import MmapedDict, mmap_key
+from prometheus_client.multiprocess import MultiProcessCollector
+
+from app.core.prometheus import archive_dead_worker
+
+WORKER_SCRIPT = """
+from app.core.prometheus import HTTP_REQUESTS, RATE_LIMIT_REJECTIONS
+for _ in range({n}):
+    HTTP_REQUESTS.labels("GET", "/api/v1/health", "200").inc()
+RATE_LIMIT_REJECTIONS.labels("minute").inc()
+"""
+
+
+def _run_worker(metrics_dir, n: int) -> None:
+    """Record metrics from a separate process, as a gunicorn worker would."""
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(metrics_dir)}
+    subprocess.run([sys.executable, "-c", WORKER_SCRIPT.format(n=n)], env=env, check=True)
+
+
+def _aggregate(metrics_dir, name: str, labels: dict) -> float | None:
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry, str(metrics_dir))
+    return registry.get_sample_value(name, labels)
+
+
+def _write_counter(metrics_dir, pid: int, value: float) -> None:
+    key = mmap_key("jobs_total", "jobs_total", [], [], "Jobs")
+    counter = MmapedDict(os.path.join(metrics_dir, f"counter_{pid}.db"))
+    counter.write_value(key, value, 0.0)
+    counter.close()
+
+
+class TestMetricsEndpoint:
+    """Test cases for the /metrics scrape endpoint."""
+
+    def test_request_metrics_exposed(self, client):
+        """Test that requests show up in the exposition output."""
+        client.get("/api/v1/ready")
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'http_requests_total{method="GET",route="/api/v1/ready",status="200"}' in (
+            response.text
+        )
+
+    def test_unmatched_paths_share_label(self, client):
+        """Test that 404s are not labelled with the requested path."""
+        client.get("/no/such/path/12345")
+
+        assert "/no/such/path/12345" not in client.get("/metrics").text
+
+    def test_requests_labelled_by_route_template(self, client):
+        """Test that requests rejected before routing are labelled by route, not path."""
+        from app.core.key_store import KeyPlan, KeyRecord, hash_api_key
+
+        record = KeyRecord(hash_api_key("k"), "health-only", KeyPlan("h", 60, 1000, None, ("/x",)))
+        store = type("Store", (), {"lookup": lambda self, key: record})()
+        with patch("app.core.api_key_auth.get_key_store", return_value=store):
+            assert client.get("/api/v1/admin/usage", headers={"X-API-Key": "k"}).status_code == 403
+            client.get("/api/v1/no-such-route-67890", headers={"X-API-Key": "k"})
+
+        text = client.get("/metrics").text
+        assert 'route="/api/v1/admin/usage",status="403"' in text
+        assert "no-such-route-67890" not in text
+
+    def test_path_parameters_templated(self):
+        """Test that path parameter values do not become label values."""
+        from fastapi import APIRouter, FastAPI
+        from fastapi.testclient import TestClient
+
+        from app.middleware.tracing import TracingMiddleware
+
+        router = APIRouter(prefix="/items")
+
+        @router.get("/{item_id}")
+        async def get_item(item_id: int):
+            return {"id": item_id}
+
+        app = FastAPI()
+        app.include_router(router, prefix="/v1")
+        app.add_middleware(TracingMiddleware)
+        TestClient(app).get("/v1/items/424242")
+
+        labels = {"method": "GET", "route": "/v1/items/{item_id}", "status": "200"}
+        assert REGISTRY.get_sample_value("http_requests_total", labels) >= 1
+
+    def test_plain_asgi_app_unmatched(self):
+        """Test that requests to an app without a router are counted as unmatched."""
+        from fastapi.testclient import TestClient
+        from starlette.responses import PlainTextResponse
+
+        from app.middleware.tracing import TracingMiddleware
+
+        labels = {"method": "GET", "route": "unmatched", "status": "200"}
+        before = REGISTRY.get_sample_value("http_requests_total", labels) or 0
+
+        TestClient(TracingMiddleware(PlainTextResponse("ok"))).get("/anything")
+
+        assert REGISTRY.get_sample_value("http_requests_total", labels) == before + 1
+
+    def test_auth_failures_counted(self, client):
+        """Test that failed API key authentication is counted."""
+        labels = {"method": "api_key", "outcome": "failure"}
+        before = REGISTRY.get_sample_value("auth_attempts_total", labels) or 0
+
+        client.post(
+            "/api/v1/chat/stream",
+            headers={"X-API-Key": "invalid-key"},
+            json={"messages": [{"role": "user", "content": "hi"}]},
+        )
+
+        assert REGISTRY.get_sample_value("auth_attempts_total", labels) == before + 1
+
+
+class TestMultiprocessAggregation:
+    """Test cases for aggregating worker metric files."""
+
+    def test_workers_aggregated(self, tmp_path):
+        """Test that counters from separate worker processes are summed."""
+        _run_worker(tmp_path, 3)
+        _run_worker(tmp_path, 4)
+
+        labels = {"method": "GET", "route": "/api/v1/health", "status": "200"}
+        assert _aggregate(tmp_path, "http_requests_total", labels) == 7
+        assert _aggregate(tmp_path, "rate_limit_rejections_total", {"limit": "minute"}) == 2
+
+    def test_dead_workers_archived(self, tmp_path):
+        """Test that dead workers' files are folded into the archive."""
+        for pid, value in ((101, 5), (102, 7), (103, 11)):
+            _write_counter(tmp_path, pid, value)
+        (tmp_path / "gauge_livesum_101.db").write_bytes(b"")
+
+        archive_dead_worker(101, str(tmp_path))
+        archive_dead_worker(102, str(tmp_path))
+
+        assert sorted(os.listdir(tmp_path)) == ["counter_103.db", "counter_archive.db"]
+        assert _aggregate(tmp_path, "jobs_total", {}) == 23
+
+    def test_archive_of_unknown_worker_is_noop(self, tmp_path):
+        """Test that archiving a worker without files does nothing."""
+        _write_counter(tmp_path, 103, 1)
+
+        archive_dead_worker(999, str(tmp_path))
+
+        assert os.listdir(tmp_path) == ["counter_103.db"]
@@ -0,0 +1,217 @@
+"""
+Unit tests for lease-based approximate rate limiting.
+"""
+import asyncio
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+from fastapi import HTTPException, Request
+from prometheus_client import REGISTRY
+from starlette.responses import Response
+
+from app.core.rate_lease import InMemoryQuotaStore, LeaseRateLimiter
+from app.middleware.rate_limit import RateLimitMiddleware
+
+NOW = 1_700_000_010.0
+
+
+class FailingStore:
+    async def acquire(self, key, amount, limit, window):
+        raise ConnectionError("store unavailable")
+
+    async def release(self, returns):
+        raise ConnectionError("store unavailable")
+
+
+class SlowStore(InMemoryQuotaStore):
+    """In-memory store whose grants take a moment, like a network round trip."""
+
+    def __init__(self):
+        super().__init__()
+        self.acquires = 0
+
+    async def acquire(self, key, amount, limit, window):
+        self.acquires += 1
+        await asyncio.sleep(0.01)
+        return await super().acquire(key, amount, limit, window)
+
+
+class TestLeaseRateLimiter:
+    """Test cases for the lease limiter."""
+
+    @pytest.mark.asyncio
+    async def test_requests_served_from_lease(self):
+        """Test that only the first request of a lease reaches the store."""
+        limiter = LeaseRateLimiter(InMemoryQuotaStore(), lease_fraction=0.5, sync_interval=60)
+
+        results = [await limiter.hit("user:a", 10, 60, NOW) for _ in range(5)]
+
+        assert all(allowed for allowed, _, _ in results)
+        assert [count for _, count, _ in results] == [1, 2, 3, 4, 5]
+        assert limiter.lease_misses == 1
+        assert limiter.lease_hits == 4
+
+    @pytest.mark.asyncio
+    async def test_workers_share_central_quota(self):
+        """Test that two workers cannot admit more than the limit together."""
+        store = InMemoryQuotaStore()
+        workers = [LeaseRateLimiter(store, lease_fraction=0.3, sync_interval=60) for _ in range(2)]
+
+        admitted = 0
+        for _ in range(10):
+            for worker in workers:
+                allowed, _, _ = await worker.hit("user:a", 10, 60, NOW)
+                admitted += allowed
+
+        assert admitted == 10
+        assert sum(worker.denied for worker in workers) == 10
+
+    @pytest.mark.asyncio
+    async def test_sync_returns_unused_tokens(self):
+        """Test that unused lease tokens go back to the central store."""
+        store = InMemoryQuotaStore()
+        first = LeaseRateLimiter(store, lease_fraction=1.0, sync_interval=60)
+        second = LeaseRateLimiter(store, lease_fraction=1.0, sync_interval=60)
+        await first.hit("user:a", 10, 3600)
+
+        allowed, _, _ = await second.hit("user:a", 10, 3600)
+        assert allowed is False
+
+        await first.sync()
+        assert first.returned_tokens == 9
+        allowed, _, _ = await second.hit("user:a", 10, 3600)
+        assert allowed is True
+
+    @pytest.mark.asyncio
+    async def test_new_window_takes_new_lease(self):
+        """Test that a lease does not carry over into the next window."""
+        limiter = LeaseRateLimiter(InMemoryQuotaStore(), lease_fraction=1.0, sync_interval=60)
+        await limiter.hit("user:a", 10, 60, NOW)
+        _, count, reset = await limiter.hit("user:a", 10, 60, NOW + 60)
+
+        assert limiter.lease_misses == 2
+        assert count == 1
+        assert reset > NOW + 60
+
+    @pytest.mark.asyncio
+    async def test_store_failure_fails_open(self):
+        """Test that store errors admit requests and count them as failed open."""
+        limiter = LeaseRateLimiter(FailingStore(), sync_interval=60)
+        before = REGISTRY.get_sample_value("rate_limit_lease_fail_open_total") or 0
+
+        allowed, _, _ = await limiter.hit("user:a", 10, 60, NOW)
+
+        assert allowed is True
+        stats = limiter.stats()
+        assert stats["failed_open"] == 1
+        assert stats["store_errors"] == 1
+        assert REGISTRY.get_sample_value("rate_limit_lease_fail_open_total") == before + 1
+
+    @pytest.mark.asyncio
+    async def test_unspent_tokens_of_past_windows_stranded(self):
+        """Test that tokens left in a lease when its window ends are counted as stranded."""
+        limiter = LeaseRateLimiter(InMemoryQuotaStore(), lease_fraction=0.5, sync_interval=60)
+        before = REGISTRY.get_sample_value("rate_limit_lease_stranded_tokens_total") or 0
+        await limiter.hit("user:a", 10, 60, NOW)
+        await limiter.hit("user:b", 10, 60, NOW)
+
+        # user:a refills in the next window; user:b's lease is dropped by sync
+        await limiter.hit("user:a", 10, 60, NOW + 60)
+        with patch("app.core.rate_lease.time.time", return_value=NOW + 120):
+            await limiter.sync()
+
+        assert limiter.stranded_tokens == 4 + 4 + 4
+        assert limiter.returned_tokens == 0
+        assert REGISTRY.get_sample_value("rate_limit_lease_stranded_tokens_total") == before + 12
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_refill(self):
+        """Test that concurrent misses on a key take a single lease and leak no quota."""
+        store = SlowStore()
+        limiter = LeaseRateLimiter(store, lease_fraction=0.5, sync_interval=60)
+
+        results = await asyncio.gather(*(limiter.hit("user:a", 10, 3600) for _ in range(5)))
+
+        assert all(allowed for allowed, _, _ in results)
+        assert store.acquires == 1
+        await limiter.sync()
+        assert limiter.returned_tokens == 0
+        assert store._used[next(iter(store._used))][0] == 5
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_denial(self):
+        """Test that requests waiting on a denied refill are denied without another grant."""
+        store = SlowStore()
+        limiter = LeaseRateLimiter(store, lease_fraction=1.0, sync_interval=60)
+        await store.acquire("rl:user:a:0", 10, 10, 3600)
+
+        results = await asyncio.gather(*(limiter.hit("user:a", 10, 3600, 1.0) for _ in range(3)))
+
+        assert not any(allowed for allowed, _, _ in results)
+        assert store.acquires == 2
+        assert limiter.denied == 3
+
+    @pytest.mark.asyncio
+    async def test_in_memory_store_prunes_past_windows(self):
+        """Test that counters of finished windows do not accumulate."""
+        store = InMemoryQuotaStore(prune_interval=0)
+        await store.acquire("rl:user:a:1", 1, 10, 60)
+        store._used["rl:user:a:1"] = (1, time.time() - 1)
+
+        await store.acquire("rl:user:a:2", 1, 10, 60)
+
+        assert list(store._used) == ["rl:user:a:2"]
+
+    @pytest.mark.asyncio
+    async def test_stats_hit_rate(self):
+        """Test lease hit rate reporting."""
+        limiter = LeaseRateLimiter(InMemoryQuotaStore(), lease_fraction=0.4, sync_interval=60)
+        for _ in range(4):
+            await limiter.hit("user:a", 10, 60, NOW)
+
+        assert limiter.stats()["lease_hit_rate"] == 0.75
+
+    @pytest.mark.asyncio
+    async def test_lookups_exported(self):
+        """Test that lease hits and misses are exported to Prometheus."""
+        limiter = LeaseRateLimiter(InMemoryQuotaStore(), lease_fraction=0.4, sync_interval=60)
+        hits, misses = (
+            REGISTRY.get_sample_value("rate_limit_lease_lookups_total", {"outcome": o}) or 0
+            for o in ("hit", "miss")
+        )
+        for _ in range(4):
+            await limiter.hit("user:a", 10, 60, NOW)
+
+        sample = REGISTRY.get_sample_value
+        assert sample("rate_limit_lease_lookups_total", {"outcome": "hit"}) == hits + 3
+        assert sample("rate_limit_lease_lookups_total", {"outcome": "miss"}) == misses + 1
+
+
+class TestRateLimitMiddlewareLeaseMode:
+    """Test cases for the middleware in lease mode."""
+
+    @pytest.mark.asyncio
+    async def test_lease_mode_enforces_limit(self):
+        """Test that the middleware rejects requests once the lease store is exhausted."""
+        from app.core.config import settings
+
+        request = Mock(spec=Request)
+        request.url.path = "/api/v1/chat/stream"
+        request.state.user_id = "lease-user"
+
+        async def call_next(request):
+            return Response(content="OK", status_code=200)
+
+        limiter = LeaseRateLimiter(InMemoryQuotaStore(), lease_fraction=0.5, sync_interval=60)
+        middleware = RateLimitMiddleware(app=Mock())
+        with patch.object(settings, "RATE_LIMIT_MODE", "lease"), patch(
+            "app.middleware.rate_limit.get_lease_limiter", return_value=limiter
+        ):
+            for _ in range(settings.RATE_LIMIT_PER_MINUTE):
+                response = await middleware.dispatch(request, call_next)
+                assert response.status_code == 200
+            with pytest.raises(HTTPException) as exc_info:
+                await middleware.dispatch(request, call_next)
+
+        assert exc_info.value.status_code == 429
@@ -136,3 +136,23 @@ class TestRateLimitMiddleware:
         assert "X-RateLimit-Limit-Hour" in response.headers
         assert "X-RateLimit-Remaining-Minute" in response.headers
         assert "X-RateLimit-Remaining-Hour" in response.headers
+
+
+class TestRateLimitStorage:
+    """Test cases for the in-process counter storage."""
+
+    def test_expired_windows_pruned(self):
+        """Test that windows that have ended are swept out of storage."""
+        from app.middleware import rate_limit
+
+        rate_limit.limiter.storage = {}
+        now = time.time()
+        with patch.object(rate_limit, "_next_prune", now + 3600):
+            for n in range(100):
+                rate_limit._consume(f"10.0.0.{n}:minute", 60, 60, now)
+
+        with patch.object(rate_limit, "_next_prune", 0.0):
+            rate_limit._consume("10.0.1.1:minute", 60, 60, now + 61)
+
+            assert list(rate_limit.limiter.storage) == ["10.0.1.1:minute"]
+            assert rate_limit._next_prune == now + 61 + rate_limit.STORAGE_PRUNE_INTERVAL
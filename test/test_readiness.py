@@ -0,0 +1,136 @@
+"""
+Unit tests for the readiness registry and the /ready endpoint.
+"""
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app.core import readiness as readiness_module
+from app.core.readiness import ReadinessRegistry
+
+
+class Probe:
+    """Probe that counts calls and fails, hangs or passes on demand."""
+
+    def __init__(self, error: Exception | None = None, delay: float = 0.0):
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self) -> None:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+
+
+class TestReadinessRegistry:
+    """Test cases for probe scheduling, caching and aggregation."""
+
+    @pytest.mark.asyncio
+    async def test_report_served_from_cache(self):
+        """Test that reports do not run probes while the refresher is running."""
+        probe = Probe()
+        registry = ReadinessRegistry(interval=60)
+        registry.register("db", probe)
+
+        await registry.start()
+        try:
+            for _ in range(10):
+                report = await registry.report()
+        finally:
+            await registry.stop()
+
+        assert probe.calls == 1
+        assert report["status"] == "ready"
+        assert report["checks"]["db"]["status"] == "ok"
+        assert report["checks"]["db"]["latency_ms"] >= 0
+
+    @pytest.mark.asyncio
+    async def test_refreshed_in_background(self):
+        """Test that probes rerun every interval."""
+        probe = Probe()
+        registry = ReadinessRegistry(interval=0.01)
+        registry.register("db", probe)
+
+        await registry.start()
+        await asyncio.sleep(0.1)
+        await registry.stop()
+
+        assert probe.calls > 2
+
+    @pytest.mark.asyncio
+    async def test_timeout_fails_critical_probe(self):
+        """Test that a hung critical probe is reported as a timeout and not ready."""
+        registry = ReadinessRegistry(timeout=0.01)
+        registry.register("redis", Probe(delay=1.0))
+
+        report = await registry.report()
+
+        assert report["status"] == "not_ready"
+        assert report["checks"]["redis"]["status"] == "timeout"
+
+    @pytest.mark.asyncio
+    async def test_non_critical_failure_degrades(self):
+        """Test that failing non-critical probes keep the worker ready but degraded."""
+        registry = ReadinessRegistry()
+        registry.register("db", Probe())
+        registry.register("jwks", Probe(error=ConnectionError("refused")), critical=False)
+
+        report = await registry.report()
+
+        assert report["status"] == "degraded"
+        assert report["checks"]["jwks"]["error"] == "ConnectionError: refused"
+
+    @pytest.mark.asyncio
+    async def test_stale_results_not_ready(self):
+        """Test that results older than stale_after count as failing."""
+        registry = ReadinessRegistry(interval=60, stale_after=0.0)
+        registry.register("db", Probe())
+        await registry.start()
+        await registry.stop()
+        registry._task = object()  # refresher "stuck"
+
+        report = await registry.report()
+
+        assert report["status"] == "not_ready"
+        assert report["checks"]["db"]["status"] == "stale"
+
+
+class TestReadyEndpoint:
+    """Test cases for GET /api/v1/ready."""
+
+    @pytest.fixture
+    def registry(self):
+        registry = ReadinessRegistry()
+        with patch.object(readiness_module, "_readiness", registry):
+            yield registry
+
+    def test_ready(self, client, registry):
+        """Test that a passing worker reports each check with its latency."""
+        registry.register("database", Probe())
+
+        response = client.get("/api/v1/ready")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "ready"
+        assert set(data["checks"]["database"]) == {"status", "critical", "latency_ms", "age_s"}
+
+    def test_critical_failure_returns_503(self, client, registry):
+        """Test that a failing critical dependency takes the worker out of rotation."""
+        registry.register("database", Probe(error=RuntimeError("down")))
+
+        response = client.get("/api/v1/ready")
+
+        assert response.status_code == 503
+        assert response.json()["status"] == "not_ready"
+
+    def test_default_probes(self):
+        """Test that the default registry probes the database and model backend."""
+        with patch.object(readiness_module, "_readiness", None):
+            registry = readiness_module.get_readiness()
+
+        assert {"database", "llm_backend"} <= set(registry._probes)
+        assert registry._probes["database"].critical
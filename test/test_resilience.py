@@ -0,0 +1,59 @@
+"""
+Unit tests for the circuit breaker and retry budget.
+"""
+from app.core.resilience import CircuitBreaker, RetryBudget
+
+
+class TestCircuitBreaker:
+    """Test cases for the circuit breaker."""
+
+    def test_opens_after_threshold(self):
+        """Test that consecutive failures open the circuit."""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        assert breaker.allow() is True
+        breaker.record_failure()
+
+        assert breaker.state == "open"
+        assert breaker.allow() is False
+
+    def test_half_open_allows_single_trial(self):
+        """Test that one trial call is allowed after the reset timeout."""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+
+        assert breaker.allow() is True
+        assert breaker.allow() is False
+        breaker.record_success()
+        assert breaker.state == "closed"
+
+    def test_release_frees_trial(self):
+        """Test that a trial ended without an outcome lets another trial through."""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+
+        assert breaker.allow() is True
+        breaker.release()
+        assert breaker.allow() is True
+
+
+class TestRetryBudget:
+    """Test cases for the retry budget."""
+
+    def test_budget_exhausts(self):
+        """Test that retries stop once the balance is spent."""
+        budget = RetryBudget(ratio=0.1, min_per_second=0, max_balance=2)
+
+        assert budget.try_spend() is True
+        assert budget.try_spend() is True
+        assert budget.try_spend() is False
+
+    def test_requests_earn_retries(self):
+        """Test that traffic deposits retry budget at the configured ratio."""
+        budget = RetryBudget(ratio=0.5, min_per_second=0, max_balance=1)
+        budget.try_spend()
+
+        budget.record_request()
+        assert budget.try_spend() is False
+        budget.record_request()
+        assert budget.try_spend() is True
@@ -0,0 +1,224 @@
+"""
+Unit tests for the lifespan resource registry and the OAuth code exchange.
+"""
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.core.oauth import exchange_code_for_token
+from app.core.resilience import RetryBudget
+from app.core.resources import ResourceRegistry, resources
+
+
+class FakeResource:
+    def __init__(self, name, events):
+        self.name = name
+        self.events = events
+        events.append(f"create:{name}")
+
+
+class TestResourceRegistry:
+    """Test cases for the resource registry."""
+
+    @pytest.mark.asyncio
+    async def test_startup_warms_and_shutdown_closes_in_reverse(self):
+        """Test the lifecycle order of registered resources."""
+        events = []
+        registry = ResourceRegistry()
+
+        async def warmup(resource):
+            events.append(f"warm:{resource.name}")
+
+        async def close(resource):
+            events.append(f"close:{resource.name}")
+
+        for name in ("a", "b"):
+            registry.register(
+                name, lambda name=name: FakeResource(name, events), warmup=warmup, close=close
+            )
+
+        await registry.startup()
+        await registry.shutdown()
+
+        assert events == ["create:a", "warm:a", "create:b", "warm:b", "close:b", "close:a"]
+
+    def test_get_creates_once(self):
+        """Test that resources are created lazily and reused."""
+        events = []
+        registry = ResourceRegistry()
+        registry.register("a", lambda: FakeResource("a", events))
+
+        assert registry.get("a") is registry.get("a")
+        assert events == ["create:a"]
+
+    @pytest.mark.asyncio
+    async def test_failed_warmup_is_not_fatal(self):
+        """Test that a warmup error leaves the resource usable."""
+        registry = ResourceRegistry()
+
+        async def warmup(resource):
+            raise ConnectionError("provider down")
+
+        registry.register("a", lambda: FakeResource("a", []), warmup=warmup)
+
+        await registry.startup()
+        assert registry.get("a").name == "a"
+
+    @pytest.mark.asyncio
+    async def test_failed_start_is_fatal(self):
+        """Test that a failed start hook fails startup and closes what was created."""
+        events = []
+        registry = ResourceRegistry()
+
+        async def start(resource):
+            if resource.name == "b":
+                raise ConnectionError("database down")
+            events.append(f"start:{resource.name}")
+
+        async def close(resource):
+            events.append(f"close:{resource.name}")
+
+        for name in ("a", "b", "c"):
+            registry.register(
+                name, lambda name=name: FakeResource(name, events), start=start, close=close
+            )
+
+        with pytest.raises(ConnectionError, match="database down"):
+            await registry.startup()
+
+        assert events == ["create:a", "start:a", "create:b", "close:b", "close:a"]
+        assert registry._instances == {}
+
+    def test_lifespan_runs_with_app(self):
+        """Test that the application lifespan starts and stops the registry."""
+        from fastapi.testclient import TestClient
+
+        from app.main import app
+
+        with patch.object(resources, "startup") as startup, patch.object(
+            resources, "shutdown"
+        ) as shutdown:
+            with TestClient(app):
+                startup.assert_awaited_once()
+            shutdown.assert_awaited_once()
+
+
+class TokenServer:
+    """Local stand-in for the provider's token endpoint."""
+
+    def __init__(self, *statuses: int):
+        self.statuses = list(statuses)
+        self.requests = []
+        self.body = {"access_token": "real-token", "token_type": "Bearer", "expires_in": 600}
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(dict(httpx.QueryParams(request.content.decode())))
+        status_code = self.statuses.pop(0) if self.statuses else 200
+        if status_code != 200:
+            return httpx.Response(status_code, json={"error": "failed"})
+        return httpx.Response(200, json=self.body)
+
+
+@pytest.fixture
+def token_server():
+    """Route the shared OAuth client to a stand-in token endpoint."""
+
+    def install(*statuses):
+        server = TokenServer(*statuses)
+        client = httpx.AsyncClient(transport=httpx.MockTransport(server.handler))
+        resources.override("oauth_http", client)
+        return server
+
+    with patch("app.core.oauth._token_retry_budget", RetryBudget(max_balance=10)), patch(
+        "app.core.oauth.asyncio.sleep"
+    ):
+        yield install
+    resources._instances.pop("oauth_http", None)
+
+
+class TestCodeExchange:
+    """Test cases for exchanging an authorization code."""
+
+    @pytest.mark.asyncio
+    async def test_exchange_success(self, token_server):
+        """Test a successful code exchange."""
+        server = token_server()
+
+        token = await exchange_code_for_token("code-1")
+
+        assert token["access_token"] == "real-token"
+        assert server.requests[0]["grant_type"] == "authorization_code"
+        assert server.requests[0]["code"] == "code-1"
+
+    @pytest.mark.asyncio
+    async def test_exchange_retries_server_errors(self, token_server):
+        """Test that 5xx responses are retried."""
+        server = token_server(503, 502)
+
+        token = await exchange_code_for_token("code-1")
+
+        assert token["access_token"] == "real-token"
+        assert len(server.requests) == 3
+
+    @pytest.mark.asyncio
+    async def test_exchange_does_not_retry_rejected_code(self, token_server):
+        """Test that a rejected code fails immediately with 400."""
+        server = token_server(400)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await exchange_code_for_token("bad-code")
+
+        assert exc_info.value.status_code == 400
+        assert len(server.requests) == 1
+
+    @pytest.mark.asyncio
+    async def test_exchange_stops_when_budget_spent(self, token_server):
+        """Test that an empty retry budget prevents retries."""
+        server = token_server(503, 503)
+
+        with patch(
+            "app.core.oauth._token_retry_budget", RetryBudget(min_per_second=0, max_balance=0)
+        ):
+            with pytest.raises(HTTPException) as exc_info:
+                await exchange_code_for_token("code-1")
+
+        assert exc_info.value.status_code == 502
+        assert len(server.requests) == 1
+
+    def test_callback_uses_exchange_outside_demo_mode(self, client, token_server):
+        """Test that the callback returns the provider's token in production mode."""
+        token_server()
+
+        with patch("app.api.v1.auth.is_demo_mode", return_value=False):
+            response = client.get("/api/v1/auth/callback?code=code-1")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["access_token"] == "real-token"
+        assert data["token_type"] == "bearer"
+        assert data["expires_in"] == 600
+
+    @pytest.mark.parametrize(
+        "body",
+        [
+            {"access_token": "real-token", "token_type": None},
+            {"access_token": None},
+            {"token_type": "bearer"},
+            {"access_token": "real-token", "expires_in": "soon"},
+            ["real-token"],
+            "real-token",
+        ],
+    )
+    def test_callback_rejects_malformed_token_response(self, client, token_server, body):
+        """Test that a malformed token response is a 502, not a 500."""
+        server = token_server()
+        server.body = body
+
+        with patch("app.api.v1.auth.is_demo_mode", return_value=False):
+            response = client.get("/api/v1/auth/callback?code=code-1")
+
+        assert response.status_code == 502
+        assert response.json()["detail"] == "OAuth provider returned an invalid token response"
+        assert len(server.requests) == 1
@@ -0,0 +1,174 @@
+"""
+Unit tests for the shared-memory rate limit counter table.
+"""
+import multiprocessing
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+from fastapi import HTTPException, Request
+from starlette.responses import Response
+
+from app.core.shm_counters import SharedCounterTable
+from app.middleware.rate_limit import RateLimitMiddleware
+
+
+def _hit_many(table, key, n):
+    for _ in range(n):
+        table.hit(key, limit=10_000, window=60)
+
+
+class TestSharedCounterTable:
+    """Test cases for the shared counter table."""
+
+    def test_hit_counts_within_window(self):
+        """Test that hits accumulate until the limit is reached."""
+        table = SharedCounterTable(slots=64)
+        now = time.time()
+
+        assert table.hit("user:a", limit=2, window=60, now=now) == (True, 1, now + 60)
+        assert table.hit("user:a", limit=2, window=60, now=now)[:2] == (True, 2)
+        allowed, count, _ = table.hit("user:a", limit=2, window=60, now=now)
+        assert allowed is False
+        assert count == 2
+
+    def test_window_resets(self):
+        """Test that an expired window starts counting again."""
+        table = SharedCounterTable(slots=64)
+        now = time.time()
+        table.hit("user:a", limit=1, window=60, now=now)
+
+        allowed, count, reset = table.hit("user:a", limit=1, window=60, now=now + 61)
+        assert allowed is True
+        assert count == 1
+        assert reset == now + 121
+
+    def test_keys_are_independent(self):
+        """Test that different keys do not share counters."""
+        table = SharedCounterTable(slots=64)
+        table.hit("user:a", limit=5, window=60)
+        table.hit("user:a", limit=5, window=60)
+        table.hit("user:b", limit=5, window=60)
+
+        assert table.get("user:a")[0] == 2
+        assert table.get("user:b")[0] == 1
+        assert table.get("user:c") == (0, 0.0)
+
+    def test_full_table_fails_open(self):
+        """Test that a full table allows requests and records the overflow."""
+        table = SharedCounterTable(slots=2, max_probe=2)
+        now = time.time()
+        for i in range(2):
+            table.hit(f"user:{i}", limit=1, window=60, now=now)
+
+        allowed, _, _ = table.hit("user:overflow", limit=1, window=60, now=now)
+        assert allowed is True
+        assert table.overflows == 1
+
+    def test_expired_slots_are_reused(self):
+        """Test that expired entries free their slot for new keys."""
+        table = SharedCounterTable(slots=2, max_probe=2)
+        now = time.time()
+        for i in range(2):
+            table.hit(f"user:{i}", limit=1, window=60, now=now)
+
+        allowed, count, _ = table.hit("user:new", limit=1, window=60, now=now + 61)
+        assert (allowed, count) == (True, 1)
+        assert table.overflows == 0
+
+    def test_stuck_lock_skipped_until_retry(self):
+        """Test that a lock held by a dead worker is waited on once, then skipped."""
+        table = SharedCounterTable(slots=64, lock_timeout=0.01, lock_retry_interval=60)
+        table._lock.acquire()
+
+        assert table.hit("user:a", limit=5, window=60) is None
+        start = time.monotonic()
+        assert table.hit("user:a", limit=5, window=60) is None
+        assert table.adjust("streams:a", 1, limit=5, ttl=60) is None
+        assert table.get("user:a") == (0, 0.0)
+        assert time.monotonic() - start < 0.01
+        assert table.lock_timeouts == 1
+
+        table._lock.release()
+        table._skip_until = 0.0
+        assert table.hit("user:a", limit=5, window=60)[:2] == (True, 1)
+
+    def test_clear_does_not_block_on_stuck_lock(self):
+        """Test that clear() gives up on a lock held by a dead worker instead of hanging."""
+        table = SharedCounterTable(slots=64, lock_timeout=0.01, lock_retry_interval=60)
+        table.hit("user:a", limit=5, window=60)
+        table._lock.acquire()
+
+        assert table.clear() is False
+        assert table.lock_timeouts == 1
+
+        table._lock.release()
+        table._skip_until = 0.0
+        assert table.clear() is True
+        assert table.get("user:a") == (0, 0.0)
+
+    def test_counters_shared_across_forked_processes(self):
+        """Test that forked workers update the same counters."""
+        ctx = multiprocessing.get_context("fork")
+        table = SharedCounterTable(slots=64)
+        workers = [ctx.Process(target=_hit_many, args=(table, "user:a", 50)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        assert table.get("user:a")[0] == 200
+
+
+class TestRateLimitWithSharedCounters:
+    """Test cases for the middleware using the shared table."""
+
+    @pytest.fixture
+    def mock_request(self):
+        request = Mock(spec=Request)
+        request.url.path = "/api/v1/chat/stream"
+        request.state.user_id = "user1"
+        return request
+
+    @pytest.mark.asyncio
+    async def test_middleware_uses_shared_table(self, mock_request):
+        """Test that the middleware enforces limits through the shared table."""
+        from app.core.config import settings
+
+        table = SharedCounterTable(slots=64)
+        for _ in range(settings.RATE_LIMIT_PER_MINUTE):
+            table.hit("user:user1:minute", limit=10_000, window=60)
+
+        async def call_next(request):
+            return Response(content="OK", status_code=200)
+
+        middleware = RateLimitMiddleware(app=Mock())
+        with (
+            patch("app.middleware.rate_limit.get_shared_counters", return_value=table),
+            patch.object(settings, "RATE_LIMIT_SHARED_MEMORY", True),
+        ):
+            with pytest.raises(HTTPException) as exc_info:
+                await middleware.dispatch(mock_request, call_next)
+        assert exc_info.value.status_code == 429
+
+    @pytest.mark.asyncio
+    async def test_stuck_lock_falls_back_to_worker_storage(self, mock_request):
+        """Test that limits are still counted per worker while the table lock is stuck."""
+        table = SharedCounterTable(slots=64, lock_timeout=0.01)
+        table._lock.acquire()
+
+        async def call_next(request):
+            return Response(content="OK", status_code=200)
+
+        middleware = RateLimitMiddleware(app=Mock())
+        with (
+            patch("app.middleware.rate_limit.get_shared_counters", return_value=table),
+            patch("app.middleware.rate_limit.settings.RATE_LIMIT_SHARED_MEMORY", True),
+            patch("app.middleware.rate_limit.settings.RATE_LIMIT_PER_MINUTE", 1),
+            patch("app.middleware.rate_limit.get_limiter", return_value=Mock(storage={})),
+        ):
+            await middleware.dispatch(mock_request, call_next)
+            with pytest.raises(HTTPException) as exc_info:
+                await middleware.dispatch(mock_request, call_next)
+        assert exc_info.value.status_code == 429
+        assert table.lock_timeouts == 1
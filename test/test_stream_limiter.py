@@ -0,0 +1,120 @@
+"""
+Unit tests for the concurrent stream limiter.
+"""
+from unittest.mock import patch
+
+from app.core import stream_limiter
+from app.core.shm_counters import SharedCounterTable
+from app.core.stream_limiter import StreamConcurrencyLimiter
+
+
+class TestStreamConcurrencyLimiter:
+    """Test cases for the per-worker stream limiter."""
+
+    def test_acquire_up_to_cap(self):
+        """Test that slots are granted until the cap is reached."""
+        limiter = StreamConcurrencyLimiter(max_streams=2)
+
+        assert limiter.try_acquire("user:a") is not None
+        assert limiter.try_acquire("user:a") is not None
+        assert limiter.try_acquire("user:a") is None
+        assert limiter.try_acquire("user:b") is not None
+
+    def test_release_frees_slot(self):
+        """Test that releasing a slot allows a new stream."""
+        limiter = StreamConcurrencyLimiter(max_streams=1)
+        slot = limiter.try_acquire("user:a")
+        slot.release()
+
+        assert limiter.open_streams("user:a") == 0
+        assert limiter.try_acquire("user:a") is not None
+
+    def test_double_release_is_noop(self):
+        """Test that a slot released twice only frees one stream."""
+        limiter = StreamConcurrencyLimiter(max_streams=2)
+        first = limiter.try_acquire("user:a")
+        limiter.try_acquire("user:a")
+
+        first.release()
+        first.release()
+
+        assert limiter.open_streams("user:a") == 1
+
+    def test_released_keys_are_dropped(self):
+        """Test that idle keys do not accumulate in memory."""
+        limiter = StreamConcurrencyLimiter(max_streams=1)
+        for i in range(100):
+            limiter.try_acquire(f"user:{i}").release()
+
+        assert limiter._open == {}
+
+    def test_node_wide_limit_shared_between_workers(self):
+        """Test that limiters sharing a table enforce one node-wide cap."""
+        table = SharedCounterTable(slots=64)
+        worker_a = StreamConcurrencyLimiter(max_streams=2, shared_table=table)
+        worker_b = StreamConcurrencyLimiter(max_streams=2, shared_table=table)
+
+        slot = worker_a.try_acquire("user:a")
+        assert worker_b.try_acquire("user:a") is not None
+        assert worker_b.try_acquire("user:a") is None
+
+        slot.release()
+        assert worker_b.try_acquire("user:a") is not None
+
+    def test_stuck_shared_lock_counts_per_worker(self):
+        """Test that a stuck shared table lock falls back to the worker's own cap."""
+        table = SharedCounterTable(slots=64, lock_timeout=0.01)
+        table._lock.acquire()
+        limiter = StreamConcurrencyLimiter(max_streams=1, shared_table=table)
+
+        slot = limiter.try_acquire("user:a")
+        assert slot is not None and not slot.shared
+        assert limiter.try_acquire("user:a") is None
+        slot.release()
+        assert limiter.open_streams("user:a") == 0
+
+    def test_shared_without_table_warns(self, caplog):
+        """Test that asking for node-wide counting without a table is logged."""
+        with (
+            patch.object(stream_limiter, "_stream_limiter", None),
+            patch.object(stream_limiter.settings, "STREAM_CONCURRENCY_SHARED", True),
+            patch.object(stream_limiter, "get_shared_counters", return_value=None),
+        ):
+            limiter = stream_limiter.get_stream_limiter()
+
+        assert limiter.shared_table is None
+        assert "counted per worker" in caplog.text
+
+
+class TestChatStreamConcurrency:
+    """Test cases for the concurrency limit on the chat stream endpoint."""
+
+    def test_over_cap_returns_429_with_retry_after(self, client, mock_api_key, mock_chat_request):
+        """Test that a user over the cap gets 429 with Retry-After."""
+        limiter = StreamConcurrencyLimiter(max_streams=1)
+        limiter.try_acquire("user:user1")
+
+        with patch("app.api.v1.chat.get_stream_limiter", return_value=limiter):
+            response = client.post(
+                "/api/v1/chat/stream",
+                json=mock_chat_request,
+                headers={"X-API-Key": mock_api_key},
+            )
+
+        assert response.status_code == 429
+        assert "Retry-After" in response.headers
+
+    def test_slot_released_after_stream_completes(self, client, mock_api_key, mock_chat_request):
+        """Test that finishing a stream gives its slot back."""
+        limiter = StreamConcurrencyLimiter(max_streams=1)
+
+        with patch("app.api.v1.chat.get_stream_limiter", return_value=limiter):
+            for _ in range(2):
+                response = client.post(
+                    "/api/v1/chat/stream",
+                    json=mock_chat_request,
+                    headers={"X-API-Key": mock_api_key},
+                )
+                assert response.status_code == 200
+
+        assert limiter.open_streams() == 0
@@ -0,0 +1,249 @@
+"""
+Unit tests for trace context propagation, span recording and export.
+"""
+import json
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.core import tracing
+from app.core.trace_export import SpanExporter
+from app.core.tracing import (
+    SpanRecorder,
+    Trace,
+    current_traceparent,
+    format_traceparent,
+    generate_trace_id,
+    inject_trace_context,
+    parse_traceparent,
+    start_span,
+    start_trace,
+)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+@pytest.fixture
+def recorder():
+    """Fresh span ring buffer for the test."""
+    recorder = SpanRecorder(capacity=64)
+    with patch.object(tracing, "span_recorder", recorder):
+        yield recorder
+
+
+class TestTraceparent:
+    """Test cases for traceparent parsing and formatting."""
+
+    def test_parse_valid(self):
+        """Test that a valid header yields trace ID, parent ID and flag."""
+        assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (TRACE_ID, PARENT_ID, True)
+        assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-00")[2] is False
+
+    @pytest.mark.parametrize(
+        "value",
+        [
+            None,
+            "",
+            "garbage",
+            f"00-{'0' * 32}-{PARENT_ID}-01",
+            f"00-{TRACE_ID}-{'0' * 16}-01",
+            f"ff-{TRACE_ID}-{PARENT_ID}-01",
+            f"00-{TRACE_ID.upper()}-{PARENT_ID}-01",
+            f"00-{TRACE_ID}-{PARENT_ID}-01-extra",
+        ],
+    )
+    def test_parse_invalid(self, value):
+        """Test that invalid headers are ignored."""
+        assert parse_traceparent(value) is None
+
+    def test_round_trip(self):
+        """Test that formatted headers parse back."""
+        assert parse_traceparent(format_traceparent(TRACE_ID, PARENT_ID, True)) == (
+            TRACE_ID,
+            PARENT_ID,
+            True,
+        )
+
+    def test_generated_ids_are_w3c(self):
+        """Test that generated trace IDs are 32 hex characters and unique."""
+        ids = {generate_trace_id() for _ in range(1000)}
+        assert len(ids) == 1000
+        assert all(len(trace_id) == 32 and int(trace_id, 16) for trace_id in ids)
+
+
+class TestSpanRecorder:
+    """Test cases for the span ring buffer."""
+
+    def test_drain_in_order(self):
+        """Test that spans are drained oldest first in batches."""
+        recorder = SpanRecorder(capacity=8)
+        for i in range(5):
+            recorder.record((i,))
+
+        assert recorder.drain(3) == [(0,), (1,), (2,)]
+        assert recorder.drain(10) == [(3,), (4,)]
+        assert len(recorder) == 0
+
+    def test_overflow_overwrites_oldest(self):
+        """Test that a full buffer drops the oldest spans."""
+        recorder = SpanRecorder(capacity=4)
+        for i in range(6):
+            recorder.record((i,))
+
+        assert recorder.dropped == 2
+        assert recorder.drain(10) == [(2,), (3,), (4,), (5,)]
+
+
+class TestSampling:
+    """Test cases for head and tail sampling."""
+
+    def test_parent_decision_followed(self, recorder):
+        """Test that a sampled traceparent is recorded regardless of ratio."""
+        with patch.object(tracing.settings, "TRACE_SAMPLE_RATIO", 0.0):
+            trace = start_trace(f"00-{TRACE_ID}-{PARENT_ID}-01")
+        span = start_span("work")
+        span.end()
+
+        assert trace.sampled
+        assert recorder.drain(10)[0][:3] == (TRACE_ID, span.span_id, PARENT_ID)
+
+    def test_unsampled_fast_trace_dropped(self, recorder):
+        """Test that unsampled traces leave nothing behind when fast and healthy."""
+        with patch.object(tracing.settings, "TRACE_SAMPLE_RATIO", 0.0):
+            trace = start_trace()
+        start_span("work").end()
+        trace.finish(duration_ms=1)
+
+        assert len(recorder) == 0
+
+    def test_tail_keeps_slow_and_failed_traces(self, recorder):
+        """Test that slow or failed unsampled traces are kept."""
+        with patch.object(tracing.settings, "TRACE_SAMPLE_RATIO", 0.0):
+            slow = start_trace()
+            start_span("slow").end()
+            slow.finish(duration_ms=tracing.settings.TRACE_TAIL_LATENCY_MS + 1)
+
+            failed = start_trace()
+            start_span("failed").end()
+            failed.finish(duration_ms=1, error=True)
+
+        assert [record[3] for record in recorder.drain(10)] == ["slow", "failed"]
+
+    def test_spans_nest_under_active_span(self, recorder):
+        """Test that spans started after an activated span are its children."""
+        start_trace(f"00-{TRACE_ID}-{PARENT_ID}-01")
+        root = start_span("root", activate=True)
+        child = start_span("child")
+
+        assert child.parent_id == root.span_id
+        assert current_traceparent() == f"00-{TRACE_ID}-{root.span_id}-01"
+
+    def test_custom_trace_id_not_propagated(self, recorder):
+        """Test that a non-W3C X-Trace-Id is kept but not sent as traceparent."""
+        trace = start_trace(trace_id="my-trace-id")
+        start_span("root", activate=True)
+
+        assert trace.trace_id == "my-trace-id"
+        assert current_traceparent() is None
+
+
+class TestTracingMiddleware:
+    """Test cases for trace propagation through the app."""
+
+    def test_traceparent_continued(self, client):
+        """Test that the caller's trace ID is used and a traceparent returned."""
+        response = client.get(
+            "/api/v1/health", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"}
+        )
+
+        assert response.json()["trace_id"] == TRACE_ID
+        trace_id, span_id, sampled = parse_traceparent(response.headers["traceparent"])
+        assert trace_id == TRACE_ID
+        assert span_id != PARENT_ID
+        assert sampled
+
+    def test_x_trace_id_still_echoed(self, client):
+        """Test that X-Trace-Id keeps working without a traceparent."""
+        response = client.get("/api/v1/health", headers={"X-Trace-Id": "legacy-id"})
+
+        assert response.headers["X-Trace-Id"] == "legacy-id"
+        assert "traceparent" not in response.headers
+
+    def test_stream_spans_recorded(self, client, mock_api_key, recorder):
+        """Test that a sampled chat stream records request, route, TTFT and stream spans."""
+        headers = {"X-API-Key": mock_api_key, "traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"}
+        with client.stream(
+            "POST",
+            "/api/v1/chat/stream",
+            headers=headers,
+            json={"messages": [{"role": "user", "content": "hi"}]},
+        ) as response:
+            for _ in response.iter_lines():
+                pass
+
+        spans = {record[3]: record for record in recorder.drain(100)}
+        assert {"http.request", "route.handler", "llm.ttft", "chat.stream"} <= set(spans)
+        root_id = spans["http.request"][1]
+        assert spans["http.request"][2] == PARENT_ID
+        assert spans["chat.stream"][2] == root_id
+        assert spans["chat.stream"][6]["chunks"] == 2
+
+
+class TestSpanExporter:
+    """Test cases for batched span export."""
+
+    @pytest.mark.asyncio
+    async def test_flush_sends_batches(self):
+        """Test that buffered spans are sent in batches of the configured size."""
+        recorder = SpanRecorder(capacity=64)
+        trace = Trace(TRACE_ID, sampled=True)
+        with patch.object(tracing, "span_recorder", recorder):
+            for _ in range(5):
+                tracing.Span(trace, "work", None, {}).end()
+
+        batches = []
+
+        def collector(request: httpx.Request) -> httpx.Response:
+            batches.append(json.loads(request.content))
+            return httpx.Response(200)
+
+        exporter = SpanExporter(
+            "https://collector.test/v1/spans",
+            recorder=recorder,
+            batch_size=2,
+            client=httpx.AsyncClient(transport=httpx.MockTransport(collector)),
+        )
+        await exporter.flush()
+
+        assert [len(batch["spans"]) for batch in batches] == [2, 2, 1]
+        assert batches[0]["spans"][0]["traceId"] == TRACE_ID
+        assert exporter.exported == 5
+
+    @pytest.mark.asyncio
+    async def test_collector_outage_drops_batch(self):
+        """Test that a failing collector drops the batch instead of blocking."""
+        recorder = SpanRecorder(capacity=8)
+        recorder.record((TRACE_ID, PARENT_ID, None, "work", 0, 1, {}))
+        exporter = SpanExporter(
+            "https://collector.test/v1/spans",
+            recorder=recorder,
+            client=httpx.AsyncClient(transport=httpx.MockTransport(lambda r: httpx.Response(503))),
+        )
+        await exporter.flush()
+
+        assert exporter.failed == 1
+        assert len(recorder) == 0
+
+    @pytest.mark.asyncio
+    async def test_outgoing_requests_carry_traceparent(self):
+        """Test that the provider client hook adds the current traceparent."""
+        start_trace(f"00-{TRACE_ID}-{PARENT_ID}-01", tracestate="vendor=1")
+        root = start_span("root", activate=True)
+        request = httpx.Request("POST", "https://idp.test/token")
+
+        await inject_trace_context(request)
+
+        assert request.headers["traceparent"] == f"00-{TRACE_ID}-{root.span_id}-01"
+        assert request.headers["tracestate"] == "vendor=1"
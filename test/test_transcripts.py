@@ -0,0 +1,184 @@
+"""
+Unit tests for write-behind chat transcript persistence.
+"""
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+
+from app.core.database import ConnectionPool, DatabaseSession
+from app.core.transcripts import CREATE_TABLE, FIELDS, TranscriptWriter
+from app.models.chat import ChatMessage
+
+
+def _entry(user_id: str = "user1", tokens: tuple = ("Hello", "there")) -> tuple:
+    return (
+        1700000000.0,
+        "trace-1",
+        user_id,
+        "api_key",
+        "simulated",
+        [ChatMessage(role="user", content="Hello there")],
+        list(tokens),
+        "completed",
+        len(tokens),
+        12.5,
+        250.0,
+    )
+
+
+async def _rows(pool: ConnectionPool) -> list:
+    session = DatabaseSession(pool)
+    try:
+        return await session.fetch(f"SELECT {', '.join(FIELDS)} FROM chat_transcripts")
+    finally:
+        await session.close()
+
+
+class TestTranscriptWriter:
+    """Test cases for queueing and bulk-inserting transcripts."""
+
+    @pytest.mark.asyncio
+    async def test_record_is_noop_until_started(self):
+        """Test that transcripts are not queued before the writer starts."""
+        writer = TranscriptWriter(ConnectionPool("sqlite:///:memory:"))
+
+        writer.record(_entry())
+        assert len(writer._queue) == 0
+
+    @pytest.mark.asyncio
+    async def test_stop_flushes_queue(self):
+        """Test that queued transcripts are written in batches on stop."""
+        pool = ConnectionPool("sqlite:///:memory:")
+        writer = TranscriptWriter(pool, batch_size=2, flush_interval=60)
+        await writer.start()
+        for i in range(5):
+            writer.record(_entry(user_id=f"user{i}"))
+
+        await writer.stop()
+
+        rows = await _rows(pool)
+        assert writer.written == 5
+        assert sorted(row[2] for row in rows) == [f"user{i}" for i in range(5)]
+        assert json.loads(rows[0][5]) == [{"role": "user", "content": "Hello there"}]
+        assert json.loads(rows[0][6]) == ["Hello", "there"]
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_full_batch_flushed_without_waiting(self):
+        """Test that a full batch wakes the writer before the flush interval."""
+        pool = ConnectionPool("sqlite:///:memory:")
+        writer = TranscriptWriter(pool, batch_size=2, flush_interval=60)
+        await writer.start()
+        writer.record(_entry())
+        writer.record(_entry())
+
+        for _ in range(100):
+            if writer.written:
+                break
+            await asyncio.sleep(0.01)
+        assert writer.written == 2
+        await writer.stop()
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_overflow_dropped(self):
+        """Test that transcripts beyond the queue size are dropped and counted."""
+        pool = ConnectionPool("sqlite:///:memory:")
+        writer = TranscriptWriter(pool, maxsize=3, flush_interval=60)
+        await writer.start()
+        for _ in range(5):
+            writer.record(_entry())
+
+        assert writer.dropped == 2
+        await writer.stop()
+        assert writer.written == 3
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_write_error_requeues_batch(self):
+        """Test that a failed insert keeps its batch queued and writes it on the next flush."""
+        pool = ConnectionPool("sqlite:///:memory:")
+        writer = TranscriptWriter(pool, flush_interval=60)
+        await writer.start()
+        session = DatabaseSession(pool)
+        await session.execute("DROP TABLE chat_transcripts")
+        for i in range(3):
+            writer.record(_entry(user_id=f"user{i}"))
+
+        await writer.flush()
+        assert writer.failed == 3
+        assert [entry[2] for entry in writer._queue] == ["user0", "user1", "user2"]
+
+        await session.execute(CREATE_TABLE)
+        await session.close()
+        await writer.stop()
+
+        assert writer.written == 3
+        assert writer.dropped == 0
+        assert sorted(row[2] for row in await _rows(pool)) == ["user0", "user1", "user2"]
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_requeue_drops_only_overflow(self):
+        """Test that a requeued batch is trimmed to the queue size, newest first."""
+        pool = ConnectionPool("sqlite:///:memory:")
+        writer = TranscriptWriter(pool, maxsize=3, batch_size=2, flush_interval=60)
+        await writer.start()
+        for i in range(3):
+            writer.record(_entry(user_id=f"user{i}"))
+        batch = [writer._queue.popleft() for _ in range(2)]
+        writer.record(_entry(user_id="user3"))
+        writer.record(_entry(user_id="user4"))
+
+        writer._requeue(batch)
+
+        assert [entry[2] for entry in writer._queue] == ["user0", "user1", "user2"]
+        assert writer.dropped == 2
+        await writer.stop()
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_unwritten_at_stop_counted_as_dropped(self):
+        """Test that transcripts the final flush cannot write are dropped and counted."""
+        pool = ConnectionPool("sqlite:///:memory:")
+        writer = TranscriptWriter(pool, flush_interval=60)
+        await writer.start()
+        session = DatabaseSession(pool)
+        await session.execute("DROP TABLE chat_transcripts")
+        await session.close()
+        writer.record(_entry())
+
+        await writer.stop()
+
+        # Tried by the flush stop() wakes and again by the final one
+        assert writer.failed == 2
+        assert writer.written == 0
+        assert writer.dropped == 1
+        assert len(writer._queue) == 0
+        assert pool.stats()["in_use"] == 0
+        await pool.close()
+
+
+class TestChatTranscripts:
+    """Test cases for transcripts recorded by the chat endpoint."""
+
+    def test_completed_stream_recorded(self, client, mock_api_key):
+        """Test that a finished stream queues one transcript with its tokens."""
+        with patch("app.api.v1.chat.transcript_writer") as writer:
+            response = client.post(
+                "/api/v1/chat/stream",
+                headers={"X-API-Key": mock_api_key, "X-Trace-Id": "trace-abc"},
+                json={"messages": [{"role": "user", "content": "Hello world"}]},
+            )
+            assert response.status_code == 200
+
+        writer.record.assert_called_once()
+        record = dict(zip(FIELDS, writer.record.call_args.args[0], strict=True))
+        assert record["trace_id"] == "trace-abc"
+        assert record["user_id"] == "user1"
+        assert record["response"] == ["Hello", "world"]
+        assert record["outcome"] == "completed"
+        assert record["tokens"] == 2
+        assert record["ttft_ms"] is not None
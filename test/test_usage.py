@@ -0,0 +1,175 @@
+"""
+Unit tests for the per-user usage ledger and the admin usage endpoint.
+"""
+import asyncio
+import datetime
+from unittest.mock import patch
+
+import pytest
+
+from app.core.database import ConnectionPool, DatabaseSession
+from app.core.usage import UsageLedger
+
+TODAY = datetime.datetime.now(datetime.UTC).date()
+
+
+async def _started(pool: ConnectionPool) -> UsageLedger:
+    ledger = UsageLedger(pool, flush_interval=60)
+    await ledger.start()
+    return ledger
+
+
+async def _totals(ledger: UsageLedger, **kwargs) -> list[dict]:
+    session = DatabaseSession(ledger.pool)
+    try:
+        return await ledger.totals(session, TODAY, **kwargs)
+    finally:
+        await session.close()
+
+
+class TestUsageLedger:
+    """Test cases for in-memory aggregation and bulk upserts."""
+
+    @pytest.mark.asyncio
+    async def test_requests_aggregated_per_user(self):
+        """Test that requests are summed in memory and flushed as one row per user."""
+        ledger = await _started(ConnectionPool("sqlite:///:memory:"))
+        ledger.record("alice", 10, 20, 1.5)
+        ledger.record("alice", 5, 7, 0.5)
+        ledger.record("bob", 1, 1, 0.25)
+
+        await ledger.flush()
+
+        assert ledger.flushed == 2
+        totals = await _totals(ledger)
+        assert totals[0] == {
+            "user_id": "alice",
+            "requests": 2,
+            "prompt_tokens": 15,
+            "completion_tokens": 27,
+            "stream_seconds": 2.0,
+            "first_day": TODAY.isoformat(),
+            "last_day": TODAY.isoformat(),
+        }
+        assert totals[1]["user_id"] == "bob"
+        await ledger.stop()
+        await ledger.pool.close()
+
+    @pytest.mark.asyncio
+    async def test_flushes_from_workers_add_up(self):
+        """Test that upserts from separate ledgers add to the same totals."""
+        pool = ConnectionPool("sqlite:///:memory:")
+        workers = [await _started(pool), await _started(pool)]
+        for worker in workers:
+            worker.record("alice", 10, 20, 1.0)
+            await worker.flush()
+        workers[0].record("alice", 1, 2, 0.5)
+        await workers[0].flush()
+
+        (totals,) = await _totals(workers[0], user_id="alice")
+        assert (totals["requests"], totals["prompt_tokens"], totals["completion_tokens"]) == (
+            3,
+            21,
+            42,
+        )
+        for worker in workers:
+            await worker.stop()
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_kept_for_retry(self):
+        """Test that counters of a failed flush are merged back and written later."""
+        ledger = await _started(ConnectionPool("sqlite:///:memory:"))
+        ledger.record("alice", 10, 20, 1.0)
+        with patch.object(DatabaseSession, "executemany", side_effect=RuntimeError("db down")):
+            await ledger.flush()
+        ledger.record("alice", 1, 1, 1.0)
+
+        assert ledger.failed == 1
+        await ledger.flush()
+        (totals,) = await _totals(ledger)
+        assert totals["requests"] == 2
+        assert totals["prompt_tokens"] == 11
+        assert ledger.pool.stats()["in_use"] == 0
+        await ledger.stop()
+        await ledger.pool.close()
+
+    def test_record_is_noop_until_started(self):
+        """Test that nothing accumulates in a ledger that is never started and flushed."""
+        ledger = UsageLedger(ConnectionPool("sqlite:///:memory:"))
+
+        ledger.record("alice", 10, 20, 1.0)
+
+        assert ledger._pending == {}
+
+    @pytest.mark.asyncio
+    async def test_stop_flushes_remaining_counters(self):
+        """Test that shutdown writes counters recorded since the last flush."""
+        ledger = UsageLedger(ConnectionPool("sqlite:///:memory:"), flush_interval=60)
+        await ledger.start()
+        ledger.record("alice", 3, 4, 0.1)
+
+        await ledger.stop()
+
+        assert [row["user_id"] for row in await _totals(ledger)] == ["alice"]
+        await ledger.pool.close()
+
+    @pytest.mark.asyncio
+    async def test_stop_during_commit_counts_once(self):
+        """Test that stopping while a flush commits does not write its rows twice."""
+        ledger = UsageLedger(ConnectionPool("sqlite:///:memory:"), flush_interval=0.01)
+        await ledger.start()
+        ledger.record("alice", 3, 4, 0.1)
+        committing = asyncio.Event()
+        execute = DatabaseSession.execute
+
+        async def slow_commit(session, query, *args):
+            await execute(session, query, *args)
+            if query == "COMMIT":
+                committing.set()
+                await asyncio.sleep(0.05)
+
+        with patch.object(DatabaseSession, "execute", slow_commit):
+            await asyncio.wait_for(committing.wait(), 1)
+            await ledger.stop()
+
+        (totals,) = await _totals(ledger)
+        assert totals["requests"] == 1
+        assert totals["prompt_tokens"] == 3
+        await ledger.pool.close()
+
+
+class TestUsageEndpoint:
+    """Test cases for /api/v1/admin/usage."""
+
+    def test_requires_admin(self, client, mock_api_key):
+        """Test that authenticated non-admins get 403."""
+        response = client.get("/api/v1/admin/usage", headers={"X-API-Key": mock_api_key})
+
+        assert response.status_code == 403
+
+    def test_chat_usage_reported(self, client, mock_api_key):
+        """Test that a chat request shows up in the admin totals."""
+        # The lifespan starts the ledger
+        with client:
+            client.post(
+                "/api/v1/chat/stream",
+                headers={"X-API-Key": "test-api-key-456"},
+                json={"messages": [{"role": "user", "content": "count these three"}]},
+            )
+
+            with patch("app.core.auth.settings.ADMIN_USER_IDS", ["user1"]):
+                response = client.get(
+                    "/api/v1/admin/usage?user_id=user2&days=1",
+                    headers={"X-API-Key": mock_api_key},
+                )
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["since"] == TODAY.isoformat()
+        assert body["scope"] == "this_worker"
+        (usage,) = body["users"]
+        assert usage["user_id"] == "user2"
+        assert usage["requests"] >= 1
+        assert usage["prompt_tokens"] >= 3
+        assert usage["completion_tokens"] >= 3
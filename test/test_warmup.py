@@ -0,0 +1,83 @@
+"""
+Unit tests for worker warmup and lazily imported dependencies.
+"""
+import gc
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from pydantic import BaseModel, ConfigDict
+
+from app.core import warmup
+from app.core.warmup import warm_app, warm_worker
+from app.main import app
+
+
+class Example(BaseModel):
+    name: str
+
+    model_config = ConfigDict(json_schema_extra={"examples": [{"name": "a"}, {"bad": 1}]})
+
+
+class TestWarmup:
+    """Test cases for warm_app and warm_worker."""
+
+    def test_warm_app_builds_openapi_schema(self):
+        """Test that warmup builds the OpenAPI schema before the first request."""
+        fresh = FastAPI()
+
+        @fresh.post("/items", response_model=Example)
+        async def create(item: Example) -> Example:
+            return item
+
+        stats = warm_app(fresh)
+
+        assert fresh.openapi_schema is not None
+        assert stats["routes"] == 1
+        assert stats["models"] == 1
+
+    def test_invalid_examples_skipped(self):
+        """Test that examples which do not validate do not fail warmup."""
+        warmup._exercise_model(Example)
+
+    def test_lazy_modules_follow_settings(self):
+        """Test that only the dependencies the configured path needs are imported."""
+        with patch.object(warmup.settings, "OAUTH_INTROSPECTION_URL", "https://idp/introspect"):
+            with patch.object(warmup.settings, "RATE_LIMIT_MODE", "lease"):
+                assert warmup._lazy_modules() == ["app.core.api_key_auth"]
+        assert "jose.jwt" in warmup._lazy_modules()
+
+    def test_freeze_for_fork(self):
+        """Test that the master heap is frozen and the GC enabled again."""
+        gc.disable()
+        try:
+            stats = warmup.freeze_for_fork()
+            assert gc.isenabled()
+            assert stats["frozen"] == gc.get_freeze_count() > 0
+            assert stats["api_keys"] >= 0
+        finally:
+            gc.unfreeze()
+            gc.enable()
+
+    @pytest.mark.asyncio
+    async def test_warm_worker(self):
+        """Test that worker warmup also creates the rate limiter."""
+        await warm_worker(app)
+
+        assert "jose" in sys.modules
+        assert "slowapi" in sys.modules
+        assert app.openapi_schema is not None
+
+
+def test_heavy_dependencies_not_imported_by_app():
+    """Test that importing the app does not import jose, slowapi or redis."""
+    code = (
+        "import sys, app.main; "
+        "print(','.join(m for m in ('jose', 'slowapi', 'redis') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == ""